@@ -0,0 +1,286 @@
+import asyncio
+import json
+from typing import Any, Dict, List, Optional, Sequence
+
+import aiohttp
+from loguru import logger
+from web3 import AsyncWeb3, Web3
+from web3.middleware import async_geth_poa_middleware
+from web3.providers import AsyncHTTPProvider
+
+from calldata import CalldataEncoder
+from contract_calls import (
+    DEFAULT_FILL_GAS_BUDGET,
+    FILL_ORDER_GAS,
+    FILL_ORDERS_BASE_GAS,
+    INVALID_SIGNATURE,
+    NONCE_RETRIES,
+    TX_INTRINSIC_GAS,
+    OrderParamsConverter,
+)
+from fee_engine import GAS_ESTIMATE_MARGIN, SPEED_UP_BLOCKS, AsyncFeeEngine, PendingTransaction
+from metrics import async_rpc_middleware, timed, trace_config
+from nonce_manager import AsyncNonceManager, is_already_known, is_nonce_error
+from rpc_cache import RpcCache
+
+# Keep-alive connector settings for the shared JSON-RPC session.
+RPC_CONNECTION_LIMIT = 32
+RPC_KEEPALIVE_TIMEOUT = 60
+
+
+def create_rpc_session() -> aiohttp.ClientSession:
+    """ Create a keep-alive aiohttp session suitable for sharing between RPC and GraphQL calls. """
+    connector = aiohttp.TCPConnector(limit=RPC_CONNECTION_LIMIT, keepalive_timeout=RPC_KEEPALIVE_TIMEOUT)
+    return aiohttp.ClientSession(connector=connector, trace_configs=[trace_config("rpc")])
+
+
+class AsyncContractCalls:
+    """ AsyncWeb3 version of ContractCalls that never blocks the event loop.
+
+    RPC round trips are awaited on one shared keep-alive session and transaction signing is
+    pushed to the default executor, so fills overlap with GraphQL work running on the same loop.
+    """
+
+    def __init__(
+        self,
+        web3: AsyncWeb3,
+        contract,
+        account_address: str,
+        private_key: str,
+        session: Optional[aiohttp.ClientSession] = None,
+    ):
+        self.web3 = web3
+        self.session = session
+        self.contract = contract
+        self.account_address = account_address
+        self.private_key = private_key
+        self.calldata = CalldataEncoder(contract.abi)
+        self.nonce_manager = AsyncNonceManager(web3, account_address)
+        self.rpc_cache = RpcCache(web3)
+        self.fee_engine = AsyncFeeEngine(web3, self.rpc_cache)
+        self.pending: Dict[int, PendingTransaction] = {}
+
+    @classmethod
+    async def connect(
+        cls,
+        http_url: str,
+        contract_address: str,
+        contract_abi,
+        account_address: str,
+        private_key: str,
+        session: Optional[aiohttp.ClientSession] = None,
+        poa: bool = True,
+    ) -> "AsyncContractCalls":
+        """ Build an AsyncWeb3 client for http_url that reuses the given (or a new) aiohttp session. """
+        owns_session = session is None
+        session = session or create_rpc_session()
+        provider = AsyncHTTPProvider(http_url)
+        await provider.cache_async_session(session)
+        web3 = AsyncWeb3(provider)
+        if poa:
+            web3.middleware_onion.inject(async_geth_poa_middleware, layer=0)
+        web3.middleware_onion.add(async_rpc_middleware, "metrics")
+        contract = web3.eth.contract(address=Web3.to_checksum_address(contract_address), abi=contract_abi)
+        return cls(web3, contract, account_address, private_key, session=session if owns_session else None)
+
+    @timed("sign_transaction")
+    async def _sign(self, txn: Dict[str, Any]):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, lambda: self.web3.eth.account.sign_transaction(txn, private_key=self.private_key)
+        )
+
+    @timed("send_transaction")
+    async def _send_transaction(
+        self, data: str, gas: Optional[int] = None, chain_id: Optional[int] = None, urgency: str = "normal"
+    ) -> str:
+        """ Build, sign off-loop and broadcast a contract call with a locally allocated nonce. """
+        chain_id = chain_id if chain_id is not None else await self.rpc_cache.achain_id()
+        if gas is None:
+            gas = int(await self.web3.eth.estimate_gas(
+                {"from": self.account_address, "to": self.contract.address, "data": data}
+            ) * GAS_ESTIMATE_MARGIN)
+        for attempt in range(NONCE_RETRIES):
+            nonce = await self.nonce_manager.allocate()
+            signed_txn = None
+            try:
+                txn = {
+                    "chainId": chain_id,
+                    "to": self.contract.address,
+                    "data": data,
+                    "value": 0,
+                    "gas": gas,
+                    "nonce": nonce,
+                    **await self.fee_engine.atx_params(urgency),
+                }
+                signed_txn = await self._sign(txn)
+                tx_hash = (await self.web3.eth.send_raw_transaction(signed_txn.rawTransaction)).hex()
+            except Exception as e:
+                if signed_txn is not None and is_already_known(e):
+                    # The node already has this exact transaction (e.g. a retried broadcast), so it is sent.
+                    tx_hash = signed_txn.hash.hex()
+                elif is_nonce_error(e) and attempt < NONCE_RETRIES - 1:
+                    logger.warning(f"Nonce {nonce} rejected ({e}), resyncing")
+                    await self.nonce_manager.resync()
+                    continue
+                else:
+                    self.nonce_manager.release(nonce)
+                    raise e
+            self.nonce_manager.confirm(nonce, tx_hash)
+            self.pending[nonce] = PendingTransaction(nonce, txn, tx_hash, await self.rpc_cache.ablock_number())
+            return tx_hash
+
+    async def speed_up(self, blocks: int = SPEED_UP_BLOCKS, urgency: str = "fast") -> List[str]:
+        """ Async ContractCalls.speed_up: same-nonce replacement of transactions stuck for blocks blocks. """
+        if not self.pending:
+            return []
+        block = await self.rpc_cache.ablock_number()
+        mined = await self.web3.eth.get_transaction_count(self.account_address, "latest")
+        replaced = []
+        for nonce in sorted(self.pending):
+            pending = self.pending[nonce]
+            if nonce < mined:
+                self.fee_engine.record_inclusion(self.pending.pop(nonce))
+                continue
+            if block - pending.sent_block < blocks:
+                continue
+            txn = dict(pending.txn, **await self.fee_engine.areplacement_params(pending.txn, urgency))
+            try:
+                signed_txn = await self._sign(txn)
+                tx_hash = (await self.web3.eth.send_raw_transaction(signed_txn.rawTransaction)).hex()
+            except Exception as e:
+                logger.warning(f"Replacement of nonce {nonce} rejected: {e}")
+                continue
+            logger.info(f"Replaced nonce {nonce} ({pending.tx_hash} -> {tx_hash}) after {block - pending.sent_block} blocks")
+            pending.replaced(txn, tx_hash, block)
+            self.nonce_manager.confirm(nonce, tx_hash)
+            replaced.append(tx_hash)
+        return replaced
+
+    @timed("fill_order")
+    async def fill_order(self, order_data: dict, pool_data, gas: Optional[int] = None) -> str:
+        """ Fill one order; the gas limit is estimated unless given (e.g. from a pre-flight simulation). """
+        try:
+            fraction = Web3.to_wei(order_data.get("fraction", 1), "ether")
+            logger.info(json.dumps(order_data))
+            order_tuple = OrderParamsConverter.dict_to_tuple(order_data, pool_data)
+            signature = bytes.fromhex(order_data["signature"][2:])
+            tx_hash = await self._send_transaction(
+                self.calldata.fill_order(order_tuple, signature, fraction), gas
+            )
+            logger.info(f"Fill Order TX Hash: {tx_hash}")
+            return tx_hash
+        except Exception as e:
+            logger.error(f"Exception during order fill: {e}")
+            raise e
+
+    @timed("fill_orders")
+    async def fill_orders(
+        self,
+        orders: Sequence[dict],
+        pool_data,
+        fractions: Optional[Sequence] = None,
+        gas_budget: int = DEFAULT_FILL_GAS_BUDGET,
+        gas_per_order: int = FILL_ORDER_GAS,
+        preflight=None,
+        verifier=None,
+    ) -> List[Dict[str, Any]]:
+        """ Async ContractCalls.fill_orders: every fillOrders batch is built, signed and sent concurrently.
+
+        With a preflight.Preflight, every fill is simulated first: orders that would revert are not sent
+        (their result carries the decoded revert reason) and the others are packed and sent with their
+        gas estimates, less the intrinsic transaction cost each one includes, instead of gas_per_order.
+        With a verifier.OrderVerifier, orders whose maker signature does not verify are not sent (nor
+        simulated) either.
+        """
+        if not orders:
+            return []
+        pools = pool_data if isinstance(pool_data, (list, tuple)) else [pool_data] * len(orders)
+        if len(pools) != len(orders):
+            raise ValueError("pool_data must be a single pool or one pool per order")
+        if fractions is not None and len(fractions) != len(orders):
+            raise ValueError("fractions must have one entry per order")
+
+        results: Dict[int, Dict[str, Any]] = {}
+        base_gas = FILL_ORDERS_BASE_GAS
+        if preflight is not None:
+            simulations = await preflight.simulate_fills(orders, pools, fractions, verifier)
+            for simulation in simulations:
+                if not simulation.ok:
+                    results[simulation.index] = {
+                        "index": simulation.index, "batch": None, "tx_hash": None, "error": str(simulation.error)
+                    }
+            # Every estimate is of a fillOrder transaction of its own; a batch pays the intrinsic cost once.
+            intrinsic_gas = int(TX_INTRINSIC_GAS * preflight.gas_margin)
+            order_gas = {s.index: max(s.gas - intrinsic_gas, 0) for s in simulations if s.ok}
+        else:
+            valid = await verifier.verify_fills_async(orders, pools) if verifier is not None else [True] * len(orders)
+            for i, ok in enumerate(valid):
+                if not ok:
+                    results[i] = {"index": i, "batch": None, "tx_hash": None, "error": f"{INVALID_SIGNATURE}()"}
+            order_gas = {i: gas_per_order for i, ok in enumerate(valid) if ok}
+
+        # Greedily pack orders into batches whose gas stays within the budget.
+        batches: List[List[int]] = []
+        batch_gas = 0
+        for i, gas in order_gas.items():
+            if not batches or batch_gas + gas > gas_budget:
+                batches.append([])
+                batch_gas = base_gas
+            batches[-1].append(i)
+            batch_gas += gas
+        chain_id = await self.rpc_cache.achain_id()
+
+        async def send_batch(batch_index, indices):
+            order_tuples = [OrderParamsConverter.dict_to_tuple(orders[i], pools[i]) for i in indices]
+            signatures = [bytes.fromhex(orders[i]["signature"][2:]) for i in indices]
+            batch_fractions = [
+                Web3.to_wei(fractions[i] if fractions is not None else orders[i].get("fraction", 1), "ether")
+                for i in indices
+            ]
+            try:
+                tx_hash = await self._send_transaction(
+                    self.calldata.fill_orders(order_tuples, signatures, batch_fractions),
+                    base_gas + sum(order_gas[i] for i in indices),
+                    chain_id,
+                )
+                logger.info(f"Fill Orders TX Hash: {tx_hash} ({len(order_tuples)} orders)")
+                return tx_hash, None
+            except Exception as e:
+                logger.error(f"Exception during batch fill {batch_index}: {e}")
+                return None, str(e)
+
+        sent = await asyncio.gather(*(send_batch(b, indices) for b, indices in enumerate(batches)))
+        for batch_index, (indices, (tx_hash, error)) in enumerate(zip(batches, sent)):
+            for i in indices:
+                results[i] = {"index": i, "batch": batch_index, "tx_hash": tx_hash, "error": error}
+        return [results[i] for i in range(len(orders))]
+
+    @timed("cancel_order")
+    async def cancel_order(self, order_data: dict) -> str:
+        try:
+            tx_hash = await self._send_transaction(
+                self.contract.encodeABI(fn_name="cancelOrders", args=[[order_data]])
+            )
+            logger.info(f"Cancel Order TX Hash: {tx_hash}")
+            return tx_hash
+        except Exception as e:
+            logger.error(f"Exception during order cancel: {e}")
+            raise e
+
+    @timed("cancel_orders")
+    async def cancel_orders(self, orders: Sequence, pool_data) -> Optional[str]:
+        """ Cancel many of our Orders in one cancelOrders transaction; pool_data is one pool or one per order. """
+        if not orders:
+            return None
+        pools = pool_data if isinstance(pool_data, (list, tuple)) else [pool_data] * len(orders)
+        order_tuples = [OrderParamsConverter.order_to_tuple(order, pool) for order, pool in zip(orders, pools)]
+        tx_hash = await self._send_transaction(self.calldata.cancel_orders(order_tuples))
+        logger.info(f"Cancel Orders TX Hash: {tx_hash} ({len(order_tuples)} orders)")
+        return tx_hash
+
+    async def close(self):
+        """ Close the RPC session if it was created by connect(). """
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
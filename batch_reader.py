@@ -0,0 +1,260 @@
+import asyncio
+import itertools
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import aiohttp
+from eth_abi import decode, encode
+from eth_utils import function_abi_to_4byte_selector, to_checksum_address
+from loguru import logger
+
+from async_contract_calls import create_rpc_session
+from orders import Order
+from pools import PoolData
+
+# eth_call entries per JSON-RPC batch; most providers accept 100-1000.
+MAX_BATCH_SIZE = 100
+# JSON-RPC batches in flight at once.
+BATCH_CONCURRENCY = 4
+# (account, token id) pairs per balanceOfBatch call.
+MAX_BALANCES_PER_CALL = 500
+RPC_HEADERS = {"Content-Type": "application/json"}
+
+Block = Union[int, str]
+
+
+class BatchReadError(Exception):
+    """ Raised when a batched eth_call returns an error. """
+
+
+def _abi_type(param: Dict[str, Any]) -> str:
+    if param["type"].startswith("tuple"):
+        return "(" + ",".join(_abi_type(c) for c in param["components"]) + ")" + param["type"][len("tuple"):]
+    return param["type"]
+
+
+class ViewFunction:
+    """ Calldata encoder and result decoder for one view function of the ABI. """
+
+    __slots__ = ("name", "selector", "input_types", "output_types")
+
+    def __init__(self, abi: Sequence[Dict[str, Any]], name: str):
+        entry = next(e for e in abi if e.get("type") == "function" and e["name"] == name)
+        self.name = name
+        self.selector = function_abi_to_4byte_selector(entry)
+        self.input_types = [_abi_type(p) for p in entry["inputs"]]
+        self.output_types = [_abi_type(p) for p in entry["outputs"]]
+
+    def encode(self, *args) -> str:
+        return "0x" + (self.selector + encode(self.input_types, args)).hex()
+
+    def decode(self, result: str) -> Any:
+        values = decode(self.output_types, bytes.fromhex(result[2:]))
+        return values[0] if len(values) == 1 else values
+
+
+def _bytes32(value: str) -> bytes:
+    return bytes.fromhex(value[2:] if value.startswith("0x") else value)
+
+
+def _timestamp(seconds: int) -> Optional[datetime]:
+    return datetime.fromtimestamp(seconds, timezone.utc) if seconds else None
+
+
+class PoolState:
+    """ Decoded poolState(poolHash) result. """
+
+    __slots__ = (
+        "pool_hash",
+        "collateral_minted",
+        "shares_minted",
+        "index_shares",
+        "index_initial_balance",
+        "actual_start_timestamp",
+        "actual_end_timestamp",
+        "balance_change_per_share",
+    )
+
+    def __init__(self, pool_hash: str, values: Tuple[int, ...]):
+        self.pool_hash = pool_hash
+        (
+            self.collateral_minted,
+            self.shares_minted,
+            self.index_shares,
+            self.index_initial_balance,
+            actual_start_timestamp,
+            actual_end_timestamp,
+            self.balance_change_per_share,
+        ) = values
+        self.actual_start_timestamp = _timestamp(actual_start_timestamp)
+        self.actual_end_timestamp = _timestamp(actual_end_timestamp)
+
+    @property
+    def ended(self) -> bool:
+        return self.actual_end_timestamp is not None
+
+    def apply(self, pool_data: PoolData) -> PoolData:
+        """ Copy the on-chain state onto a PoolData decoded from the API. """
+        pool_data.collateral_minted = self.collateral_minted
+        pool_data.shares_minted = self.shares_minted
+        pool_data.actual_end_timestamp = self.actual_end_timestamp
+        pool_data.balance_change_per_share = self.balance_change_per_share if self.ended else None
+        return pool_data
+
+    def __repr__(self) -> str:
+        return (
+            f"PoolState(pool_hash={self.pool_hash}, collateral_minted={self.collateral_minted}, "
+            f"shares_minted={self.shares_minted}, actual_end_timestamp={self.actual_end_timestamp})"
+        )
+
+
+class ReadResult:
+    """ One refresh cycle: cancellation flags by order hash, pool states by pool hash and balances by
+    (account, token id), all read at the same block. """
+
+    __slots__ = ("block", "cancelled", "pool_states", "balances")
+
+    def __init__(self, block: Block):
+        self.block = block
+        self.cancelled: Dict[str, bool] = {}
+        self.pool_states: Dict[str, PoolState] = {}
+        self.balances: Dict[Tuple[str, int], int] = {}
+
+    def fillable(self, order: Order, pool_data: PoolData, now: Optional[datetime] = None) -> bool:
+        """ Whether order is still fillable: not cancelled, filled, expired or rejected by an OrderVerifier
+        and its pool not ended. """
+        now = now or datetime.now(timezone.utc)
+        if getattr(order, "signature_valid", None) is False:
+            return False
+        if self.cancelled.get(order.order_hash.lower()) or order.fraction_filled >= 1 or order.expiry <= now:
+            return False
+        state = self.pool_states.get(pool_data.pool_hash.lower())
+        return state is None or not state.ended
+
+
+class BatchReader:
+    """ Reads orderCancelled, poolState and balanceOfBatch through JSON-RPC batch requests.
+
+    Every key is requested once per read() however often it is passed in. The eth_calls are
+    packed MAX_BATCH_SIZE to a request and sent BATCH_CONCURRENCY requests at a time, all pinned
+    to one block, so refreshing 500 orders takes a handful of round trips instead of 500+.
+    """
+
+    def __init__(self, http_url: str, contract_address: str, contract_abi, session: Optional[aiohttp.ClientSession] = None):
+        self.http_url = http_url
+        self.contract_address = to_checksum_address(contract_address)
+        self._owns_session = session is None
+        self.session = session or create_rpc_session()
+        self.order_cancelled = ViewFunction(contract_abi, "orderCancelled")
+        self.pool_state = ViewFunction(contract_abi, "poolState")
+        self.balance_of_batch = ViewFunction(contract_abi, "balanceOfBatch")
+        self._ids = itertools.count()
+        self.round_trips = 0
+
+    async def close(self):
+        if self._owns_session:
+            await self.session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _post(self, payload):
+        self.round_trips += 1
+        async with self.session.post(self.http_url, json=payload, headers=RPC_HEADERS) as response:
+            response.raise_for_status()
+            return await response.json(content_type=None)
+
+    async def block_number(self) -> int:
+        response = await self._post({"jsonrpc": "2.0", "id": next(self._ids), "method": "eth_blockNumber", "params": []})
+        return int(response["result"], 16)
+
+    async def _call_batch(self, calldata: List[str], block: str) -> List[str]:
+        ids = [next(self._ids) for _ in calldata]
+        payload = [
+            {"jsonrpc": "2.0", "id": i, "method": "eth_call", "params": [{"to": self.contract_address, "data": data}, block]}
+            for i, data in zip(ids, calldata)
+        ]
+        responses = await self._post(payload)
+        if not isinstance(responses, list):
+            raise BatchReadError(f"Batch request rejected: {responses.get('error', responses)}")
+        by_id = {response.get("id"): response for response in responses}
+        results = []
+        for i in ids:
+            response = by_id.get(i)
+            if response is None or "error" in response:
+                raise BatchReadError(f"eth_call failed: {response and response['error']}")
+            results.append(response["result"])
+        return results
+
+    async def call(self, calldata: List[str], block: Block = "latest") -> List[str]:
+        """ eth_call every calldata against the contract at one block, in batches; results in input order. """
+        block = hex(block) if isinstance(block, int) else block
+        chunks = [calldata[i:i + MAX_BATCH_SIZE] for i in range(0, len(calldata), MAX_BATCH_SIZE)]
+        semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+        async def run(chunk):
+            async with semaphore:
+                return await self._call_batch(chunk, block)
+
+        results = await asyncio.gather(*(run(chunk) for chunk in chunks))
+        return [result for chunk in results for result in chunk]
+
+    async def read(
+        self,
+        order_hashes: Iterable[str] = (),
+        pool_hashes: Iterable[str] = (),
+        balances: Iterable[Tuple[str, int]] = (),
+        block: Optional[Block] = None,
+    ) -> ReadResult:
+        """ Read cancellation flags, pool states and ERC-1155 balances in one refresh cycle.
+
+        Args:
+            order_hashes: Order hashes to check with orderCancelled.
+            pool_hashes: Pool hashes to read with poolState.
+            balances: (account, token id) pairs read through balanceOfBatch.
+            block: Block number or tag; defaults to the current block number so every call sees the same state.
+
+        Returns:
+            ReadResult keyed by lowercase hashes and (checksum account, token id).
+        """
+        order_hashes = list(dict.fromkeys(h.lower() for h in order_hashes))
+        pool_hashes = list(dict.fromkeys(h.lower() for h in pool_hashes))
+        balances = list(dict.fromkeys((to_checksum_address(account), int(token_id)) for account, token_id in balances))
+        if block is None:
+            block = await self.block_number()
+        result = ReadResult(block)
+
+        calldata = [self.order_cancelled.encode(_bytes32(h)) for h in order_hashes]
+        calldata += [self.pool_state.encode(_bytes32(h)) for h in pool_hashes]
+        balance_chunks = [balances[i:i + MAX_BALANCES_PER_CALL] for i in range(0, len(balances), MAX_BALANCES_PER_CALL)]
+        for chunk in balance_chunks:
+            calldata.append(self.balance_of_batch.encode([a for a, _ in chunk], [t for _, t in chunk]))
+        if not calldata:
+            return result
+
+        outputs = iter(await self.call(calldata, block))
+        for order_hash in order_hashes:
+            result.cancelled[order_hash] = self.order_cancelled.decode(next(outputs))
+        for pool_hash in pool_hashes:
+            result.pool_states[pool_hash] = PoolState(pool_hash, self.pool_state.decode(next(outputs)))
+        for chunk in balance_chunks:
+            result.balances.update(zip(chunk, self.balance_of_batch.decode(next(outputs))))
+        logger.debug(
+            f"Read {len(order_hashes)} orders, {len(pool_hashes)} pools, {len(balances)} balances "
+            f"in {len(calldata)} eth_calls at block {block}"
+        )
+        return result
+
+    async def refresh(self, orders: Iterable[Order], pools: Iterable[PoolData], block: Optional[Block] = None) -> ReadResult:
+        """ read() the cancellation flags of orders and the states of the pools they trade, applying the
+        pool states to the PoolData objects. """
+        orders = list(orders)
+        pools_by_id = {pool.id: pool for pool in pools}
+        traded = [pools_by_id[order.pool_id] for order in orders if order.pool_id in pools_by_id]
+        result = await self.read((order.order_hash for order in orders), (pool.pool_hash for pool in traded), block=block)
+        for pool in traded:
+            result.pool_states[pool.pool_hash.lower()].apply(pool)
+        return result
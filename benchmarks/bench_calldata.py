@@ -0,0 +1,94 @@
+""" Calldata encoding time of fillOrder, fillOrders and cancelOrders: web3's encodeABI vs CalldataEncoder.
+
+Both encoders get the same SilicaOrder tuples (half LONG, half SHORT) and their outputs are checked
+to be identical.
+
+Usage: python benchmarks/bench_calldata.py [orders] [batch]
+"""
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from web3 import Web3
+
+from bench_decoder import POOLS, order_item, pool_item
+from calldata import CalldataEncoder
+from contract_calls import OrderParamsConverter
+from orders import Order
+from pools import PoolData
+
+CONTRACT_ADDRESS = "0x71486C325a1dFd990a3A21D8DEBE82D1d4ed3C88"
+ABI_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "contracts", f"{CONTRACT_ADDRESS}.abi.json")
+
+
+def fill_payload(order: Order) -> dict:
+    return {
+        "maker": order.maker,
+        "taker": "0x0000000000000000000000000000000000000000",
+        "expiry": order.expiry.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+        "direction": order.direction,
+        "offered_upfront_token": order.offered_upfront_token,
+        "offered_upfront_amount": str(order.offered_upfront_amount or 0),
+        "offered_long_shares": str(order.offered_long_shares or 0),
+        "requested_upfront_token": order.requested_upfront_token,
+        "requested_upfront_amount": str(order.requested_upfront_amount or 0),
+        "requested_long_shares": str(order.requested_long_shares or 0),
+        "signature": order.signature,
+    }
+
+
+def measure(label, encode, count, repeat=5):
+    best = min(_timed(encode) for _ in range(repeat))
+    print(f"{label:<40} {best * 1000:9.2f} ms {best / count * 1e6:9.2f} us/order")
+
+
+def _timed(encode):
+    start = time.perf_counter()
+    encode()
+    return time.perf_counter() - start
+
+
+def run(count, batch):
+    with open(ABI_PATH) as f:
+        abi = json.load(f)
+    contract = Web3().eth.contract(address=CONTRACT_ADDRESS, abi=abi)
+    encoder = CalldataEncoder(abi)
+    pools = {pool.id: pool for pool in (PoolData.from_json(pool_item(i)) for i in range(POOLS))}
+    orders = [Order.from_json(order_item(i)) for i in range(count)]
+    tuples = [OrderParamsConverter.dict_to_tuple(fill_payload(o), pools[o.pool_id]) for o in orders]
+    signatures = [bytes.fromhex(o.signature[2:]) for o in orders]
+    fraction = Web3.to_wei(1, "ether")
+    batches = [range(i, min(i + batch, count)) for i in range(0, count, batch)]
+    print(f"orders={count}, fillOrders/cancelOrders batches of {batch}")
+
+    def fill_order(encode):
+        return [encode("fillOrder", [tuples[i], signatures[i], fraction]) for i in range(count)]
+
+    def fill_orders(encode):
+        return [
+            encode("fillOrders", [[tuples[i] for i in b], [signatures[i] for i in b], [fraction] * len(b)])
+            for b in batches
+        ]
+
+    def cancel_orders(encode):
+        return [encode("cancelOrders", [[tuples[i] for i in b]]) for b in batches]
+
+    def web3_encode(fn_name, args):
+        return contract.encodeABI(fn_name=fn_name, args=args)
+
+    methods = {"fillOrder": encoder.fill_order, "fillOrders": encoder.fill_orders, "cancelOrders": encoder.cancel_orders}
+
+    def direct_encode(fn_name, args):
+        return methods[fn_name](*args)
+
+    for case in (fill_order, fill_orders, cancel_orders):
+        assert case(web3_encode) == case(direct_encode)
+        measure(f"{case.__name__}: encodeABI", lambda: case(web3_encode), count)
+        measure(f"{case.__name__}: CalldataEncoder", lambda: case(direct_encode), count)
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 2000, int(sys.argv[2]) if len(sys.argv) > 2 else 20)
@@ -0,0 +1,100 @@
+""" Decoding time of orders/pools response bodies: from_json per dict vs the bulk decoders.
+
+Usage: python benchmarks/bench_decoder.py [orders]
+"""
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from decoder import decode_order_table, decode_orders, decode_pools
+from orders import Order
+from pools import PoolData
+
+POOLS = 50
+EXPIRIES = 500
+
+
+def order_item(i):
+    expiry = datetime(2024, 6, 15, tzinfo=timezone.utc) + timedelta(minutes=i % EXPIRIES)
+    long = i % 2 == 0
+    return {
+        "state": {"fractionFilled": "0" if i % 7 else "0.25"},
+        "id": f"id-{i}",
+        "orderHash": f"0x{i:064x}",
+        "expiry": expiry.isoformat(timespec="milliseconds").replace("+00:00", "Z"),
+        "poolId": f"pool-{i % POOLS}",
+        "maker": "0xd01C9047f8918D1296C87024219a728Ec5Dd515b",
+        "direction": "LONG" if long else "SHORT",
+        "signature": "0x" + "ee" * 65,
+        "requestedLongShares": str(9921 + i) if long else None,
+        "offeredLongShares": None if long else str(198413 + i),
+        "offeredUpfrontToken": "0x23aC6531349546f0909A9Cd06D3fC7A0be67E9b6" if long else None,
+        "requestedUpfrontToken": None if long else "0x23aC6531349546f0909A9Cd06D3fC7A0be67E9b6",
+        "requestedUpfrontAmount": None if long else str(15200000 + i),
+        "offeredUpfrontAmount": str(190000 + i) if long else None,
+    }
+
+
+def pool_item(i):
+    return {
+        "id": f"pool-{i}",
+        "poolHash": f"0x{i:064x}",
+        "index": "0xBDB06E1FBfAb742F0f5e72a85E57418437D505e9",
+        "indexName": "BTC_TX_FEE",
+        "cap": "504000",
+        "floor": "0",
+        "payoutToken": "0x23aC6531349546f0909A9Cd06D3fC7A0be67E9b6",
+        "targetEndTimestamp": f"2024-05-{6 + i % 4:02d}T03:00:00.000Z",
+        "targetStartTimestamp": "2024-04-29T03:00:00.000Z",
+        "totalUpfrontPayment": {"amount": "10067400000"},
+        "state": {
+            "actualEndTimestamp": None,
+            "balanceChangePerShare": None,
+            "collateralMinted": "16534919350",
+            "sharesMinted": "32807533",
+            "totalMinted": "32807533",
+        },
+    }
+
+
+def fields(obj):
+    return tuple(getattr(obj, name) for name in obj.__slots__ if not name.startswith("_"))
+
+
+def measure(label, decode, count, repeat=5):
+    best = min(_timed(decode) for _ in range(repeat))
+    print(f"{label:<34} {best * 1000:9.2f} ms {count / best:12.0f} rows/s")
+
+
+def _timed(decode):
+    start = time.perf_counter()
+    decode()
+    return time.perf_counter() - start
+
+
+def run(count):
+    orders_body = json.dumps({"data": {"orders": [order_item(i) for i in range(count)]}}).encode()
+    pools_body = json.dumps({"data": {"pools": [pool_item(i) for i in range(count)]}}).encode()
+    print(f"rows={count} ({len(orders_body) / 1e6:.1f} MB orders body, {POOLS} pools, {EXPIRIES} distinct expiries)")
+
+    measure("orders: json + Order.from_json", lambda: [Order.from_json(o) for o in json.loads(orders_body)["data"]["orders"]], count)
+    measure("orders: decode_orders", lambda: decode_orders(orders_body), count)
+    measure("orders: decode_order_table", lambda: decode_order_table(orders_body), count)
+    measure("pools: json + PoolData.from_json", lambda: [PoolData.from_json(p) for p in json.loads(pools_body)["data"]["pools"]], count)
+    measure("pools: decode_pools", lambda: decode_pools(pools_body), count)
+
+    expected = [fields(Order.from_json(o)) for o in json.loads(orders_body)["data"]["orders"]]
+    table = decode_order_table(orders_body)
+    assert [fields(o) for o in decode_orders(orders_body)] == expected
+    assert [fields(table.to_order(i)) for i in range(len(table))] == expected
+    assert [fields(p) for p in decode_pools(pools_body)] == [
+        fields(PoolData.from_json(p)) for p in json.loads(pools_body)["data"]["pools"]
+    ]
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -0,0 +1,121 @@
+""" Trigger-to-broadcast latency of the kill switch vs one cancel transaction per order.
+
+A local JSON-RPC stub answers every request after --rtt milliseconds, standing in for a remote node.
+
+Usage: python benchmarks/bench_kill_switch.py [orders] [--rtt 30]
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiohttp import web
+from eth_account import Account
+from loguru import logger
+
+from async_contract_calls import AsyncContractCalls
+from bench_decoder import POOLS, order_item, pool_item
+from kill_switch import KillSwitch
+from orders import Order
+from pools import PoolData
+
+CONTRACT_ADDRESS = "0x71486C325a1dFd990a3A21D8DEBE82D1d4ed3C88"
+# Orders cancelled one transaction at a time for the comparison; the total is extrapolated from them.
+PER_ORDER_SAMPLE = 50
+ABI_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "contracts", f"{CONTRACT_ADDRESS}.abi.json")
+
+
+class StubNode:
+    """ Minimal JSON-RPC node: answers single and batch requests after a fixed round-trip delay. """
+
+    def __init__(self, rtt: float):
+        self.rtt = rtt
+        self.requests = 0
+        self.nonce = 0
+
+    def result(self, method, params):
+        if method == "eth_feeHistory":
+            return {
+                "oldestBlock": "0x1",
+                "baseFeePerGas": [hex(10 ** 9)] * 11,
+                "gasUsedRatio": [0.5] * 10,
+                "reward": [[hex(10 ** 8), hex(2 * 10 ** 9), hex(5 * 10 ** 9)]] * 10,
+            }
+        if method == "eth_sendRawTransaction":
+            self.nonce += 1
+            return "0x" + hashlib.sha256(bytes.fromhex(params[0][2:])).hexdigest()
+        if method == "eth_getTransactionCount":
+            return hex(self.nonce)
+        return {"eth_chainId": "0x1", "eth_blockNumber": "0x10", "eth_gasPrice": hex(10 ** 9), "eth_estimateGas": hex(60000)}[method]
+
+    async def handle(self, request):
+        body = await request.json()
+        self.requests += 1
+        await asyncio.sleep(self.rtt)
+        calls = body if isinstance(body, list) else [body]
+        responses = [{"jsonrpc": "2.0", "id": c["id"], "result": self.result(c["method"], c["params"])} for c in calls]
+        return web.json_response(responses if isinstance(body, list) else responses[0])
+
+    async def start(self) -> str:
+        app = web.Application(client_max_size=64 * 1024 ** 2)
+        app.router.add_post("/", self.handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, "127.0.0.1", 0).start()
+        return f"http://127.0.0.1:{self.runner.addresses[0][1]}/"
+
+
+def book(count, maker):
+    pools = {pool.id: pool for pool in (PoolData.from_json(pool_item(i)) for i in range(POOLS))}
+    orders = [Order.from_json(dict(order_item(i), maker=maker)) for i in range(count)]
+    return orders, pools
+
+
+async def run(count, rtt):
+    node = StubNode(rtt)
+    url = await node.start()
+    account = Account.create()
+    with open(ABI_PATH) as f:
+        abi = f.read()
+    calls = await AsyncContractCalls.connect(url, CONTRACT_ADDRESS, abi, account.address, account.key.hex(), poa=False)
+    orders, pools = book(count, account.address)
+    print(f"orders={count} simulated rtt={rtt * 1000:.0f} ms")
+
+    sample = orders[:PER_ORDER_SAMPLE]
+    node.requests = 0
+    start = time.perf_counter()
+    for order in sample:
+        await calls.cancel_orders([order], pools[order.pool_id])
+    scale = count / len(sample)
+    elapsed = (time.perf_counter() - start) * scale
+    print(f"{'one cancel tx per order':<28} {elapsed * 1000:9.1f} ms {node.requests * scale:6.0f} requests (extrapolated from {len(sample)})")
+
+    for warm in (False, True):
+        switch = KillSwitch(calls, url)
+        switch.replace({pool_id: {o.order_hash: o for o in orders if o.pool_id == pool_id} for pool_id in pools}, pools)
+        if warm:
+            await switch.arm()
+        node.requests = 0
+        start = time.perf_counter()
+        results = await switch.trigger()
+        elapsed = time.perf_counter() - start
+        assert all(result["error"] is None for result in results)
+        label = "kill switch (armed)" if warm else "kill switch (cold)"
+        print(f"{label:<28} {elapsed * 1000:9.1f} ms {node.requests:6d} requests, {len(results)} transactions")
+        await switch.close()
+
+    await calls.close()
+    await node.runner.cleanup()
+
+
+if __name__ == "__main__":
+    logger.remove()
+    parser = argparse.ArgumentParser(description="Kill switch latency")
+    parser.add_argument("orders", nargs="?", type=int, default=200)
+    parser.add_argument("--rtt", type=float, default=30, help="simulated node round trip (ms)")
+    args = parser.parse_args()
+    asyncio.run(run(args.orders, args.rtt / 1000))
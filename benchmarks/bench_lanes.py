@@ -0,0 +1,192 @@
+""" Fill throughput of ExecutionLanes with 1, 2, 4 and 8 signing keys.
+
+By default a JSON-RPC stub in a child process stands in for the dev chain: it answers after --rtt
+milliseconds, mines every transaction it has seen each --block-time seconds and, like geth's
+per-account slots, rejects a sender's transactions beyond --slots unmined ones. One account can then
+only get --slots fills into a block, so fills mined per second should grow about linearly with the
+number of keys until transaction signing (~5 ms in pure Python) or the stub's sender recovery
+(~10 ms) saturates a process. With --url the fills go to a real dev chain (e.g. anvil --block-time 1)
+instead; --keys must then hold funded keys and --contract a deployed contract.
+
+Every run sends fills_per_key fills per key, so all runs span the same number of blocks.
+
+Usage: python benchmarks/bench_lanes.py [fills_per_key] [--keys-counts 1,2,4,8] [--rtt 20] [--block-time 4]
+"""
+import argparse
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiohttp import web
+from eth_account import Account
+from loguru import logger
+
+from bench_decoder import POOLS, order_item, pool_item
+from lanes import MAX_PENDING_PER_LANE, ExecutionLanes
+from orders import Order
+from pools import PoolData
+
+CONTRACT_ADDRESS = "0x71486C325a1dFd990a3A21D8DEBE82D1d4ed3C88"
+ABI_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "contracts", f"{CONTRACT_ADDRESS}.abi.json")
+KEY_COUNTS = (1, 2, 4, 8)
+# Seconds between checks for the benchmark's fills being mined.
+MINED_POLL_INTERVAL = 0.05
+
+
+class StubChain:
+    """ JSON-RPC node with per-sender nonces, a slot limit per sender and a block every block_time seconds. """
+
+    def __init__(self, rtt: float, block_time: float, slots: int):
+        self.rtt = rtt
+        self.block_time = block_time
+        self.slots = slots
+        self.block = 1
+        self.sent = defaultdict(int)
+        self.mined = defaultdict(int)
+
+    def result(self, method, params):
+        if method == "eth_sendRawTransaction":
+            sender = Account.recover_transaction(params[0]).lower()
+            if self.sent[sender] - self.mined[sender] >= self.slots:
+                raise ValueError("txpool is full")
+            self.sent[sender] += 1
+            return "0x" + hashlib.sha256(bytes.fromhex(params[0][2:])).hexdigest()
+        if method == "eth_getTransactionCount":
+            counts = self.sent if params[1] == "pending" else self.mined
+            return hex(counts[params[0].lower()])
+        if method == "eth_feeHistory":
+            return {
+                "oldestBlock": "0x1",
+                "baseFeePerGas": [hex(10 ** 9)] * 11,
+                "gasUsedRatio": [0.5] * 10,
+                "reward": [[hex(10 ** 8), hex(2 * 10 ** 9), hex(5 * 10 ** 9)]] * 10,
+            }
+        if method == "eth_blockNumber":
+            return hex(self.block)
+        return {"eth_chainId": "0x1", "eth_gasPrice": hex(10 ** 9), "eth_estimateGas": hex(120000)}[method]
+
+    def respond(self, call):
+        try:
+            return {"jsonrpc": "2.0", "id": call["id"], "result": self.result(call["method"], call["params"])}
+        except ValueError as e:
+            return {"jsonrpc": "2.0", "id": call["id"], "error": {"code": -32000, "message": str(e)}}
+
+    async def handle(self, request):
+        body = await request.json()
+        await asyncio.sleep(self.rtt)
+        calls = body if isinstance(body, list) else [body]
+        responses = [self.respond(call) for call in calls]
+        return web.json_response(responses if isinstance(body, list) else responses[0])
+
+    async def mine(self):
+        while True:
+            await asyncio.sleep(self.block_time)
+            self.block += 1
+            self.mined.update(self.sent)
+
+    async def start(self) -> str:
+        app = web.Application()
+        app.router.add_post("/", self.handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, "127.0.0.1", 0).start()
+        self.miner = asyncio.create_task(self.mine())
+        return f"http://127.0.0.1:{self.runner.addresses[0][1]}/"
+
+    @classmethod
+    def serve(cls, conn, rtt: float, block_time: float, slots: int):
+        """ Child process entry point: sends the URL back over conn and serves until terminated. """
+
+        async def main():
+            conn.send(await cls(rtt, block_time, slots).start())
+            await asyncio.Event().wait()
+
+        asyncio.run(main())
+
+
+def start_stub_chain(rtt: float, block_time: float, slots: int):
+    """ Run StubChain in its own process so its signature recovery does not compete with the lanes' signing. """
+    parent, child = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=StubChain.serve, args=(child, rtt, block_time, slots), daemon=True)
+    process.start()
+    return process, parent.recv()
+
+
+def fills(count):
+    """ count fill requests for SHORT orders spread over POOLS pools. """
+    pools = {pool.id: pool for pool in (PoolData.from_json(pool_item(i)) for i in range(POOLS))}
+    orders = [Order.from_json(order_item(2 * i + 1)) for i in range(count)]
+    requests = []
+    for order in orders:
+        requests.append(({
+            "maker": order.maker,
+            "taker": "0x0000000000000000000000000000000000000000",
+            "expiry": order.expiry.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+            "direction": order.direction,
+            "offered_long_shares": str(order.offered_long_shares),
+            "requested_upfront_token": order.requested_upfront_token,
+            "requested_upfront_amount": str(order.requested_upfront_amount),
+            "signature": order.signature,
+        }, pools[order.pool_id]))
+    return requests
+
+
+async def wait_until_mined(lanes):
+    for lane in lanes.lanes:
+        sent = await lane.calls.nonce_manager.peek()
+        while await lane.calls.web3.eth.get_transaction_count(lane.account, "latest") < sent:
+            await asyncio.sleep(MINED_POLL_INTERVAL)
+
+
+async def run(per_key, key_counts, url, keys, contract, rtt, block_time, slots):
+    chain = None
+    if url is None:
+        chain, url = start_stub_chain(rtt, block_time, slots)
+        print(f"stub chain: rtt={rtt * 1000:.0f} ms, block time={block_time:g} s, {slots} slots per account")
+    with open(ABI_PATH) as f:
+        abi = f.read()
+    requests = fills(per_key * max(key_counts))
+    base = None
+    print(f"{'keys':>4} {'fills':>6} {'seconds':>8} {'mined/s':>8} {'speedup':>8}  per lane")
+    for n in key_counts:
+        lane_keys = keys[:n] if keys else [Account.create().key.hex() for _ in range(n)]
+        lanes = await ExecutionLanes.connect(url, contract, abi, lane_keys, poa=False, fill_affinity=None)
+        async with lanes:
+            count = per_key * n
+            start = time.perf_counter()
+            results = await asyncio.gather(*(lanes.fill_order(order, pool) for order, pool in requests[:count]))
+            await wait_until_mined(lanes)
+            elapsed = time.perf_counter() - start
+            errors = [r["error"] for r in results if r["error"] is not None]
+            if errors:
+                print(f"{len(errors)} fills failed, first: {errors[0]}")
+            rate = (count - len(errors)) / elapsed
+            base = base or rate / n
+            print(f"{n:>4} {count:>6} {elapsed:8.2f} {rate:8.1f} {rate / base:7.2f}x  {[s['sent'] for s in lanes.stats()]}")
+    if chain is not None:
+        chain.terminate()
+
+
+if __name__ == "__main__":
+    logger.remove()
+    parser = argparse.ArgumentParser(description="Execution lane scaling")
+    parser.add_argument("fills_per_key", nargs="?", type=int, default=64)
+    parser.add_argument("--keys-counts", default=",".join(map(str, KEY_COUNTS)), help="comma separated numbers of keys")
+    parser.add_argument("--url", help="dev chain RPC URL instead of the stub")
+    parser.add_argument("--keys", default="", help="comma separated funded private keys for --url")
+    parser.add_argument("--contract", default=CONTRACT_ADDRESS, help="contract address on --url")
+    parser.add_argument("--rtt", type=float, default=20, help="stub round trip (ms)")
+    parser.add_argument("--block-time", type=float, default=4.0, help="stub block time (s)")
+    parser.add_argument("--slots", type=int, default=MAX_PENDING_PER_LANE, help="stub unmined transactions per account")
+    args = parser.parse_args()
+    keys = [key for key in args.keys.split(",") if key]
+    key_counts = [int(n) for n in args.keys_counts.split(",")]
+    if args.url and len(keys) < max(key_counts):
+        parser.error("--url needs at least as many --keys as the largest key count")
+    asyncio.run(run(args.fills_per_key, key_counts, args.url, keys, args.contract, args.rtt / 1000, args.block_time, args.slots))
@@ -0,0 +1,67 @@
+""" Memory and construction time of Order/PoolData storage layouts.
+
+Compares dict-backed instances (the pre-__slots__ layout), the slotted Order and the columnar
+OrderTable for a synthetic book.
+
+Usage: python benchmarks/bench_memory.py [orders]
+"""
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from order_table import OrderTable
+from orders import Order
+from pools import PoolData
+
+# Same attributes as Order, but with a per-instance __dict__.
+DictOrder = type("DictOrder", (), {"__init__": Order.__init__})
+DictPoolData = type("DictPoolData", (), {"__init__": PoolData.__init__})
+
+
+def order_args(i):
+    expiry = datetime(2024, 6, 15, tzinfo=timezone.utc) + timedelta(seconds=i)
+    if i % 2:
+        return (f"id-{i}", f"0x{i:064x}", expiry, "pool", "0xd01C9047f8918D1296C87024219a728Ec5Dd515b", "LONG",
+                "0x" + "ee" * 65, 9921 + i, None, "0x23aC6531349546f0909A9Cd06D3fC7A0be67E9b6", None,
+                None, 190000 + i, Decimal(0))
+    return (f"id-{i}", f"0x{i:064x}", expiry, "pool", "0xd01C9047f8918D1296C87024219a728Ec5Dd515b", "SHORT",
+            "0x" + "ee" * 65, None, 198413 + i, None, "0x23aC6531349546f0909A9Cd06D3fC7A0be67E9b6",
+            15200000 + i, None, Decimal(0))
+
+
+def pool_args(i):
+    start = datetime(2024, 4, 29, tzinfo=timezone.utc)
+    return (f"pool-{i}", f"0x{i:064x}", "0xBDB06E1FBfAb742F0f5e72a85E57418437D505e9", "BTC_TX_FEE", 504000, 0,
+            "0x23aC6531349546f0909A9Cd06D3fC7A0be67E9b6", start + timedelta(days=7), start, 10067400000, None, None,
+            16534919350, 32807533, 32807533)
+
+
+def measure(label, build, count):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<28} {current / count:8.1f} B/row {count / elapsed:12.0f} rows/s")
+    return result
+
+
+def run(count):
+    rows = [order_args(i) for i in range(count)]
+    pools = [pool_args(i) for i in range(count)]
+    print(f"rows={count} (argument tuples allocated up front and excluded)")
+    measure("Order (dict-backed)", lambda: [DictOrder(*args) for args in rows], count)
+    orders = measure("Order (__slots__)", lambda: [Order(*args) for args in rows], count)
+    measure("OrderTable (columnar)", lambda: OrderTable.from_orders(orders), count)
+    measure("PoolData (dict-backed)", lambda: [DictPoolData(*args) for args in pools], count)
+    measure("PoolData (__slots__)", lambda: [PoolData(*args) for args in pools], count)
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
@@ -0,0 +1,293 @@
+""" Throughput and allocations of the order pipeline hot paths on synthetic books, checked against a baseline.
+
+Every case runs on books of 1k, 10k and 100k orders; hashing, signing and placing only process
+the first CASE_LIMITS orders of a book. place_order posts to a stub GraphQL server on localhost, so the
+suite needs no network. Results are compared with benchmarks/baseline.json and any case that lost
+more than --tolerance of its ops/s (or grew its allocations by as much) is flagged and the script
+exits with status 1. Baselines are machine specific: re-record with --save-baseline after changing
+hardware or Python.
+
+Usage: python benchmarks/bench_pipeline.py [--sizes 1000,10000] [--cases hash_order,...] [--save-baseline]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiohttp import web
+from loguru import logger
+
+import graphql_calls
+import order_factory
+from bench_decoder import POOLS, order_item, pool_item
+from calldata import CalldataEncoder
+from contract_calls import OrderParamsConverter
+from orders import Order
+from pools import PoolData
+from utils import date_to_block_timestamp, shares_to_size_kb, size_kb_to_shares
+
+SIZES = (1000, 10000, 100000)
+# Orders per book processed by the cases too slow to run on 100k (ECDSA signing is ~4 ms per order).
+CASE_LIMITS = {"hash_order": 10000, "generate_signature": 200, "place_order": 10000}
+# Timed runs per case (at least REPEAT, and at least MIN_TIME seconds in total); the fastest one is reported.
+REPEAT = 3
+MIN_TIME = 0.5
+# Relative ops/s loss (or allocation growth) against the baseline that counts as a regression.
+TOLERANCE = 0.2
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+# Fixed key so signatures (and their cost) are reproducible.
+BENCH_PRIVATE_KEY = "0x" + "42" * 32
+ABI_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "contracts", "0x71486C325a1dFd990a3A21D8DEBE82D1d4ed3C88.abi.json"
+)
+FILL_FRACTION = 10 ** 18
+
+
+class Book:
+    """ A synthetic book of count orders over POOLS pools, with every case's inputs built up front. """
+
+    def __init__(self, count: int):
+        self.count = count
+        self.order_items = [order_item(i) for i in range(count)]
+        self.pool_items = [pool_item(i) for i in range(count)]
+        self.orders = [Order.from_json(item) for item in self.order_items]
+        self.pools = {pool.id: pool for pool in (PoolData.from_json(pool_item(i)) for i in range(POOLS))}
+        self.order_pools = [self.pools[order.pool_id] for order in self.orders]
+        self.prices_and_sizes = [order.to_price_and_size(pool) for order, pool in zip(self.orders, self.order_pools)]
+        self.shares = [order.requested_long_shares or order.offered_long_shares for order in self.orders]
+        self.sizes = [size for _, size in self.prices_and_sizes]
+        self.hash_payloads = [order_factory.generate_order_payload_for_hash(order) for order in self.orders[:CASE_LIMITS["hash_order"]]]
+        self.order_hashes = [order.order_hash for order in self.orders[:CASE_LIMITS["generate_signature"]]]
+        self.order_params = [self._order_params(order) for order in self.orders]
+        self.order_tuples = [OrderParamsConverter.dict_to_tuple(p, pool) for p, pool in zip(self.order_params, self.order_pools)]
+        self.signatures = [bytes.fromhex(order.signature[2:]) for order in self.orders]
+        with open(ABI_PATH) as f:
+            self.encoder = CalldataEncoder(json.load(f))
+        self.place_payloads = [order_factory.generate_order_payload(order) for order in self.orders[:CASE_LIMITS["place_order"]]]
+
+    @staticmethod
+    def _order_params(order: Order):
+        return {
+            "maker": order.maker,
+            "taker": "0x0000000000000000000000000000000000000000",
+            "expiry": order.expiry.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+            "direction": order.direction,
+            "offered_upfront_token": order.offered_upfront_token,
+            "offered_upfront_amount": str(order.offered_upfront_amount or 0),
+            "offered_long_shares": str(order.offered_long_shares or 0),
+            "requested_upfront_token": order.requested_upfront_token,
+            "requested_upfront_amount": str(order.requested_upfront_amount or 0),
+            "requested_long_shares": str(order.requested_long_shares or 0),
+            "signature": order.signature,
+        }
+
+
+def order_from_json(book):
+    return len([Order.from_json(item) for item in book.order_items])
+
+
+def pool_from_json(book):
+    return len([PoolData.from_json(item) for item in book.pool_items])
+
+
+def to_price_and_size(book):
+    return len([order.to_price_and_size(pool) for order, pool in zip(book.orders, book.order_pools)])
+
+
+def from_price_and_size(book):
+    for order, pool, (price, size) in zip(book.orders, book.order_pools, book.prices_and_sizes):
+        order.from_price_and_size(price, size, pool)
+    return book.count
+
+
+def utils_shares_to_size_kb(book):
+    return len([
+        shares_to_size_kb(shares, pool.target_start_timestamp, pool.target_end_timestamp)
+        for shares, pool in zip(book.shares, book.order_pools)
+    ])
+
+
+def utils_size_kb_to_shares(book):
+    return len([
+        size_kb_to_shares(size, pool.target_start_timestamp, pool.target_end_timestamp)
+        for size, pool in zip(book.sizes, book.order_pools)
+    ])
+
+
+def utils_date_to_block_timestamp(book):
+    return len([date_to_block_timestamp(order.expiry) for order in book.orders])
+
+
+def hash_order(book):
+    return len([order_factory.hash_order(pool, payload) for payload, pool in zip(book.hash_payloads, book.order_pools)])
+
+
+def generate_signature(book):
+    return len([order_factory.generate_signature(order_hash, BENCH_PRIVATE_KEY) for order_hash in book.order_hashes])
+
+
+def dict_to_tuple(book):
+    return len([
+        OrderParamsConverter.dict_to_tuple(params, pool) for params, pool in zip(book.order_params, book.order_pools)
+    ])
+
+
+def fill_calldata(book):
+    return len([
+        book.encoder.fill_order(order_tuple, signature, FILL_FRACTION)
+        for order_tuple, signature in zip(book.order_tuples, book.signatures)
+    ])
+
+
+class StubServer:
+    """ Local GraphQL endpoint answering every createOrder mutation with a fixed id. """
+
+    async def __aenter__(self):
+        async def handle(request):
+            await request.read()
+            return web.json_response({"data": {"createOrder": {"id": "stub"}}})
+
+        app = web.Application()
+        app.router.add_post("/graphql", handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, "127.0.0.1", 0).start()
+        port = self.runner.addresses[0][1]
+        self.url = f"http://127.0.0.1:{port}/graphql"
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.runner.cleanup()
+
+
+async def _place_orders(book):
+    async with StubServer() as server:
+        graphql_calls.URL = server.url
+        semaphore = asyncio.Semaphore(graphql_calls.PLACE_ORDERS_CONCURRENCY)
+        async with graphql_calls.create_graphql_session() as session:
+
+            async def place(payload):
+                async with semaphore:
+                    return await graphql_calls.place_order(session, payload)
+
+            results = await asyncio.gather(*(place(payload) for payload in book.place_payloads))
+    assert all(result is not None for result in results)
+    return len(results)
+
+
+def place_order(book):
+    return asyncio.run(_place_orders(book))
+
+
+CASES = {
+    "order_from_json": order_from_json,
+    "pool_from_json": pool_from_json,
+    "to_price_and_size": to_price_and_size,
+    "from_price_and_size": from_price_and_size,
+    "utils.shares_to_size_kb": utils_shares_to_size_kb,
+    "utils.size_kb_to_shares": utils_size_kb_to_shares,
+    "utils.date_to_block_timestamp": utils_date_to_block_timestamp,
+    "hash_order": hash_order,
+    "generate_signature": generate_signature,
+    "dict_to_tuple": dict_to_tuple,
+    "fill_calldata": fill_calldata,
+    "place_order": place_order,
+}
+
+
+def measure(case, book, repeat=REPEAT):
+    """ (ops, best ops/s, peak traced bytes per op) of one case on one book. """
+    best = None
+    runs = total = 0
+    while runs < repeat or total < MIN_TIME:
+        start = time.perf_counter()
+        ops = case(book)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+        runs += 1
+        total += elapsed
+    tracemalloc.start()
+    case(book)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return ops, ops / best, peak / ops
+
+
+def compare(results, baseline, tolerance):
+    """ Lines describing every case that regressed against the baseline. """
+    regressions = []
+    for name, by_size in results.items():
+        for size, result in by_size.items():
+            reference = baseline.get(name, {}).get(size)
+            if reference is None:
+                continue
+            if result["ops_per_sec"] < reference["ops_per_sec"] * (1 - tolerance):
+                regressions.append(
+                    f"{name} @ {size}: {result['ops_per_sec']:.0f} ops/s vs baseline {reference['ops_per_sec']:.0f}"
+                )
+            if result["alloc_bytes_per_op"] > reference["alloc_bytes_per_op"] * (1 + tolerance):
+                regressions.append(
+                    f"{name} @ {size}: {result['alloc_bytes_per_op']:.0f} B/op vs baseline {reference['alloc_bytes_per_op']:.0f}"
+                )
+    return regressions
+
+
+def run(sizes, names, save_baseline, tolerance, baseline_path):
+    results = {name: {} for name in names}
+    print(f"{'case':<32} {'book':>7} {'ops':>7} {'ops/s':>12} {'alloc B/op':>11}")
+    for size in sizes:
+        book = Book(size)
+        for name in names:
+            ops, ops_per_sec, alloc = measure(CASES[name], book)
+            results[name][str(size)] = {"ops": ops, "ops_per_sec": round(ops_per_sec, 1), "alloc_bytes_per_op": round(alloc, 1)}
+            print(f"{name:<32} {size:>7} {ops:>7} {ops_per_sec:12.0f} {alloc:11.1f}")
+
+    if save_baseline:
+        baseline = {"python": platform.python_version(), "machine": platform.platform(), "results": {}}
+        if os.path.exists(baseline_path):
+            with open(baseline_path) as f:
+                baseline = json.load(f)
+        baseline.update(python=platform.python_version(), machine=platform.platform())
+        baseline["recorded"] = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        for name, by_size in results.items():
+            baseline["results"].setdefault(name, {}).update(by_size)
+        with open(baseline_path, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline written to {baseline_path}")
+        return 0
+
+    if not os.path.exists(baseline_path):
+        print("No baseline recorded; run with --save-baseline")
+        return 0
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline["results"], tolerance)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    if not regressions:
+        print(f"No regressions against the baseline recorded on {baseline.get('machine')} (tolerance {tolerance:.0%})")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    logger.remove()
+    parser = argparse.ArgumentParser(description="Order pipeline benchmarks")
+    parser.add_argument("--sizes", default=",".join(map(str, SIZES)), help="comma separated book sizes")
+    parser.add_argument("--cases", default=",".join(CASES), help="comma separated case names")
+    parser.add_argument("--save-baseline", action="store_true", help="record the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="allowed relative regression")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline JSON path")
+    args = parser.parse_args()
+    names = args.cases.split(",")
+    unknown = [name for name in names if name not in CASES]
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(unknown)}")
+    sys.exit(run([int(s) for s in args.sizes.split(",")], names, args.save_baseline, args.tolerance, args.baseline))
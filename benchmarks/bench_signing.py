@@ -0,0 +1,77 @@
+""" Throughput of create_order (sequential signing) vs create_orders (process pool signing).
+
+Usage: python benchmarks/bench_signing.py [levels] [workers]
+"""
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from eth_account import Account
+from loguru import logger
+
+import order_factory
+from pools import PoolData
+from signing import OrderSigner
+
+BENCH_POOL = {
+    "id": "b8c2d443-ef62-4c03-afbf-d0d4e77c8852",
+    "poolHash": "0x2032def583038eb920f09eb011e4d0e403c4615aef9a2f3af651627808e14888",
+    "index": "0xBDB06E1FBfAb742F0f5e72a85E57418437D505e9",
+    "indexName": "BTC_TX_FEE",
+    "cap": "504000",
+    "floor": "0",
+    "payoutToken": "0x23aC6531349546f0909A9Cd06D3fC7A0be67E9b6",
+    "targetEndTimestamp": "2024-05-06T03:00:00.000Z",
+    "targetStartTimestamp": "2024-04-29T03:00:00.000Z",
+    "totalUpfrontPayment": {"amount": "10067400000"},
+    "state": {
+        "actualEndTimestamp": None,
+        "balanceChangePerShare": None,
+        "collateralMinted": "16534919350",
+        "sharesMinted": "32807533",
+        "totalMinted": "32807533",
+    },
+}
+
+
+def make_ladder(count):
+    expiry = datetime.now() + timedelta(days=1)
+    return [
+        (Decimal(4000 + 10 * i), Decimal(1), "LONG" if i % 2 else "SHORT", expiry)
+        for i in range(count)
+    ]
+
+
+async def run(count, workers):
+    account = Account.create()
+    order_factory.ACCOUNT = account.address
+    order_factory.PRIVATE_KEY = account.key.hex()
+    pool = PoolData.from_json(BENCH_POOL)
+    ladder = make_ladder(count)
+
+    start = time.perf_counter()
+    sequential = [await order_factory.create_order(pool, *level) for level in ladder]
+    sequential_elapsed = time.perf_counter() - start
+
+    with OrderSigner(order_factory.PRIVATE_KEY, max_workers=workers) as signer:
+        await signer.sign_digests_async([b"\x00" * 32])  # warm the workers up
+        start = time.perf_counter()
+        batched = await order_factory.create_orders(pool, ladder, signer=signer)
+        batched_elapsed = time.perf_counter() - start
+
+    assert [o.signature for o in batched] == [o.signature for o in sequential]
+    print(f"levels={count} workers={signer.max_workers}")
+    print(f"create_order  (sequential): {count / sequential_elapsed:10.1f} orders/s")
+    print(f"create_orders (pool):       {count / batched_elapsed:10.1f} orders/s")
+
+
+if __name__ == "__main__":
+    logger.remove()
+    levels = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    asyncio.run(run(levels, workers))
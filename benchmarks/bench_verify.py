@@ -0,0 +1,62 @@
+""" Signature verification of book orders: sequential recovery vs OrderVerifier's process pool, and cached re-checks.
+
+Usage: python benchmarks/bench_verify.py [orders] [workers]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from eth_account import Account
+from loguru import logger
+
+import order_factory
+from bench_decoder import POOLS, order_item, pool_item
+from orders import Order
+from pools import PoolData
+from verifier import OrderVerifier, recover_signer
+
+
+def signed_book(count, verifier):
+    """ count orders signed by a fresh maker over POOLS pools, every tenth with a tampered amount. """
+    maker = Account.create()
+    pools = {pool.id: pool for pool in (PoolData.from_json(pool_item(i)) for i in range(POOLS))}
+    orders = [Order.from_json(dict(order_item(i), maker=maker.address)) for i in range(count)]
+    for i, order in enumerate(orders):
+        digest = verifier.digest(order, pools[order.pool_id])
+        order.signature = order_factory.generate_signature("0x" + digest.hex(), maker.key.hex())
+        if i % 10 == 0:
+            order.requested_upfront_token = order.offered_upfront_token = maker.address
+    return orders, pools
+
+
+def run(count, workers):
+    with OrderVerifier(order_factory.CHAIN_ID, order_factory.CONTRACT_ADDRESS, max_workers=workers) as verifier:
+        orders, pools = signed_book(count, verifier)
+        print(f"orders={count} workers={verifier.max_workers} cpus={os.cpu_count()}")
+
+        start = time.perf_counter()
+        sequential = [
+            recover_signer(verifier.digest(order, pools[order.pool_id]), order.signature) == order.maker.lower()
+            for order in orders
+        ]
+        elapsed = time.perf_counter() - start
+        print(f"{'sequential recovery':<24} {elapsed * 1000:10.1f} ms {elapsed / count * 1e6:10.1f} us/order")
+
+        start = time.perf_counter()
+        verdicts = verifier.verify(orders, pools)
+        elapsed = time.perf_counter() - start
+        print(f"{'OrderVerifier.verify':<24} {elapsed * 1000:10.1f} ms {elapsed / count * 1e6:10.1f} us/order")
+        assert verdicts == sequential
+        assert verdicts.count(False) == -(-count // 10)
+
+        start = time.perf_counter()
+        verifier.verify(orders, pools)
+        elapsed = time.perf_counter() - start
+        print(f"{'cached re-check':<24} {elapsed * 1000:10.1f} ms {elapsed / count * 1e6:10.1f} us/order")
+
+
+if __name__ == "__main__":
+    logger.remove()
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 200, int(sys.argv[2]) if len(sys.argv) > 2 else None)
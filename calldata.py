@@ -0,0 +1,134 @@
+from functools import lru_cache
+from typing import Any, Dict, Sequence
+
+from eth_utils import function_abi_to_4byte_selector, keccak
+
+POOL_PARAMS_TYPE = "(uint128,uint128,address,uint48,uint48,address)"
+SILICA_ORDER_TYPE = (
+    f"(address,address,uint48,address,uint128,{POOL_PARAMS_TYPE},uint128,address,uint128,{POOL_PARAMS_TYPE},uint128)"
+)
+SIGNATURES = {
+    "fillOrder": f"fillOrder({SILICA_ORDER_TYPE},bytes,uint256)",
+    "fillOrders": f"fillOrders({SILICA_ORDER_TYPE}[],bytes[],uint256[])",
+    "cancelOrders": f"cancelOrders({SILICA_ORDER_TYPE}[])",
+}
+
+WORD = 32
+# A SilicaOrder is static: 9 scalar words plus two 6-word PoolParams, encoded inline.
+ORDER_SIZE = 21 * WORD
+UINT48_LIMIT = 1 << 48
+UINT128_LIMIT = 1 << 128
+UINT256_LIMIT = 1 << 256
+
+
+def _uint(value: int, limit: int = UINT256_LIMIT) -> bytes:
+    if not 0 <= value < limit:
+        raise ValueError(f"Value {value} out of range for uint{limit.bit_length() - 1}")
+    return value.to_bytes(WORD, "big")
+
+
+@lru_cache(maxsize=4096)
+def _address(address: str) -> bytes:
+    raw = bytes.fromhex(address[2:])
+    if len(raw) != 20:
+        raise ValueError(f"Invalid address {address}")
+    return raw.rjust(WORD, b"\x00")
+
+
+def _padded(length: int) -> int:
+    return -(-length // WORD) * WORD
+
+
+def _bytes(value: bytes) -> bytes:
+    """ Length-prefixed, zero-padded bytes. """
+    return _uint(len(value)) + value + bytes(_padded(len(value)) - len(value))
+
+
+class CalldataEncoder:
+    """ Precompiled calldata for fillOrder, fillOrders and cancelOrders, byte-for-byte equal to
+    contract.encodeABI with the same arguments (SilicaOrder tuples from OrderParamsConverter).
+
+    The selectors come from the ABI once and are checked against the layout encoded here, and the
+    six PoolParams words are cached per params tuple. Every call builds its own bytes, so one
+    encoder can be shared between threads.
+    """
+
+    def __init__(self, abi: Sequence[Dict[str, Any]]):
+        self.selectors: Dict[str, bytes] = {}
+        for name, signature in SIGNATURES.items():
+            entry = next(e for e in abi if e.get("type") == "function" and e["name"] == name)
+            selector = function_abi_to_4byte_selector(entry)
+            if selector != keccak(text=signature)[:4]:
+                raise ValueError(f"ABI of {name} does not match {signature}")
+            self.selectors[name] = selector
+        self._pool_words: Dict[tuple, bytes] = {}
+
+    def _pool(self, params: tuple) -> bytes:
+        words = self._pool_words.get(params)
+        if words is None:
+            floor, cap, index, start, end, payout_token = params
+            words = self._pool_words[params] = (
+                _uint(floor, UINT128_LIMIT)
+                + _uint(cap, UINT128_LIMIT)
+                + _address(index)
+                + _uint(start, UINT48_LIMIT)
+                + _uint(end, UINT48_LIMIT)
+                + _address(payout_token)
+            )
+        return words
+
+    def _order(self, order: tuple) -> bytes:
+        (maker, taker, expiry, offered_token, offered_amount, offered_params, offered_shares,
+         requested_token, requested_amount, requested_params, requested_shares) = order
+        return (
+            _address(maker)
+            + _address(taker)
+            + _uint(expiry, UINT48_LIMIT)
+            + _address(offered_token)
+            + _uint(offered_amount, UINT128_LIMIT)
+            + self._pool(offered_params)
+            + _uint(offered_shares, UINT128_LIMIT)
+            + _address(requested_token)
+            + _uint(requested_amount, UINT128_LIMIT)
+            + self._pool(requested_params)
+            + _uint(requested_shares, UINT128_LIMIT)
+        )
+
+    def fill_order(self, order: tuple, signature: bytes, fraction: int) -> str:
+        """ fillOrder(order, signature, fraction): the order inline, then the offset to and the padded signature. """
+        return "0x" + b"".join((
+            self.selectors["fillOrder"],
+            self._order(order),
+            _uint(ORDER_SIZE + 2 * WORD),
+            _uint(fraction),
+            _bytes(signature),
+        )).hex()
+
+    def fill_orders(self, orders: Sequence[tuple], signatures: Sequence[bytes], fractions: Sequence[int]) -> str:
+        """ fillOrders(orders, signatures, fractions). """
+        orders_part = self._orders(orders)
+        # bytes[] heads are offsets from the first head to each length-prefixed signature.
+        encoded = [_bytes(signature) for signature in signatures]
+        heads, offset = [], len(encoded) * WORD
+        for value in encoded:
+            heads.append(_uint(offset))
+            offset += len(value)
+        signatures_part = b"".join([_uint(len(encoded))] + heads + encoded)
+        fractions_part = b"".join([_uint(len(fractions))] + [_uint(fraction) for fraction in fractions])
+        return "0x" + b"".join((
+            self.selectors["fillOrders"],
+            _uint(3 * WORD),
+            _uint(3 * WORD + len(orders_part)),
+            _uint(3 * WORD + len(orders_part) + len(signatures_part)),
+            orders_part,
+            signatures_part,
+            fractions_part,
+        )).hex()
+
+    def cancel_orders(self, orders: Sequence[tuple]) -> str:
+        """ cancelOrders(orders). """
+        return "0x" + b"".join((self.selectors["cancelOrders"], _uint(WORD), self._orders(orders))).hex()
+
+    def _orders(self, orders: Sequence[tuple]) -> bytes:
+        """ Length-prefixed SilicaOrder[]. """
+        return b"".join([_uint(len(orders))] + [self._order(order) for order in orders])
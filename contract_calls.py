@@ -2,53 +2,98 @@ from web3 import Web3
 from loguru import logger
 import time
 import json
-from datetime import datetime
-from eth_account.messages import encode_defunct
-from eth_account import Account
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence
+from calldata import CalldataEncoder
+from fee_engine import GAS_ESTIMATE_MARGIN, SPEED_UP_BLOCKS, FeeEngine, PendingTransaction
+from metrics import timed
+from nonce_manager import NonceManager, is_already_known, is_nonce_error
+from rpc_cache import RpcCache
+
+# Gas accounting used to pack fills into fillOrders transactions.
+FILL_ORDER_GAS = 50000
+FILL_ORDERS_BASE_GAS = 30000
+DEFAULT_FILL_GAS_BUDGET = 1000000
+# Intrinsic gas every transaction pays, included once in each single-order gas estimate.
+TX_INTRINSIC_GAS = 21000
+# How many times a send is retried after a nonce resync.
+NONCE_RETRIES = 3
+# ABI error the contract reverts fills with a bad maker signature with.
+INVALID_SIGNATURE = "SilicaPools__InvalidSignature"
+
+ZERO_POOL_PARAMS = (0, 0, "0x0000000000000000000000000000000000000000", 0, 0, "0x0000000000000000000000000000000000000000")
+# PoolParams tuples by pool_hash; the fields a pool hash commits to never change.
+_POOL_PARAMS: Dict[str, tuple] = {}
+
+
+@lru_cache(maxsize=4096)
+def expiry_timestamp(expiry: str) -> int:
+    """ Memoized epoch seconds of a fill payload's expiry (UTC, as the trailing Z says); ladders share a handful of expiries. """
+    return int(datetime.strptime(expiry, "%Y-%m-%dT%H:%M:%S.%fZ").replace(tzinfo=timezone.utc).timestamp())
+
 
 class OrderParamsConverter:
     # Define limits and whitelist
 
     @staticmethod
-    def dict_to_tuple(order_params, pool_data):
-        shares_params_empty = (
-            0, 0, "0x0000000000000000000000000000000000000000", 0, 0, "0x0000000000000000000000000000000000000000"
-        )
-        # Create hardcoded tuples for offered_long_shares_params and requested_long_shares_params
-        offered_long_shares_params = (
-            pool_data.floor,  # floor
-            pool_data.cap,  # cap
-            pool_data.index,  # index
-            int(pool_data.target_start_timestamp.timestamp()),  # targetStartTimestamp
-            int(pool_data.target_end_timestamp.timestamp()),  # targetEndTimestamp
-            pool_data.payout_token  # payoutToken
-        )
+    def pool_params(pool_data) -> tuple:
+        """ The PoolParams struct of a pool, built once per pool_hash. """
+        params = _POOL_PARAMS.get(pool_data.pool_hash)
+        if params is None:
+            params = (
+                pool_data.floor,
+                pool_data.cap,
+                pool_data.index,
+                int(pool_data.target_start_timestamp.timestamp()),
+                int(pool_data.target_end_timestamp.timestamp()),
+                pool_data.payout_token,
+            )
+            if pool_data.pool_hash is not None:
+                _POOL_PARAMS[pool_data.pool_hash] = params
+        return params
 
-        requested_long_shares_params = (
-            pool_data.floor,  # floor
-            pool_data.cap,  # cap
-            pool_data.index,  # index
-            int(pool_data.target_start_timestamp.timestamp()),  # targetStartTimestamp
-            int(pool_data.target_end_timestamp.timestamp()),  # targetEndTimestamp
-            pool_data.payout_token  # payoutToken
+    @staticmethod
+    def order_to_tuple(order, pool_data) -> tuple:
+        """ The SilicaOrder struct of one of our own Orders exactly as it was signed (see eip712.OrderHasher),
+        e.g. for cancelOrders. Pool params are only set on the side that carries long shares. """
+        pool_params = OrderParamsConverter.pool_params(pool_data)
+        offered_long_shares = int(order.offered_long_shares or 0)
+        requested_long_shares = int(order.requested_long_shares or 0)
+        return (
+            order.maker,
+            "0x0000000000000000000000000000000000000000",
+            int(order.expiry.timestamp()),
+            order.offered_upfront_token or "0x0000000000000000000000000000000000000000",
+            int(order.offered_upfront_amount or 0),
+            pool_params if offered_long_shares else ZERO_POOL_PARAMS,
+            offered_long_shares,
+            order.requested_upfront_token or "0x0000000000000000000000000000000000000000",
+            int(order.requested_upfront_amount or 0),
+            pool_params if requested_long_shares else ZERO_POOL_PARAMS,
+            requested_long_shares,
         )
 
-        if order_params["direction"] == "SHORT":
-            return (
-                order_params["maker"],
-                order_params["taker"],
-                int(datetime.strptime(order_params["expiry"], "%Y-%m-%dT%H:%M:%S.%fZ").timestamp()),
-                order_params.get("offered_upfront_token") or "0x0000000000000000000000000000000000000000",  # Default to zero address if None
-                int(order_params.get("offered_upfront_amount", 0)),  # Default to 0 if None
-                offered_long_shares_params,
-                int(order_params["requested_long_shares"], 0) or 0,
-                order_params.get("requested_upfront_token") or "0x0000000000000000000000000000000000000000",  # Default to zero address if None
-                int(order_params.get("requested_upfront_amount", 0) or 0) or 0,  # Default to 0 if None
-                shares_params_empty,
-                0,  # Set requested_long_shares to 0 for SHORT direction
-            )
-        else:
-            return None
+    @staticmethod
+    def dict_to_tuple(order_params, pool_data) -> tuple:
+        """ The SilicaOrder struct of a fill payload (snake_case order fields), LONG or SHORT. As in
+        order_to_tuple, pool params are only set on the side that carries long shares. """
+        pool_params = OrderParamsConverter.pool_params(pool_data)
+        offered_long_shares = int(order_params.get("offered_long_shares") or 0)
+        requested_long_shares = int(order_params.get("requested_long_shares") or 0)
+        return (
+            order_params["maker"],
+            order_params.get("taker") or "0x0000000000000000000000000000000000000000",
+            expiry_timestamp(order_params["expiry"]),
+            order_params.get("offered_upfront_token") or "0x0000000000000000000000000000000000000000",
+            int(order_params.get("offered_upfront_amount") or 0),
+            pool_params if offered_long_shares else ZERO_POOL_PARAMS,
+            offered_long_shares,
+            order_params.get("requested_upfront_token") or "0x0000000000000000000000000000000000000000",
+            int(order_params.get("requested_upfront_amount") or 0),
+            pool_params if requested_long_shares else ZERO_POOL_PARAMS,
+            requested_long_shares,
+        )
 
 
 class ContractCalls:
@@ -57,8 +102,91 @@ class ContractCalls:
         self.contract = contract
         self.account_address = account_address
         self.private_key = private_key
+        self.calldata = CalldataEncoder(contract.abi)
+        self.nonce_manager = NonceManager(web3, account_address)
+        self.rpc_cache = RpcCache(web3)
+        self.fee_engine = FeeEngine(web3, self.rpc_cache)
+        self.pending: Dict[int, PendingTransaction] = {}
+
+    @timed("send_transaction")
+    def _send_transaction(
+        self, data: str, gas: Optional[int] = None, chain_id: Optional[int] = None, urgency: str = "normal"
+    ) -> str:
+        """ Build, sign and broadcast a call of the contract with calldata data and a locally allocated nonce.
+
+        Nonce conflicts reported by the node trigger a resync and a retry, so concurrent
+        callers never have to wait on each other's round trips; a node that already holds the
+        signed transaction counts as a successful send. Fees come from the fee engine
+        (type 2 where the chain supports it) and a missing gas limit is estimated.
+        """
+        chain_id = chain_id if chain_id is not None else self.rpc_cache.chain_id()
+        if gas is None:
+            gas = int(self.web3.eth.estimate_gas(
+                {"from": self.account_address, "to": self.contract.address, "data": data}
+            ) * GAS_ESTIMATE_MARGIN)
+        for attempt in range(NONCE_RETRIES):
+            nonce = self.nonce_manager.allocate()
+            signed_txn = None
+            try:
+                txn = {
+                    "chainId": chain_id,
+                    "to": self.contract.address,
+                    "data": data,
+                    "value": 0,
+                    "gas": gas,
+                    "nonce": nonce,
+                    **self.fee_engine.tx_params(urgency),
+                }
+                signed_txn = self.web3.eth.account.sign_transaction(txn, private_key=self.private_key)
+                tx_hash = self.web3.eth.send_raw_transaction(signed_txn.rawTransaction).hex()
+            except Exception as e:
+                if signed_txn is not None and is_already_known(e):
+                    # The node already has this exact transaction (e.g. a retried broadcast), so it is sent.
+                    tx_hash = signed_txn.hash.hex()
+                elif is_nonce_error(e) and attempt < NONCE_RETRIES - 1:
+                    logger.warning(f"Nonce {nonce} rejected ({e}), resyncing")
+                    self.nonce_manager.resync()
+                    continue
+                else:
+                    self.nonce_manager.release(nonce)
+                    raise e
+            self.nonce_manager.confirm(nonce, tx_hash)
+            self.pending[nonce] = PendingTransaction(nonce, txn, tx_hash, self.rpc_cache.block_number())
+            return tx_hash
+
+    def speed_up(self, blocks: int = SPEED_UP_BLOCKS, urgency: str = "fast") -> List[str]:
+        """ Re-send every transaction not mined within blocks blocks with bumped fees and the same nonce.
 
-    def fill_order(self, order_data: dict, pool_data: dict) -> str:
+        Call it once per block (or poll). Mined nonces are dropped and their time-to-inclusion is
+        recorded on the fee engine. Returns the hashes of the replacements.
+        """
+        if not self.pending:
+            return []
+        block = self.rpc_cache.block_number()
+        mined = self.web3.eth.get_transaction_count(self.account_address, "latest")
+        replaced = []
+        for nonce in sorted(self.pending):
+            pending = self.pending[nonce]
+            if nonce < mined:
+                self.fee_engine.record_inclusion(self.pending.pop(nonce))
+                continue
+            if block - pending.sent_block < blocks:
+                continue
+            txn = dict(pending.txn, **self.fee_engine.replacement_params(pending.txn, urgency))
+            try:
+                signed_txn = self.web3.eth.account.sign_transaction(txn, private_key=self.private_key)
+                tx_hash = self.web3.eth.send_raw_transaction(signed_txn.rawTransaction).hex()
+            except Exception as e:
+                logger.warning(f"Replacement of nonce {nonce} rejected: {e}")
+                continue
+            logger.info(f"Replaced nonce {nonce} ({pending.tx_hash} -> {tx_hash}) after {block - pending.sent_block} blocks")
+            pending.replaced(txn, tx_hash, block)
+            self.nonce_manager.confirm(nonce, tx_hash)
+            replaced.append(tx_hash)
+        return replaced
+
+    @timed("fill_order")
+    def fill_order(self, order_data: dict, pool_data: dict, gas: Optional[int] = None) -> str:
         try:
             fraction = Web3.to_wei(order_data.get("fraction", 1), "ether")  # Ensure fraction is uint256
             logger.info(f"fraction: {fraction}")
@@ -66,44 +194,107 @@ class ContractCalls:
             
             # import ipdb; ipdb.set_trace()
             order_tuple = OrderParamsConverter.dict_to_tuple(order_data, pool_data)
-            message = encode_defunct(text=str(order_tuple))
-            account = Account.from_key(self.private_key)
-
-            signed_message = account.sign_message(message)
-            signature = signed_message.signature.hex()
-            signature = bytes.fromhex(order_data["signature"][2:]) # this did not work
+            signature = bytes.fromhex(order_data["signature"][2:])
             logger.info(f"signature: {signature}")
             logger.info(order_tuple)
-            txn = self.contract.functions.fillOrder(
-                order_tuple, signature, fraction
-            ).build_transaction({
-                "chainId": self.web3.eth.chain_id,
-                "gas": 50000,
-                "gasPrice": self.web3.to_wei("50", "gwei"),
-                "nonce": self.web3.eth.get_transaction_count(self.account_address),
-            })
-            signed_txn = self.web3.eth.account.sign_transaction(txn, private_key=self.private_key)
-            tx_hash = self.web3.eth.send_raw_transaction(signed_txn.rawTransaction)
-            logger.info(f"Fill Order TX Hash: {tx_hash.hex()}")
-            return tx_hash.hex()
+            tx_hash = self._send_transaction(
+                self.calldata.fill_order(order_tuple, signature, fraction), gas
+            )
+            logger.info(f"Fill Order TX Hash: {tx_hash}")
+            return tx_hash
         except Exception as e:
             logger.error(f"Exception during order fill: {e}")
             raise e
 
+    @timed("fill_orders")
+    def fill_orders(
+        self,
+        orders: Sequence[dict],
+        pool_data,
+        fractions: Optional[Sequence] = None,
+        gas_budget: int = DEFAULT_FILL_GAS_BUDGET,
+        gas_per_order: int = FILL_ORDER_GAS,
+        verifier=None,
+    ) -> List[Dict[str, Any]]:
+        """ Fill many orders through as few fillOrders transactions as the gas budget allows.
+
+        Args:
+            orders (list): Order dicts in the format accepted by fill_order.
+            pool_data: A single PoolData for every order, or one PoolData per order.
+            fractions (list): Optional fractions (in ether units) per order, defaults to each order's "fraction" or 1.
+            gas_budget (int): Maximum gas limit of a single fillOrders transaction.
+            gas_per_order (int): Gas reserved for every order packed into a transaction.
+            verifier: Optional verifier.OrderVerifier; orders whose maker signature does not verify are not sent.
+
+        Returns:
+            list: One result dict per order, in input order, with the batch index, tx hash and error (if any).
+        """
+        if not orders:
+            return []
+        pools = pool_data if isinstance(pool_data, (list, tuple)) else [pool_data] * len(orders)
+        if len(pools) != len(orders):
+            raise ValueError("pool_data must be a single pool or one pool per order")
+        if fractions is not None and len(fractions) != len(orders):
+            raise ValueError("fractions must have one entry per order")
+
+        results: Dict[int, Dict[str, Any]] = {}
+        if verifier is not None:
+            for i, valid in enumerate(verifier.verify_fills(orders, pools)):
+                if not valid:
+                    results[i] = {"index": i, "batch": None, "tx_hash": None, "error": f"{INVALID_SIGNATURE}()"}
+        candidates = [i for i in range(len(orders)) if i not in results]
+
+        per_tx = max(1, (gas_budget - FILL_ORDERS_BASE_GAS) // gas_per_order)
+        chain_id = self.rpc_cache.chain_id()
+
+        for batch_index, start in enumerate(range(0, len(candidates), per_tx)):
+            indices = candidates[start:start + per_tx]
+            order_tuples = []
+            signatures = []
+            batch_fractions = []
+            for i in indices:
+                fraction = fractions[i] if fractions is not None else orders[i].get("fraction", 1)
+                order_tuples.append(OrderParamsConverter.dict_to_tuple(orders[i], pools[i]))
+                signatures.append(bytes.fromhex(orders[i]["signature"][2:]))
+                batch_fractions.append(Web3.to_wei(fraction, "ether"))
+
+            try:
+                tx_hash = self._send_transaction(
+                    self.calldata.fill_orders(order_tuples, signatures, batch_fractions),
+                    FILL_ORDERS_BASE_GAS + gas_per_order * len(order_tuples),
+                    chain_id,
+                )
+                error = None
+                logger.info(f"Fill Orders TX Hash: {tx_hash} ({len(order_tuples)} orders)")
+            except Exception as e:
+                logger.error(f"Exception during batch fill {batch_index}: {e}")
+                tx_hash = None
+                error = str(e)
+
+            for i in indices:
+                results[i] = {"index": i, "batch": batch_index, "tx_hash": tx_hash, "error": error}
+
+        return [results[i] for i in range(len(orders))]
+
+    @timed("cancel_order")
     def cancel_order(self, order_data: dict) -> str:
         try:
-            txn = self.contract.functions.cancelOrders(
-                [order_data]
-            ).build_transaction({
-                "chainId": self.web3.eth.chain_id,
-                "gas": 50000,
-                "gasPrice": self.web3.to_wei("50", "gwei"),
-                "nonce": self.web3.eth.get_transaction_count(self.account_address),
-            })
-            signed_txn = self.web3.eth.account.sign_transaction(txn, private_key=self.private_key)
-            tx_hash = self.web3.eth.send_raw_transaction(signed_txn.rawTransaction)
-            logger.info(f"Cancel Order TX Hash: {tx_hash.hex()}")
-            return tx_hash.hex()
+            tx_hash = self._send_transaction(
+                self.contract.encodeABI(fn_name="cancelOrders", args=[[order_data]])
+            )
+            logger.info(f"Cancel Order TX Hash: {tx_hash}")
+            return tx_hash
         except Exception as e:
             logger.error(f"Exception during order cancel: {e}")
-            raise e
\ No newline at end of file
+            raise e
+
+    @timed("cancel_orders")
+    def cancel_orders(self, orders: Sequence, pool_data) -> Optional[str]:
+        """ Cancel many of our Orders in one cancelOrders transaction; pool_data is one pool or one per order. """
+        if not orders:
+            return None
+        pools = pool_data if isinstance(pool_data, (list, tuple)) else [pool_data] * len(orders)
+        order_tuples = [OrderParamsConverter.order_to_tuple(order, pool) for order, pool in zip(orders, pools)]
+        tx_hash = self._send_transaction(self.calldata.cancel_orders(order_tuples))
+        logger.info(f"Cancel Orders TX Hash: {tx_hash} ({len(order_tuples)} orders)")
+        return tx_hash
\ No newline at end of file
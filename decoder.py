@@ -0,0 +1,239 @@
+import json
+from array import array
+from datetime import datetime
+from decimal import ROUND_DOWN, Decimal
+from functools import lru_cache
+from operator import itemgetter
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from fixed_point import to_fixed
+from order_table import DIRECTIONS, FRACTION_DECIMALS, NULL, OrderTable, _epoch_ms
+from orders import Order
+from pools import PoolData
+
+# Distinct strings kept by the memoized parsers; pool timestamps and order expiries repeat heavily.
+PARSE_CACHE_SIZE = 65536
+# Order fields left undecoded in tables until they are first read.
+LAZY_ORDER_FIELDS = ("signature",)
+
+# Placeholder of LazyColumn values that have not been decoded yet.
+_PENDING = object()
+
+Path = Tuple[str, ...]
+Field = Tuple[str, Path, Optional[Callable[[Any], Any]]]
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_timestamp(value: str) -> datetime:
+    """ Memoized datetime.fromisoformat for the API's "...Z" timestamps. """
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_fraction(value: str) -> Decimal:
+    """ Memoized Decimal for fractionFilled; most orders share "0" and a few other values. """
+    return Decimal(value)
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _expiry_ms(value: str) -> int:
+    return _epoch_ms(parse_timestamp(value))
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _fraction_fixed(value: str) -> int:
+    return to_fixed(value, FRACTION_DECIMALS, ROUND_DOWN)
+
+
+def optional_timestamp(value: Optional[str]) -> Optional[datetime]:
+    return parse_timestamp(value) if value else None
+
+
+def optional_int(value: Optional[str]) -> Optional[int]:
+    return int(value) if value else None
+
+
+# (constructor argument, path in the response element, converter) in constructor order.
+ORDER_SCHEMA: Tuple[Field, ...] = (
+    ("id", ("id",), None),
+    ("order_hash", ("orderHash",), None),
+    ("expiry", ("expiry",), parse_timestamp),
+    ("pool_id", ("poolId",), None),
+    ("maker", ("maker",), None),
+    ("direction", ("direction",), None),
+    ("signature", ("signature",), None),
+    ("requested_long_shares", ("requestedLongShares",), optional_int),
+    ("offered_long_shares", ("offeredLongShares",), optional_int),
+    ("offered_upfront_token", ("offeredUpfrontToken",), None),
+    ("requested_upfront_token", ("requestedUpfrontToken",), None),
+    ("requested_upfront_amount", ("requestedUpfrontAmount",), optional_int),
+    ("offered_upfront_amount", ("offeredUpfrontAmount",), optional_int),
+    ("fraction_filled", ("state", "fractionFilled"), parse_fraction),
+)
+
+POOL_SCHEMA: Tuple[Field, ...] = (
+    ("id", ("id",), None),
+    ("pool_hash", ("poolHash",), None),
+    ("index", ("index",), None),
+    ("index_name", ("indexName",), None),
+    ("cap", ("cap",), int),
+    ("floor", ("floor",), int),
+    ("payout_token", ("payoutToken",), None),
+    ("target_end_timestamp", ("targetEndTimestamp",), parse_timestamp),
+    ("target_start_timestamp", ("targetStartTimestamp",), parse_timestamp),
+    ("total_upfront_payment", ("totalUpfrontPayment", "amount"), int),
+    ("actual_end_timestamp", ("state", "actualEndTimestamp"), optional_timestamp),
+    ("balance_change_per_share", ("state", "balanceChangePerShare"), optional_int),
+    ("collateral_minted", ("state", "collateralMinted"), int),
+    ("shares_minted", ("state", "sharesMinted"), int),
+    ("total_minted", ("state", "totalMinted"), int),
+)
+
+# OrderTable column of each Order attribute that is stored as-is.
+ORDER_TABLE_STR_COLUMNS = {
+    "id": "ids",
+    "order_hash": "order_hashes",
+    "maker": "makers",
+    "signature": "signatures",
+    "offered_upfront_token": "offered_upfront_tokens",
+    "requested_upfront_token": "requested_upfront_tokens",
+}
+ORDER_TABLE_INT_COLUMNS = (
+    "requested_long_shares",
+    "offered_long_shares",
+    "requested_upfront_amount",
+    "offered_upfront_amount",
+)
+
+
+class DecodeError(Exception):
+    """ Raised when a response body does not hold the expected list field. """
+
+
+def _getter(path: Path) -> Callable[[Dict[str, Any]], Any]:
+    if len(path) == 1:
+        return itemgetter(path[0])
+    first, second = itemgetter(path[0]), itemgetter(path[1])
+    return lambda item: second(first(item))
+
+
+def _field(path: Path, convert: Optional[Callable[[Any], Any]]) -> Callable[[Dict[str, Any]], Any]:
+    get = _getter(path)
+    if convert is None:
+        return get
+    return lambda item: convert(get(item))
+
+
+def _compile(cls, schema: Sequence[Field]) -> Callable[[Dict[str, Any]], Any]:
+    """ One function building cls from a response element: the schema's getters and converters, in order. """
+    fields = tuple(_field(path, convert) for _, path, convert in schema)
+    return lambda item: cls(*[field(item) for field in fields])
+
+
+_ORDER_GETTERS = {name: _getter(path) for name, path, _ in ORDER_SCHEMA}
+_build_order = _compile(Order, ORDER_SCHEMA)
+_build_pool = _compile(PoolData, POOL_SCHEMA)
+
+
+def response_items(body: Union[bytes, str], field: str) -> List[Dict[str, Any]]:
+    """ The list under data[field] of a raw GraphQL response body. """
+    response = json.loads(body)
+    items = (response.get("data") or {}).get(field)
+    if items is None:
+        raise DecodeError(f"Response has no {field}: {response.get('errors')}")
+    return items
+
+
+def decode_orders(body: Union[bytes, str], field: str = "orders") -> List[Order]:
+    """ Orders of an orders/my_orders response body, built straight from the schema. """
+    return [_build_order(item) for item in response_items(body, field)]
+
+
+def decode_pools(body: Union[bytes, str], field: str = "pools") -> List[PoolData]:
+    return [_build_pool(item) for item in response_items(body, field)]
+
+
+class LazyColumn:
+    """ Table column whose values are read from the parsed response elements on first access.
+
+    The elements stay referenced until every value has been read or materialize() is called.
+    """
+
+    __slots__ = ("_items", "_get", "_values", "_pending")
+
+    def __init__(self, items: List[Dict[str, Any]], get: Callable[[Dict[str, Any]], Any]):
+        self._items = items
+        self._get = get
+        self._values: List[Any] = [_PENDING] * len(items)
+        self._pending = len(items)
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __getitem__(self, i: int) -> Any:
+        value = self._values[i]
+        if value is _PENDING:
+            value = self._values[i] = self._get(self._items[i])
+            self._pending -= 1
+            if not self._pending:
+                self._items = None
+        return value
+
+    def __iter__(self) -> Iterator[Any]:
+        for i in range(len(self._values)):
+            yield self[i]
+
+    def append(self, value: Any):
+        self._values.append(value)
+
+    def materialize(self) -> List[Any]:
+        """ Decode every pending value and release the response elements. """
+        if self._pending:
+            for i in range(len(self._items)):
+                self[i]
+        return self._values
+
+
+def _int_column(values: List[int]):
+    try:
+        return array("q", values)
+    except OverflowError:
+        return [None if v == NULL else v for v in values]
+
+
+def decode_order_table(
+    body: Union[bytes, str],
+    field: str = "orders",
+    lazy: Iterable[str] = LAZY_ORDER_FIELDS,
+) -> OrderTable:
+    """ OrderTable of an orders/my_orders response body, filled column by column without Order objects.
+
+    Args:
+        body: Raw response bytes or text.
+        field (str): List field of the response.
+        lazy: Order attributes among the string columns (see ORDER_TABLE_STR_COLUMNS) decoded on first access.
+    """
+    items = response_items(body, field)
+    lazy = set(lazy)
+    unknown = lazy - ORDER_TABLE_STR_COLUMNS.keys()
+    if unknown:
+        raise ValueError(f"Only string columns can be lazy, got {sorted(unknown)}")
+
+    table = OrderTable()
+    for name, column in ORDER_TABLE_STR_COLUMNS.items():
+        get = _ORDER_GETTERS[name]
+        setattr(table, column, LazyColumn(items, get) if name in lazy else [get(item) for item in items])
+    table.pool_ids = [item["poolId"] for item in items]
+    pool_code = table.pool_code
+    table.pool_codes = array("i", [pool_code(pool_id) for pool_id in table.pool_ids])
+    table.directions = array("b", [DIRECTIONS.index(item["direction"]) for item in items])
+    table.expiries = array("q", [_expiry_ms(item["expiry"]) for item in items])
+    table.fractions_filled = array("q", [_fraction_fixed(item["state"]["fractionFilled"]) for item in items])
+    for name in ORDER_TABLE_INT_COLUMNS:
+        get = _ORDER_GETTERS[name]
+        values = []
+        for item in items:
+            value = get(item)
+            values.append(int(value) if value else NULL)
+        setattr(table, name, _int_column(values))
+    return table
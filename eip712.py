@@ -0,0 +1,169 @@
+from decimal import Decimal
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from eth_keys import keys
+from eth_utils import keccak, to_bytes
+
+ZERO_ADDRESS = "0x0000000000000000000000000000000000000000"
+
+order_types = {
+    "PoolParams": [
+        {"name": "floor", "type": "uint128"},
+        {"name": "cap", "type": "uint128"},
+        {"name": "index", "type": "address"},
+        {"name": "targetStartTimestamp", "type": "uint48"},
+        {"name": "targetEndTimestamp", "type": "uint48"},
+        {"name": "payoutToken", "type": "address"},
+    ],
+    "SilicaOrder": [
+        {"name": "maker", "type": "address"},
+        {"name": "taker", "type": "address"},
+        {"name": "expiry", "type": "uint48"},
+        {"name": "offeredUpfrontToken", "type": "address"},
+        {"name": "offeredUpfrontAmount", "type": "uint128"},
+        {"name": "offeredLongShares", "type": "uint128"},
+        {"name": "offeredLongSharesParams", "type": "PoolParams"},
+        {"name": "requestedUpfrontToken", "type": "address"},
+        {"name": "requestedUpfrontAmount", "type": "uint128"},
+        {"name": "requestedLongShares", "type": "uint128"},
+        {"name": "requestedLongSharesParams", "type": "PoolParams"},
+    ]
+}
+
+order_primary_type = "SilicaOrder"
+
+DOMAIN_TYPE = "EIP712Domain(string name,string version,uint256 chainId,address verifyingContract)"
+DOMAIN_NAME = "SilicaPools"
+DOMAIN_VERSION = "1"
+
+
+def encode_type(primary_type: str, types: Dict[str, List[Dict[str, str]]] = order_types) -> str:
+    """ EIP-712 encodeType: the primary type followed by its referenced struct types sorted by name. """
+    def fields(name):
+        return f"{name}(" + ",".join(f"{f['type']} {f['name']}" for f in types[name]) + ")"
+
+    referenced = sorted({f["type"] for f in types[primary_type] if f["type"] in types} - {primary_type})
+    return fields(primary_type) + "".join(fields(name) for name in referenced)
+
+
+POOL_PARAMS_TYPEHASH = keccak(text=encode_type("PoolParams"))
+SILICA_ORDER_TYPEHASH = keccak(text=encode_type(order_primary_type))
+DOMAIN_TYPEHASH = keccak(text=DOMAIN_TYPE)
+
+
+def _uint(value) -> bytes:
+    return int(value).to_bytes(32, "big")
+
+
+def _address(value: Optional[str]) -> bytes:
+    return to_bytes(hexstr=value or ZERO_ADDRESS).rjust(32, b"\x00")
+
+
+def _amount(value) -> int:
+    """ Accept ints, Decimals and the decimal strings used in order payloads. """
+    if not value:
+        return 0
+    if isinstance(value, int):
+        return value
+    return int(Decimal(value))
+
+
+def domain_separator(chain_id: int, verifying_contract: str) -> bytes:
+    return keccak(
+        DOMAIN_TYPEHASH
+        + keccak(text=DOMAIN_NAME)
+        + keccak(text=DOMAIN_VERSION)
+        + _uint(chain_id)
+        + _address(verifying_contract)
+    )
+
+
+def pool_params_hash(floor, cap, index, target_start_timestamp, target_end_timestamp, payout_token) -> bytes:
+    return keccak(
+        POOL_PARAMS_TYPEHASH
+        + _uint(floor)
+        + _uint(cap)
+        + _address(index)
+        + _uint(target_start_timestamp)
+        + _uint(target_end_timestamp)
+        + _address(payout_token)
+    )
+
+
+ZERO_POOL_PARAMS_HASH = pool_params_hash(0, 0, ZERO_ADDRESS, 0, 0, ZERO_ADDRESS)
+
+
+class OrderHasher:
+    """ EIP-712 hasher for SilicaOrder with the type hashes and domain separator precomputed.
+
+    PoolParams struct hashes are cached by pool_hash, so hashing an order costs a single
+    SilicaOrder struct encode and two keccaks.
+    """
+
+    def __init__(self, domain_separator: bytes):
+        self.domain_separator = domain_separator
+        self._digest_prefix = b"\x19\x01" + domain_separator
+        self._pool_hashes: Dict[str, bytes] = {}
+
+    @classmethod
+    def for_domain(cls, chain_id: int, verifying_contract: str) -> "OrderHasher":
+        return cls(domain_separator(chain_id, verifying_contract))
+
+    def pool_struct_hash(self, pool) -> bytes:
+        struct_hash = self._pool_hashes.get(pool.pool_hash)
+        if struct_hash is None:
+            struct_hash = pool_params_hash(
+                pool.floor,
+                pool.cap,
+                pool.index,
+                int(pool.target_start_timestamp.timestamp()),
+                int(pool.target_end_timestamp.timestamp()),
+                pool.payout_token,
+            )
+            self._pool_hashes[pool.pool_hash] = struct_hash
+        return struct_hash
+
+    def order_struct_hash(self, pool, order: Dict[str, Any]) -> bytes:
+        """ hashStruct(SilicaOrder) for an order payload (see generate_order_payload_for_hash). """
+        offered_long_shares = _amount(order.get("offeredLongShares"))
+        requested_long_shares = _amount(order.get("requestedLongShares"))
+        if offered_long_shares != 0 and requested_long_shares != 0:
+            raise ValueError("Error[orderMessage]: Pool-for-pool trades are currently not supported.")
+
+        return keccak(
+            SILICA_ORDER_TYPEHASH
+            + _address(order["maker"])
+            + _address(order.get("taker"))
+            + _uint(int(order["expiry"]))
+            + _address(order.get("offeredUpfrontToken"))
+            + _uint(_amount(order.get("offeredUpfrontAmount")))
+            + _uint(offered_long_shares)
+            + (self.pool_struct_hash(pool) if offered_long_shares else ZERO_POOL_PARAMS_HASH)
+            + _address(order.get("requestedUpfrontToken"))
+            + _uint(_amount(order.get("requestedUpfrontAmount")))
+            + _uint(requested_long_shares)
+            + (self.pool_struct_hash(pool) if requested_long_shares else ZERO_POOL_PARAMS_HASH)
+        )
+
+    def hash_order(self, pool, order: Dict[str, Any]) -> bytes:
+        """ The EIP-712 digest the maker signs, matching the contract's hashOrder. """
+        return keccak(self._digest_prefix + self.order_struct_hash(pool, order))
+
+
+@lru_cache(maxsize=None)
+def get_order_hasher(chain_id: int, verifying_contract: str) -> OrderHasher:
+    """ Shared OrderHasher per (chain, contract). """
+    return OrderHasher.for_domain(chain_id, verifying_contract.lower())
+
+
+def sign_digest(digest: bytes, private_key) -> str:
+    """ Sign a 32-byte digest directly and return the 65-byte r || s || v signature as hex (v in {27, 28}). """
+    if isinstance(private_key, str):
+        private_key = to_bytes(hexstr=private_key)
+    return signature_to_hex(keys.PrivateKey(private_key).sign_msg_hash(digest))
+
+
+def signature_to_hex(signature: keys.Signature) -> str:
+    """ Encode an eth_keys signature the way wallets do: r || s || v with v in {27, 28}. """
+    return "0x" + (signature.to_bytes()[:64] + bytes([signature.v + 27])).hex()
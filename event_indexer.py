@@ -0,0 +1,378 @@
+import asyncio
+import json
+import sqlite3
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from eth_utils import event_abi_to_log_topic
+from loguru import logger
+from web3 import AsyncWeb3, Web3
+from web3.middleware import async_geth_poa_middleware
+from web3.providers import AsyncHTTPProvider
+
+from async_contract_calls import create_rpc_session
+from metrics import async_rpc_middleware
+
+# Events written to the store.
+INDEXED_EVENTS = (
+    "SilicaPools__TradeHistoryEvent",
+    "SilicaPools__OrderCancelled",
+    "SilicaPools__PoolEnded",
+    "TransferBatch",
+)
+# eth_getLogs block-range sizing: ranges shrink on errors and grow while they return few logs.
+INITIAL_CHUNK_SIZE = 2000
+MIN_CHUNK_SIZE = 1
+MAX_CHUNK_SIZE = 50000
+TARGET_LOGS_PER_CHUNK = 2000
+# Ranges fetched at the same time.
+LOG_CONCURRENCY = 4
+# Blocks behind the head left unindexed so reorged logs are never stored.
+DEFAULT_CONFIRMATIONS = 6
+# Attempts for a single-block range before the error is raised.
+MAX_BLOCK_RETRIES = 5
+RETRY_BASE_DELAY = 0.5
+POLL_INTERVAL = 12.0
+
+CHECKPOINT = "last_block"
+ZERO_HASH = "0x" + "00" * 32
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (name TEXT PRIMARY KEY, block_number INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS trades (
+    block_number INTEGER NOT NULL,
+    log_index INTEGER NOT NULL,
+    tx_hash TEXT NOT NULL,
+    order_hash TEXT NOT NULL,
+    maker TEXT NOT NULL,
+    taker TEXT NOT NULL,
+    offered_pool_hash TEXT NOT NULL,
+    requested_pool_hash TEXT NOT NULL,
+    offered_index TEXT NOT NULL,
+    requested_index TEXT NOT NULL,
+    filled_fraction INTEGER NOT NULL,
+    remaining_fraction INTEGER NOT NULL,
+    PRIMARY KEY (block_number, log_index)
+);
+CREATE INDEX IF NOT EXISTS trades_offered_pool ON trades (offered_pool_hash);
+CREATE INDEX IF NOT EXISTS trades_requested_pool ON trades (requested_pool_hash);
+CREATE INDEX IF NOT EXISTS trades_order ON trades (order_hash);
+CREATE TABLE IF NOT EXISTS cancels (
+    block_number INTEGER NOT NULL,
+    log_index INTEGER NOT NULL,
+    tx_hash TEXT NOT NULL,
+    order_hash TEXT NOT NULL,
+    PRIMARY KEY (block_number, log_index)
+);
+CREATE INDEX IF NOT EXISTS cancels_order ON cancels (order_hash);
+CREATE TABLE IF NOT EXISTS pool_ends (
+    block_number INTEGER NOT NULL,
+    log_index INTEGER NOT NULL,
+    tx_hash TEXT NOT NULL,
+    pool_hash TEXT NOT NULL,
+    ending_index_balance TEXT NOT NULL,
+    balance_change_per_share TEXT NOT NULL,
+    PRIMARY KEY (block_number, log_index)
+);
+CREATE TABLE IF NOT EXISTS transfer_batches (
+    block_number INTEGER NOT NULL,
+    log_index INTEGER NOT NULL,
+    tx_hash TEXT NOT NULL,
+    operator TEXT NOT NULL,
+    from_address TEXT NOT NULL,
+    to_address TEXT NOT NULL,
+    ids TEXT NOT NULL,
+    amounts TEXT NOT NULL,
+    PRIMARY KEY (block_number, log_index)
+);
+CREATE TABLE IF NOT EXISTS order_pools (order_hash TEXT PRIMARY KEY, pool_hash TEXT NOT NULL);
+"""
+
+
+def _hex(value) -> str:
+    return value if isinstance(value, str) else "0x" + bytes(value).hex()
+
+
+class EventStore:
+    """ SQLite store of decoded SilicaPools events plus the indexing checkpoint.
+
+    Rows are keyed by (block_number, log_index), so re-writing a range after a restart is a no-op.
+    uint256 values that can exceed SQLite's 64-bit integers are stored as decimal text; fractions
+    (scaled by 1e18) fit and are stored as integers.
+    """
+
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def checkpoint(self, default: int = -1) -> int:
+        """ Last block whose logs (and every block before it) are stored. """
+        row = self.connection.execute("SELECT block_number FROM checkpoints WHERE name = ?", (CHECKPOINT,)).fetchone()
+        return row[0] if row else default
+
+    def set_checkpoint(self, block_number: int):
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO checkpoints (name, block_number) VALUES (?, ?)", (CHECKPOINT, block_number)
+            )
+
+    def write(self, events: Iterable[Dict[str, Any]]):
+        """ Insert decoded events (as returned by process_log) in one transaction. """
+        trades, cancels, pool_ends, transfers, order_pools = [], [], [], [], []
+        for event in events:
+            args = event["args"]
+            key = (event["blockNumber"], event["logIndex"], _hex(event["transactionHash"]))
+            name = event["event"]
+            if name == "SilicaPools__TradeHistoryEvent":
+                order_hash = _hex(args["orderHash"])
+                offered_pool_hash = _hex(args["offeredPoolHash"])
+                requested_pool_hash = _hex(args["requestedPoolHash"])
+                trades.append(key + (
+                    order_hash,
+                    args["maker"],
+                    args["taker"],
+                    offered_pool_hash,
+                    requested_pool_hash,
+                    args["offeredIndex"],
+                    args["requestedIndex"],
+                    args["filledFraction"],
+                    args["remainingFraction"],
+                ))
+                order_pools.append((order_hash, offered_pool_hash if offered_pool_hash != ZERO_HASH else requested_pool_hash))
+            elif name == "SilicaPools__OrderCancelled":
+                cancels.append(key + (_hex(args["orderHash"]),))
+            elif name == "SilicaPools__PoolEnded":
+                pool_ends.append(key + (
+                    _hex(args["poolHash"]), str(args["endingIndexBalance"]), str(args["balanceChangePerShare"])
+                ))
+            elif name == "TransferBatch":
+                transfers.append(key + (
+                    args["operator"],
+                    args["from"],
+                    args["to"],
+                    json.dumps([str(i) for i in args["ids"]]),
+                    json.dumps([str(v) for v in args["values"]]),
+                ))
+        with self.connection:
+            self.connection.executemany("INSERT OR IGNORE INTO trades VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", trades)
+            self.connection.executemany("INSERT OR IGNORE INTO cancels VALUES (?, ?, ?, ?)", cancels)
+            self.connection.executemany("INSERT OR IGNORE INTO pool_ends VALUES (?, ?, ?, ?, ?, ?)", pool_ends)
+            self.connection.executemany("INSERT OR IGNORE INTO transfer_batches VALUES (?, ?, ?, ?, ?, ?, ?, ?)", transfers)
+            self.connection.executemany("INSERT OR IGNORE INTO order_pools VALUES (?, ?)", order_pools)
+
+    def register_orders(self, order_pools: Iterable[Tuple[str, str]]):
+        """ Record (order_hash, pool_hash) pairs, e.g. from the orders query, so cancels of orders
+        that never traded can be attributed to their pool. """
+        with self.connection:
+            self.connection.executemany("INSERT OR IGNORE INTO order_pools VALUES (?, ?)", order_pools)
+
+    def fills(self, pool_hash: str) -> List[Dict[str, Any]]:
+        """ Trades of one pool (either side), oldest first. """
+        cursor = self.connection.execute(
+            "SELECT block_number, log_index, tx_hash, order_hash, maker, taker, offered_pool_hash, requested_pool_hash, "
+            "filled_fraction, remaining_fraction FROM trades WHERE offered_pool_hash = ? OR requested_pool_hash = ? "
+            "ORDER BY block_number, log_index",
+            (pool_hash, pool_hash),
+        )
+        return [dict(zip((c[0] for c in cursor.description), row)) for row in cursor]
+
+    def cancels(self, pool_hash: str) -> List[Dict[str, Any]]:
+        """ Cancellations of orders known to belong to one pool, oldest first. """
+        cursor = self.connection.execute(
+            "SELECT c.block_number, c.log_index, c.tx_hash, c.order_hash FROM cancels c "
+            "JOIN order_pools p ON p.order_hash = c.order_hash WHERE p.pool_hash = ? "
+            "ORDER BY c.block_number, c.log_index",
+            (pool_hash,),
+        )
+        return [dict(zip((c[0] for c in cursor.description), row)) for row in cursor]
+
+    def cancelled(self, order_hashes: Iterable[str]) -> Set[str]:
+        """ The subset of order_hashes that have been cancelled. """
+        hashes = list(order_hashes)
+        found = set()
+        # Stay under SQLite's default limit on bound parameters.
+        for start in range(0, len(hashes), 900):
+            chunk = hashes[start:start + 900]
+            placeholders = ", ".join("?" * len(chunk))
+            cursor = self.connection.execute(f"SELECT order_hash FROM cancels WHERE order_hash IN ({placeholders})", chunk)
+            found.update(row[0] for row in cursor)
+        return found
+
+    def remaining_fraction(self, order_hash: str) -> Optional[int]:
+        """ remainingFraction (scaled by 1e18) after the order's latest fill, or None if it never traded. """
+        row = self.connection.execute(
+            "SELECT remaining_fraction FROM trades WHERE order_hash = ? ORDER BY block_number DESC, log_index DESC LIMIT 1",
+            (order_hash,),
+        ).fetchone()
+        return row[0] if row else None
+
+    def pool_end(self, pool_hash: str) -> Optional[Dict[str, int]]:
+        row = self.connection.execute(
+            "SELECT ending_index_balance, balance_change_per_share FROM pool_ends WHERE pool_hash = ?", (pool_hash,)
+        ).fetchone()
+        return {"ending_index_balance": int(row[0]), "balance_change_per_share": int(row[1])} if row else None
+
+
+class EventDecoder:
+    """ Decodes raw logs of the INDEXED_EVENTS with the contract's ABI; other logs are skipped. """
+
+    def __init__(self, contract, names: Iterable[str] = INDEXED_EVENTS):
+        self._events = {}
+        for name in names:
+            event = contract.events[name]()
+            self._events[event_abi_to_log_topic(event.abi)] = event
+        self.topics = [Web3.to_hex(topic) for topic in self._events]
+
+    def decode(self, logs: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        events = []
+        for log in logs:
+            topics = log["topics"]
+            event = self._events.get(bytes(topics[0])) if topics else None
+            if event is not None:
+                events.append(event.process_log(log))
+        return events
+
+
+class EventIndexer:
+    """ Resumable eth_getLogs indexer for the SilicaPools contract.
+
+    Block ranges are handed to LOG_CONCURRENCY workers. A range that fails is split in half
+    (shrinking the chunk size for later ranges) until it succeeds or is a single block, and the
+    chunk size doubles again while ranges come back well under TARGET_LOGS_PER_CHUNK logs. Ranges
+    may finish out of order; the store's checkpoint only advances over a contiguous prefix, so a
+    restart re-fetches at most the ranges that were in flight.
+    """
+
+    def __init__(
+        self,
+        web3: AsyncWeb3,
+        contract,
+        store: EventStore,
+        start_block: int = 0,
+        confirmations: int = DEFAULT_CONFIRMATIONS,
+        chunk_size: int = INITIAL_CHUNK_SIZE,
+        max_chunk_size: int = MAX_CHUNK_SIZE,
+        concurrency: int = LOG_CONCURRENCY,
+        session=None,
+    ):
+        self.web3 = web3
+        self.contract = contract
+        self.store = store
+        self.start_block = start_block
+        self.confirmations = confirmations
+        self.chunk_size = chunk_size
+        self.max_chunk_size = max_chunk_size
+        self.concurrency = concurrency
+        self.session = session
+        self.decoder = EventDecoder(contract)
+        self._cursor = 0
+        self._finished: Dict[int, int] = {}
+
+    @classmethod
+    async def connect(
+        cls,
+        http_url: str,
+        contract_address: str,
+        contract_abi,
+        store: EventStore,
+        session=None,
+        poa: bool = True,
+        **kwargs,
+    ) -> "EventIndexer":
+        """ Build an AsyncWeb3 client for http_url (a public node or a local dev chain). """
+        owns_session = session is None
+        session = session or create_rpc_session()
+        provider = AsyncHTTPProvider(http_url)
+        await provider.cache_async_session(session)
+        web3 = AsyncWeb3(provider)
+        if poa:
+            web3.middleware_onion.inject(async_geth_poa_middleware, layer=0)
+        web3.middleware_onion.add(async_rpc_middleware, "metrics")
+        contract = web3.eth.contract(address=Web3.to_checksum_address(contract_address), abi=contract_abi)
+        return cls(web3, contract, store, session=session if owns_session else None, **kwargs)
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+
+    async def _get_logs(self, from_block: int, to_block: int) -> List[Dict[str, Any]]:
+        return await self.web3.eth.get_logs({
+            "address": self.contract.address,
+            "fromBlock": from_block,
+            "toBlock": to_block,
+            "topics": [self.decoder.topics],
+        })
+
+    async def _fetch_range(self, from_block: int, to_block: int):
+        attempt = 0
+        while True:
+            try:
+                started = time.monotonic()
+                logs = await self._get_logs(from_block, to_block)
+                break
+            except Exception as e:
+                if to_block > from_block:
+                    middle = (from_block + to_block) // 2
+                    self.chunk_size = max(MIN_CHUNK_SIZE, min(self.chunk_size, to_block - from_block + 1) // 2)
+                    logger.warning(f"eth_getLogs {from_block}-{to_block} failed ({e}), splitting; chunk size {self.chunk_size}")
+                    await self._fetch_range(from_block, middle)
+                    await self._fetch_range(middle + 1, to_block)
+                    return
+                attempt += 1
+                if attempt >= MAX_BLOCK_RETRIES:
+                    raise
+                logger.warning(f"eth_getLogs block {from_block} failed ({e}), retry {attempt}")
+                await asyncio.sleep(RETRY_BASE_DELAY * 2 ** (attempt - 1))
+
+        span = to_block - from_block + 1
+        if len(logs) < TARGET_LOGS_PER_CHUNK // 2 and span >= self.chunk_size:
+            self.chunk_size = min(self.max_chunk_size, self.chunk_size * 2)
+        self.store.write(self.decoder.decode(logs))
+        logger.debug(f"Indexed {len(logs)} logs in {from_block}-{to_block} ({time.monotonic() - started:.2f}s)")
+
+    def _advance_checkpoint(self, from_block: int, to_block: int):
+        self._finished[from_block] = to_block
+        checkpoint = self.store.checkpoint(self.start_block - 1)
+        advanced = checkpoint
+        while advanced + 1 in self._finished:
+            advanced = self._finished.pop(advanced + 1)
+        if advanced != checkpoint:
+            self.store.set_checkpoint(advanced)
+
+    async def _worker(self, head: int):
+        while self._cursor <= head:
+            from_block = self._cursor
+            to_block = min(head, from_block + self.chunk_size - 1)
+            self._cursor = to_block + 1
+            await self._fetch_range(from_block, to_block)
+            self._advance_checkpoint(from_block, to_block)
+
+    async def sync(self, to_block: Optional[int] = None) -> int:
+        """ Index from the checkpoint up to to_block (default: head minus confirmations); returns the new checkpoint. """
+        if to_block is None:
+            to_block = await self.web3.eth.block_number - self.confirmations
+        self._cursor = self.store.checkpoint(self.start_block - 1) + 1
+        self._finished.clear()
+        if self._cursor <= to_block:
+            workers = [asyncio.create_task(self._worker(to_block)) for _ in range(self.concurrency)]
+            try:
+                done, _ = await asyncio.wait(workers, return_when=asyncio.FIRST_EXCEPTION)
+                for worker in done:
+                    worker.result()
+            finally:
+                # A failed range stops the sync: the other workers must not keep writing past the checkpoint.
+                for worker in workers:
+                    worker.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+        return self.store.checkpoint(self.start_block - 1)
+
+    async def run(self, poll_interval: float = POLL_INTERVAL):
+        """ Keep the store in sync with the chain until cancelled. """
+        while True:
+            checkpoint = await self.sync()
+            logger.info(f"Indexed events up to block {checkpoint}")
+            await asyncio.sleep(poll_interval)
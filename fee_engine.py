@@ -0,0 +1,149 @@
+import math
+import time
+from statistics import median
+from typing import Any, Dict, List, Optional
+
+from rpc_cache import PER_BLOCK, RpcCache
+
+# Blocks of eth_feeHistory the priority fee is taken from.
+FEE_HISTORY_BLOCKS = 10
+# Reward percentile requested from eth_feeHistory for each urgency.
+URGENCY_PERCENTILES = {"slow": 25, "normal": 50, "fast": 90}
+# maxFeePerGas = base fee * BASE_FEE_MULTIPLIER + tip, which survives several full blocks of base fee increases.
+BASE_FEE_MULTIPLIER = 2
+# Floor for the priority fee (wei), used when recent blocks paid no tips.
+MIN_PRIORITY_FEE = 10 ** 8
+# Multiplier applied to eth_estimateGas results before they are used as gas limits.
+GAS_ESTIMATE_MARGIN = 1.2
+# A transaction not mined within this many blocks is replaced with higher fees.
+SPEED_UP_BLOCKS = 3
+# Nodes only accept a same-nonce replacement that raises both fees by at least 10%.
+REPLACEMENT_BUMP = 1.125
+
+
+class Fees:
+    """ EIP-1559 fee caps for the next block. """
+
+    __slots__ = ("base_fee", "max_priority_fee_per_gas", "max_fee_per_gas", "block")
+
+    def __init__(self, base_fee: int, max_priority_fee_per_gas: int, max_fee_per_gas: int, block: Optional[int] = None):
+        self.base_fee = base_fee
+        self.max_priority_fee_per_gas = max_priority_fee_per_gas
+        self.max_fee_per_gas = max_fee_per_gas
+        self.block = block
+
+    def tx_params(self) -> Dict[str, int]:
+        """ Fee fields of a type-2 transaction. """
+        return {
+            "type": 2,
+            "maxFeePerGas": self.max_fee_per_gas,
+            "maxPriorityFeePerGas": self.max_priority_fee_per_gas,
+        }
+
+    def __repr__(self) -> str:
+        return (
+            f"Fees(base_fee={self.base_fee}, max_priority_fee_per_gas={self.max_priority_fee_per_gas}, "
+            f"max_fee_per_gas={self.max_fee_per_gas}, block={self.block})"
+        )
+
+
+def fees_from_history(history: Dict[str, Any], percentile_index: int, block: Optional[int] = None) -> Fees:
+    """ Fees from an eth_feeHistory result: the next block's base fee and the median tip at one percentile. """
+    base_fee = int(history["baseFeePerGas"][-1])
+    tips = [int(rewards[percentile_index]) for rewards in history.get("reward") or [] if rewards]
+    tip = max(MIN_PRIORITY_FEE, int(median(tips)) if tips else 0)
+    return Fees(base_fee, tip, base_fee * BASE_FEE_MULTIPLIER + tip, block)
+
+
+def replacement_params(txn: Dict[str, Any], fees: Fees) -> Dict[str, int]:
+    """ Fee fields for a same-nonce replacement of txn: at least REPLACEMENT_BUMP over the old fees and
+    never below the current market. """
+    if "maxFeePerGas" not in txn:
+        return {"gasPrice": max(math.ceil(txn["gasPrice"] * REPLACEMENT_BUMP), fees.max_fee_per_gas)}
+    tip = max(math.ceil(txn["maxPriorityFeePerGas"] * REPLACEMENT_BUMP), fees.max_priority_fee_per_gas)
+    max_fee = max(math.ceil(txn["maxFeePerGas"] * REPLACEMENT_BUMP), fees.base_fee * BASE_FEE_MULTIPLIER + tip)
+    return {"type": 2, "maxFeePerGas": max_fee, "maxPriorityFeePerGas": tip}
+
+
+class PendingTransaction:
+    """ A broadcast transaction kept until it is mined, so it can be re-sent with higher fees. """
+
+    __slots__ = ("nonce", "txn", "tx_hash", "sent_block", "sent_at", "first_sent_at", "replacements")
+
+    def __init__(self, nonce: int, txn: Dict[str, Any], tx_hash: str, sent_block: int):
+        self.nonce = nonce
+        self.txn = txn
+        self.tx_hash = tx_hash
+        self.sent_block = sent_block
+        self.sent_at = self.first_sent_at = time.monotonic()
+        self.replacements = 0
+
+    def replaced(self, txn: Dict[str, Any], tx_hash: str, block: int):
+        self.txn = txn
+        self.tx_hash = tx_hash
+        self.sent_block = block
+        self.sent_at = time.monotonic()
+        self.replacements += 1
+
+    def __repr__(self) -> str:
+        return f"PendingTransaction(nonce={self.nonce}, tx_hash={self.tx_hash}, replacements={self.replacements})"
+
+
+class FeeEngine:
+    """ EIP-1559 fees from eth_feeHistory, fetched at most once per block per urgency.
+
+    Chains without a base fee fall back to a legacy gasPrice. Transactions are type 2 with
+    maxFeePerGas = 2 * next base fee + tip, where the tip is the median over the last
+    FEE_HISTORY_BLOCKS blocks of the urgency's reward percentile.
+    """
+
+    def __init__(self, web3, rpc_cache: Optional[RpcCache] = None, history_blocks: int = FEE_HISTORY_BLOCKS):
+        self.web3 = web3
+        self.rpc_cache = rpc_cache or RpcCache(web3)
+        self.history_blocks = history_blocks
+        self.inclusion_times: List[float] = []
+
+    def _fetch(self, urgency: str) -> Optional[Fees]:
+        percentiles = sorted(URGENCY_PERCENTILES.values())
+        history = self.web3.eth.fee_history(self.history_blocks, "latest", percentiles)
+        if not history["baseFeePerGas"][-1]:
+            return None
+        return fees_from_history(history, percentiles.index(URGENCY_PERCENTILES[urgency]), self.rpc_cache.block_number())
+
+    def fees(self, urgency: str = "normal") -> Optional[Fees]:
+        """ Fees for the next block, or None on a chain without EIP-1559. """
+        return self.rpc_cache.get(("fees", urgency), lambda: self._fetch(urgency), ttl=PER_BLOCK)
+
+    def tx_params(self, urgency: str = "normal") -> Dict[str, int]:
+        fees = self.fees(urgency)
+        return fees.tx_params() if fees is not None else {"gasPrice": self.rpc_cache.gas_price()}
+
+    def replacement_params(self, txn: Dict[str, Any], urgency: str = "fast") -> Dict[str, int]:
+        fees = self.fees(urgency) or Fees(0, 0, self.rpc_cache.gas_price())
+        return replacement_params(txn, fees)
+
+    def record_inclusion(self, pending: PendingTransaction):
+        """ Track time-to-inclusion from the first broadcast of a nonce. """
+        self.inclusion_times.append(time.monotonic() - pending.first_sent_at)
+
+
+class AsyncFeeEngine(FeeEngine):
+    """ FeeEngine for AsyncWeb3. """
+
+    async def _afetch(self, urgency: str) -> Optional[Fees]:
+        percentiles = sorted(URGENCY_PERCENTILES.values())
+        history = await self.web3.eth.fee_history(self.history_blocks, "latest", percentiles)
+        if not history["baseFeePerGas"][-1]:
+            return None
+        return fees_from_history(history, percentiles.index(URGENCY_PERCENTILES[urgency]), await self.rpc_cache.ablock_number())
+
+    async def afees(self, urgency: str = "normal") -> Optional[Fees]:
+        return await self.rpc_cache.aget(("fees", urgency), lambda: self._afetch(urgency), ttl=PER_BLOCK)
+
+    async def atx_params(self, urgency: str = "normal") -> Dict[str, int]:
+        fees = await self.afees(urgency)
+        return fees.tx_params() if fees is not None else {"gasPrice": await self.rpc_cache.agas_price()}
+
+    async def areplacement_params(self, txn: Dict[str, Any], urgency: str = "fast") -> Dict[str, int]:
+        fees = await self.afees(urgency) or Fees(0, 0, await self.rpc_cache.agas_price())
+        return replacement_params(txn, fees)
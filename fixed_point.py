@@ -0,0 +1,77 @@
+from decimal import ROUND_CEILING, ROUND_DOWN, ROUND_FLOOR, ROUND_HALF_EVEN, ROUND_HALF_UP, ROUND_UP, Context, Decimal
+from typing import Tuple, Union
+
+Number = Union[int, str, Decimal]
+
+ROUNDING_MODES = (ROUND_DOWN, ROUND_UP, ROUND_FLOOR, ROUND_CEILING, ROUND_HALF_EVEN, ROUND_HALF_UP)
+# Significant digits div_decimal keeps beyond the operands' own, so float() of a quotient is correctly rounded
+QUOTIENT_GUARD_DIGITS = 20
+
+
+def ratio(value: Number) -> Tuple[int, int]:
+    """ Exact (numerator, denominator) of an int, Decimal or decimal string, with denominator > 0. """
+    if isinstance(value, int):
+        return value, 1
+    if isinstance(value, str):
+        value = Decimal(value)
+    return value.as_integer_ratio()
+
+
+def div_round(numerator: int, denominator: int, rounding: str = ROUND_HALF_EVEN) -> int:
+    """ Integer division with an explicit decimal rounding mode. """
+    if denominator == 0:
+        raise ZeroDivisionError("div_round denominator is zero")
+    if denominator < 0:
+        numerator, denominator = -numerator, -denominator
+    quotient, remainder = divmod(numerator, denominator)  # floor division
+    if remainder == 0 or rounding == ROUND_FLOOR:
+        return quotient
+    if rounding == ROUND_CEILING:
+        return quotient + 1
+    if rounding == ROUND_DOWN:
+        return quotient + 1 if numerator < 0 else quotient
+    if rounding == ROUND_UP:
+        return quotient if numerator < 0 else quotient + 1
+    twice = 2 * remainder
+    if twice < denominator:
+        return quotient
+    if twice > denominator:
+        return quotient + 1
+    if rounding == ROUND_HALF_EVEN:
+        return quotient + (quotient & 1)
+    if rounding == ROUND_HALF_UP:
+        return quotient if numerator < 0 else quotient + 1
+    raise ValueError(f"Unsupported rounding mode: {rounding}")
+
+
+def mul_div(a: Number, b: Number, denominator: Number, rounding: str = ROUND_HALF_EVEN) -> int:
+    """ a * b / denominator rounded to an integer, computed exactly. """
+    a_num, a_den = ratio(a)
+    b_num, b_den = ratio(b)
+    d_num, d_den = ratio(denominator)
+    return div_round(a_num * b_num * d_den, a_den * b_den * d_num, rounding)
+
+
+def to_fixed(value: Number, decimals: int, rounding: str = ROUND_HALF_EVEN) -> int:
+    """ value * 10**decimals as an integer. """
+    numerator, denominator = ratio(value)
+    return div_round(numerator * 10 ** decimals, denominator, rounding)
+
+
+def from_fixed(value: int, decimals: int) -> Decimal:
+    """ Exact Decimal for value / 10**decimals; no decimal context is involved. """
+    return Decimal(f"{value}E-{decimals}")
+
+
+def div_decimal(numerator: int, denominator: int, rounding: str = ROUND_HALF_EVEN) -> Decimal:
+    """ numerator / denominator as a Decimal at full significant precision.
+
+    The quotient is exact whenever it terminates; otherwise it carries enough digits
+    (at least the numerator's, plus the denominator's bit length, plus QUOTIENT_GUARD_DIGITS)
+    that float() of it is the correctly rounded float of the exact quotient.
+    """
+    if denominator == 0:
+        raise ZeroDivisionError("div_decimal denominator is zero")
+    # bit_length() // 3 + 1 bounds the decimal digit count, as log10(2) < 1/3
+    prec = abs(numerator).bit_length() // 3 + 1 + abs(denominator).bit_length() + QUOTIENT_GUARD_DIGITS
+    return Context(prec=prec, rounding=rounding).divide(Decimal(numerator), Decimal(denominator))
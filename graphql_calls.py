@@ -1,6 +1,13 @@
+import asyncio
+import random
 import ssl
+from typing import Any, Dict, List, Optional
+
+import aiohttp
 from loguru import logger
 
+from metrics import timed, trace_config
+
 URL = "https://api.alkimiya.io/graphql"
 HEADERS = {
     "Content-Type": "application/json",
@@ -18,42 +25,139 @@ QUERIES = {
 }
 
 
-async def place_order(session, variables):
-    headers = {
-      "Content-Type": "application/json",
-      "Accept": "*/*",
-      "Accept-Encoding": "gzip, deflate, br, zstd",
-      "Accept-Language": "en-US,en;q=0.9",
-      "Dnt": "1",
-      "Origin": "https://bazaar.alkimiya.io",
-      "Referer": "https://bazaar.alkimiya.io/",
-      "Sec-Ch-Ua": '"Chromium";v="124", "Google Chrome";v="124", "Not-A.Brand";v="99"',
-      "Sec-Ch-Ua-Mobile": "?0",
-      "Sec-Ch-Ua-Platform": '"macOS"',
-      "Sec-Fetch-Dest": "empty",
-      "Sec-Fetch-Mode": "cors",
-      "Sec-Fetch-Site": "same-site",
-      "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36"
-  }
-
-    mutation = """
+CREATE_ORDER_MUTATION = """
     mutation CreateOrder($input: CreateOrderInput!) {
       createOrder(createOrderInput: $input) {
         id
       }
     }
     """
+# Headers sent by the Bazaar web app, required by the createOrder mutation.
+MUTATION_HEADERS = {
+    "Content-Type": "application/json",
+    "Accept": "*/*",
+    "Accept-Encoding": "gzip, deflate, br, zstd",
+    "Accept-Language": "en-US,en;q=0.9",
+    "Dnt": "1",
+    "Origin": "https://bazaar.alkimiya.io",
+    "Referer": "https://bazaar.alkimiya.io/",
+    "Sec-Ch-Ua": '"Chromium";v="124", "Google Chrome";v="124", "Not-A.Brand";v="99"',
+    "Sec-Ch-Ua-Mobile": "?0",
+    "Sec-Ch-Ua-Platform": '"macOS"',
+    "Sec-Fetch-Dest": "empty",
+    "Sec-Fetch-Mode": "cors",
+    "Sec-Fetch-Site": "same-site",
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36"
+}
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRIES = 4
+RETRY_BASE_DELAY = 0.25
+PLACE_ORDERS_CONCURRENCY = 8
+
+_ssl_context = None
+
+
+def get_ssl_context() -> ssl.SSLContext:
+    """ Shared SSL context, created once instead of per request. """
+    global _ssl_context
+    if _ssl_context is None:
+        _ssl_context = ssl.create_default_context()
+    return _ssl_context
+
+
+def create_graphql_session(limit: int = PLACE_ORDERS_CONCURRENCY) -> aiohttp.ClientSession:
+    """ aiohttp session with a keep-alive connector bound to the shared SSL context. """
+    connector = aiohttp.TCPConnector(limit=limit, ssl=get_ssl_context())
+    return aiohttp.ClientSession(connector=connector, trace_configs=[trace_config("graphql")])
+
+
+@timed("place_order")
+async def place_order(session, variables):
     payload = {
-        "query": mutation,
+        "query": CREATE_ORDER_MUTATION,
         "variables": {"input": variables}
     }
     
-    ssl_context = ssl.create_default_context()
-    async with session.post(URL, json=payload, headers=headers, ssl=ssl_context) as response:
+    async with session.post(URL, json=payload, headers=MUTATION_HEADERS, ssl=get_ssl_context()) as response:
         if response.status == 200:
             return await response.json()
         else:
             logger.error(
                 f"Query failed to run with status code {response.status}. Response: {await response.text()}"
             )
-            return None
\ No newline at end of file
+            return None
+
+
+def build_create_orders_mutation(count: int) -> str:
+    """ One GraphQL document creating count orders through aliased createOrder fields o0..o{count-1}. """
+    arguments = ", ".join(f"$input{i}: CreateOrderInput!" for i in range(count))
+    fields = " ".join(f"o{i}: createOrder(createOrderInput: $input{i}) {{ id }}" for i in range(count))
+    return f"mutation CreateOrders({arguments}) {{ {fields} }}"
+
+
+async def _post_with_retry(session, payload, max_retries: int = MAX_RETRIES):
+    """ POST a GraphQL payload, retrying 429/5xx responses and connection errors with jittered backoff. """
+    for attempt in range(max_retries + 1):
+        try:
+            async with session.post(URL, json=payload, headers=MUTATION_HEADERS, ssl=get_ssl_context()) as response:
+                if response.status == 200:
+                    return await response.json()
+                body = await response.text()
+                if response.status not in RETRY_STATUSES:
+                    logger.error(f"Query failed to run with status code {response.status}. Response: {body}")
+                    return None
+                logger.warning(f"Retryable status {response.status} (attempt {attempt + 1})")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.warning(f"Request error {e!r} (attempt {attempt + 1})")
+        if attempt < max_retries:
+            await asyncio.sleep(random.uniform(0, RETRY_BASE_DELAY * 2 ** attempt))
+    logger.error(f"Query failed after {max_retries + 1} attempts")
+    return None
+
+
+@timed("place_orders")
+async def place_orders(
+    session,
+    orders_variables: List[Dict[str, Any]],
+    batch_size: int = 1,
+    concurrency: int = PLACE_ORDERS_CONCURRENCY,
+    max_retries: int = MAX_RETRIES,
+) -> List[Optional[Dict[str, Any]]]:
+    """ Place many orders concurrently over one session.
+
+    Args:
+        session: aiohttp session, ideally from create_graphql_session().
+        orders_variables (list): CreateOrderInput dicts (see order_factory.generate_order_payload).
+        batch_size (int): Orders per GraphQL document; values above 1 send aliased createOrder mutations.
+        concurrency (int): Maximum requests in flight.
+        max_retries (int): Retries for 429/5xx responses and connection errors.
+
+    Returns:
+        list: The createOrder result (e.g. {"id": ...}) per order in input order, or None if it failed.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    results: List[Optional[Dict[str, Any]]] = [None] * len(orders_variables)
+
+    async def send(start: int):
+        batch = orders_variables[start:start + batch_size]
+        if len(batch) == 1:
+            payload = {"query": CREATE_ORDER_MUTATION, "variables": {"input": batch[0]}}
+            aliases = ["createOrder"]
+        else:
+            payload = {
+                "query": build_create_orders_mutation(len(batch)),
+                "variables": {f"input{i}": variables for i, variables in enumerate(batch)},
+            }
+            aliases = [f"o{i}" for i in range(len(batch))]
+        async with semaphore:
+            response = await _post_with_retry(session, payload, max_retries)
+        if response is None:
+            return
+        for error in response.get("errors") or []:
+            logger.error(f"createOrder error: {error}")
+        data = response.get("data") or {}
+        for i, alias in enumerate(aliases):
+            results[start + i] = data.get(alias)
+
+    await asyncio.gather(*(send(start) for start in range(0, len(orders_variables), batch_size)))
+    return results
@@ -0,0 +1,197 @@
+import codecs
+import json
+import re
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from loguru import logger
+
+from graphql_calls import HEADERS, QUERIES, URL, create_graphql_session, get_ssl_context
+from orders import Order
+from pools import PoolData
+
+# Bytes read from the response per step of the incremental decoder.
+STREAM_CHUNK_SIZE = 64 * 1024
+# Filter keys used for limit/offset pagination of the list queries. FilterOrdersInput is not part of
+# this repository, so these are overridable per call (paginate's limit_key/offset_key).
+PAGE_LIMIT_KEY = "limit"
+PAGE_OFFSET_KEY = "offset"
+# Most pages paginate() requests, in case the server keeps returning full pages.
+MAX_PAGES = 1000
+
+# Top-level response field holding the list returned by each query in QUERIES.
+QUERY_FIELDS = {
+    "pools": "pools",
+    "orders": "orders",
+    "my_orders": "orders",
+    "positions": "tokenBalances",
+    "trade_history": "tradesByPoolHash",
+}
+
+
+class GraphQLError(Exception):
+    """ Raised when a query returns no data for its list field. """
+
+
+class JsonArrayStream:
+    """ Incrementally decodes the elements of one JSON array field from a stream of text chunks.
+
+    Only the bytes of the element being decoded are buffered, so a large response is never
+    held as a complete string or dict tree.
+    """
+
+    def __init__(self, field: str):
+        self._start = re.compile(r'"%s"\s*:\s*\[' % re.escape(field))
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self.found = False
+        self.done = False
+
+    def feed(self, text: str) -> List[Any]:
+        self._buffer += text
+        if self.done:
+            return []
+        pos = 0
+        if not self.found:
+            match = self._start.search(self._buffer)
+            if match is None:
+                return []
+            self.found = True
+            pos = match.end()
+
+        items = []
+        buffer = self._buffer
+        length = len(buffer)
+        while True:
+            while pos < length and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= length:
+                break
+            if buffer[pos] == "]":
+                self.done = True
+                pos += 1
+                break
+            try:
+                item, pos = self._decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                break
+            items.append(item)
+        self._buffer = buffer[pos:]
+        return items
+
+    def remainder(self) -> str:
+        """ Undecoded text, i.e. the whole body when the array field was never found. """
+        return self._buffer
+
+
+class GraphQLClient:
+    """ Async client for the QUERIES table that streams parsed PoolData and Order objects.
+
+    One keep-alive session is reused for every query. Responses are decoded element by element
+    as they arrive, and each element is converted to its object as soon as it is decoded.
+    """
+
+    def __init__(self, session=None, url: str = URL):
+        self.url = url
+        self._owns_session = session is None
+        self.session = session or create_graphql_session()
+
+    async def close(self):
+        if self._owns_session:
+            await self.session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def stream(self, name: str, variables: Optional[Dict[str, Any]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """ Yield the raw list elements of QUERIES[name] as they are decoded. """
+        field = QUERY_FIELDS[name]
+        payload = {"query": QUERIES[name], "variables": variables or {}}
+        async with self.session.post(self.url, json=payload, headers=HEADERS, ssl=get_ssl_context()) as response:
+            if response.status != 200:
+                raise GraphQLError(f"{name} failed with status code {response.status}: {await response.text()}")
+            array = JsonArrayStream(field)
+            decoder = codecs.getincrementaldecoder("utf-8")()
+            async for chunk in response.content.iter_chunked(STREAM_CHUNK_SIZE):
+                for item in array.feed(decoder.decode(chunk)):
+                    yield item
+            for item in array.feed(decoder.decode(b"", final=True)):
+                yield item
+            if not array.found:
+                body = array.remainder()
+                errors = json.loads(body).get("errors") if body.strip() else None
+                raise GraphQLError(f"{name} returned no {field}: {errors}")
+
+    async def fetch(self, name: str, variables: Optional[Dict[str, Any]] = None) -> bytes:
+        """ Raw response body of QUERIES[name], for the bulk decoders in decoder.py. """
+        payload = {"query": QUERIES[name], "variables": variables or {}}
+        async with self.session.post(self.url, json=payload, headers=HEADERS, ssl=get_ssl_context()) as response:
+            if response.status != 200:
+                raise GraphQLError(f"{name} failed with status code {response.status}: {await response.text()}")
+            return await response.read()
+
+    async def paginate(
+        self,
+        name: str,
+        filter: Optional[Dict[str, Any]] = None,
+        page_size: Optional[int] = None,
+        limit_key: str = PAGE_LIMIT_KEY,
+        offset_key: str = PAGE_OFFSET_KEY,
+        max_pages: int = MAX_PAGES,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """ stream() over limit/offset pages of a filterable query until a page is not full.
+
+        A server that ignores the page keys returns the same first page again (or more than
+        page_size items at once); paginate() stops there, and after max_pages pages in any case.
+        """
+        if page_size is None:
+            async for item in self.stream(name, {"filter": filter} if filter is not None else None):
+                yield item
+            return
+        offset = 0
+        previous_first = None
+        for _ in range(max_pages):
+            page_filter = dict(filter or {}, **{limit_key: page_size, offset_key: offset})
+            count = 0
+            first = None
+            page = self.stream(name, {"filter": page_filter})
+            try:
+                async for item in page:
+                    if count == 0:
+                        first = item.get("id")
+                        if first is not None and first == previous_first:
+                            logger.warning(f"{name} returned page {offset // page_size} again; are {limit_key}/{offset_key} supported?")
+                            return
+                    count += 1
+                    yield item
+            finally:
+                await page.aclose()
+            if count != page_size:
+                return
+            previous_first = first
+            offset += count
+        logger.warning(f"{name} stopped after {max_pages} pages of {page_size}")
+
+    async def pools(self) -> AsyncIterator[PoolData]:
+        async for item in self.stream("pools"):
+            yield PoolData.from_json(item)
+
+    async def orders(self, filter: Optional[Dict[str, Any]] = None, page_size: Optional[int] = None) -> AsyncIterator[Order]:
+        async for item in self.paginate("orders", filter, page_size):
+            yield Order.from_json(item)
+
+    async def my_orders(self, filter: Optional[Dict[str, Any]] = None, page_size: Optional[int] = None) -> AsyncIterator[Order]:
+        async for item in self.paginate("my_orders", filter, page_size):
+            yield Order.from_json(item)
+
+    async def positions(self, filter: Optional[Dict[str, Any]] = None) -> AsyncIterator[Dict[str, Any]]:
+        async for item in self.stream("positions", {"filter": filter} if filter is not None else None):
+            yield item
+
+    async def trade_history(self, pool_hash: str) -> AsyncIterator[Dict[str, Any]]:
+        """ Yield trades with their "order" replaced by a parsed Order. """
+        async for item in self.stream("trade_history", {"poolHash": pool_hash}):
+            item["order"] = Order.from_json(item["order"])
+            yield item
@@ -0,0 +1,250 @@
+import asyncio
+import itertools
+import math
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import aiohttp
+from loguru import logger
+from web3 import Web3
+
+from async_contract_calls import create_rpc_session
+from batch_reader import RPC_HEADERS
+from contract_calls import OrderParamsConverter
+from fee_engine import GAS_ESTIMATE_MARGIN, PendingTransaction
+from metrics import timed
+from nonce_manager import is_already_known_message, is_nonce_error_message
+from orders import Order
+from pools import PoolData
+
+# Orders per pre-signed cancelOrders transaction.
+CANCEL_BATCH_SIZE = 100
+# Fee urgency the cancels are priced at, and the multiplier applied on top of it.
+KILL_URGENCY = "fast"
+KILL_FEE_MULTIPLIER = 2
+# Seconds between re-arms in run(); a re-arm is a no-op unless orders, fees or the next nonce changed.
+ARM_INTERVAL = 1.0
+
+
+def _error_message(error) -> str:
+    """ The message of a JSON-RPC error object. """
+    return error.get("message", "") if isinstance(error, dict) else str(error)
+
+
+class PreparedCancel:
+    """ One signed cancelOrders transaction waiting to be broadcast. """
+
+    __slots__ = ("order_hashes", "txn", "raw", "tx_hash")
+
+    def __init__(self, order_hashes: Tuple[str, ...], txn: Dict[str, Any], raw: str, tx_hash: str):
+        self.order_hashes = order_hashes
+        self.txn = txn
+        self.raw = raw
+        self.tx_hash = tx_hash
+
+    @property
+    def nonce(self) -> int:
+        return self.txn["nonce"]
+
+    def __repr__(self) -> str:
+        return f"PreparedCancel(nonce={self.nonce}, orders={len(self.order_hashes)}, tx_hash={self.tx_hash})"
+
+
+class KillSwitch:
+    """ Cancel-all for our resting orders with the transactions signed before they are needed.
+
+    The tracked orders (from my_orders, a QuoteEngine or track()) are split into cancelOrders
+    batches which arm() estimates, prices at KILL_FEE_MULTIPLIER times the fast fees and signs with
+    the next nonces. run() re-arms whenever the orders, the fees or the next nonce change. trigger()
+    then only reserves the nonces and sends every raw transaction in a single JSON-RPC batch; it
+    re-signs locally if another send took the prepared nonces first.
+    """
+
+    def __init__(
+        self,
+        contract_calls,
+        http_url: Optional[str] = None,
+        session: Optional[aiohttp.ClientSession] = None,
+        batch_size: int = CANCEL_BATCH_SIZE,
+        urgency: str = KILL_URGENCY,
+        fee_multiplier: float = KILL_FEE_MULTIPLIER,
+    ):
+        self.calls = contract_calls
+        self.http_url = http_url or contract_calls.web3.provider.endpoint_uri
+        self._owns_session = session is None
+        self.session = session or create_rpc_session()
+        self.batch_size = batch_size
+        self.urgency = urgency
+        self.fee_multiplier = fee_multiplier
+        self.orders: Dict[str, Tuple[Order, PoolData]] = {}
+        self.prepared: List[PreparedCancel] = []
+        self.last_latency: Optional[float] = None
+        self._version = 0
+        self._armed_key = None
+        self._armed_block: Optional[int] = None
+        self._gas: Dict[Tuple[str, ...], int] = {}
+        self._ids = itertools.count()
+
+    async def close(self):
+        if self._owns_session:
+            await self.session.close()
+
+    def track(self, orders: Iterable[Order], pool_data: PoolData):
+        """ Add (or refresh) orders of one pool to the cancel set. """
+        for order in orders:
+            self.orders[order.order_hash] = (order, pool_data)
+        self._version += 1
+
+    def forget(self, order_hashes: Iterable[str]):
+        """ Drop orders that were filled, expired or cancelled elsewhere. """
+        for order_hash in order_hashes:
+            self.orders.pop(order_hash, None)
+        self._version += 1
+
+    def replace(self, orders: Dict[str, Dict[str, Order]], pools: Dict[str, PoolData]):
+        """ Track exactly the given orders by pool id, e.g. QuoteEngine.live. """
+        self.orders = {
+            order_hash: (order, pools[pool_id])
+            for pool_id, by_hash in orders.items()
+            if pool_id in pools
+            for order_hash, order in by_hash.items()
+        }
+        self._version += 1
+
+    async def load(self, graphql_client, pools: Dict[str, PoolData], filter: Optional[Dict[str, Any]] = None):
+        """ Track our open orders from the my_orders query. """
+        maker = self.calls.account_address.lower()
+        orders: Dict[str, Dict[str, Order]] = {}
+        async for order in graphql_client.my_orders(filter):
+            if order.maker.lower() == maker and order.fraction_filled < 1:
+                orders.setdefault(order.pool_id, {})[order.order_hash] = order
+        self.replace(orders, pools)
+
+    async def _fee_params(self) -> Dict[str, int]:
+        params = await self.calls.fee_engine.atx_params(self.urgency)
+        return {
+            key: math.ceil(value * self.fee_multiplier) if key != "type" else value
+            for key, value in params.items()
+        }
+
+    async def _sign(self, order_hashes: Tuple[str, ...], txn: Dict[str, Any]) -> PreparedCancel:
+        signed = await self.calls._sign(txn)
+        return PreparedCancel(order_hashes, txn, Web3.to_hex(signed.rawTransaction), Web3.to_hex(signed.hash))
+
+    async def _prepare(
+        self, entries: Sequence[Tuple[Order, PoolData]], nonce: int, chain_id: int, fees: Dict[str, int]
+    ) -> PreparedCancel:
+        order_hashes = tuple(order.order_hash for order, _ in entries)
+        order_tuples = [OrderParamsConverter.order_to_tuple(order, pool) for order, pool in entries]
+        data = self.calls.calldata.cancel_orders(order_tuples)
+        gas = self._gas.get(order_hashes)
+        if gas is None:
+            estimate = await self.calls.web3.eth.estimate_gas(
+                {"from": self.calls.account_address, "to": self.calls.contract.address, "data": data}
+            )
+            gas = self._gas[order_hashes] = int(estimate * GAS_ESTIMATE_MARGIN)
+        txn = {
+            "chainId": chain_id,
+            "to": self.calls.contract.address,
+            "data": data,
+            "value": 0,
+            "gas": gas,
+            "nonce": nonce,
+            **fees,
+        }
+        return await self._sign(order_hashes, txn)
+
+    async def arm(self) -> bool:
+        """ Re-sign the cancel batches if the orders, fees or next nonce changed; returns whether it did. """
+        version = self._version
+        fees = await self._fee_params()
+        nonce = await self.calls.nonce_manager.peek()
+        key = (version, nonce, tuple(sorted(fees.items())))
+        if key == self._armed_key:
+            return False
+        chain_id = await self.calls.rpc_cache.achain_id()
+        self._armed_block = await self.calls.rpc_cache.ablock_number()
+        entries = [self.orders[order_hash] for order_hash in sorted(self.orders)]
+        batches = [entries[i:i + self.batch_size] for i in range(0, len(entries), self.batch_size)]
+        self.prepared = list(await asyncio.gather(*(self._prepare(batch, nonce + i, chain_id, fees) for i, batch in enumerate(batches))))
+        self._gas = {cancel.order_hashes: self._gas[cancel.order_hashes] for cancel in self.prepared}
+        self._armed_key = key
+        logger.debug(f"Kill switch armed: {len(entries)} orders in {len(batches)} transactions from nonce {nonce}")
+        return True
+
+    async def run(self, interval: float = ARM_INTERVAL):
+        """ Keep the cancels armed until cancelled. """
+        while True:
+            try:
+                await self.arm()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Kill switch arm failed: {e!r}")
+            await asyncio.sleep(interval)
+
+    async def _broadcast(self, prepared: Sequence[PreparedCancel]) -> List[Dict[str, Any]]:
+        """ eth_sendRawTransaction for every prepared cancel in one JSON-RPC batch; responses in order. """
+        ids = [next(self._ids) for _ in prepared]
+        payload = [
+            {"jsonrpc": "2.0", "id": i, "method": "eth_sendRawTransaction", "params": [p.raw]}
+            for i, p in zip(ids, prepared)
+        ]
+        async with self.session.post(self.http_url, json=payload, headers=RPC_HEADERS) as response:
+            response.raise_for_status()
+            responses = await response.json(content_type=None)
+        if not isinstance(responses, list):
+            error = responses.get("error", responses)
+            return [{"error": error} for _ in prepared]
+        by_id = {response.get("id"): response for response in responses}
+        return [by_id.get(i, {"error": {"message": "missing response"}}) for i in ids]
+
+    @timed("kill_switch")
+    async def trigger(self) -> List[Dict[str, Any]]:
+        """ Broadcast the cancels of every tracked order now.
+
+        Returns:
+            list: One {"tx_hash", "nonce", "orders", "error"} per cancelOrders transaction.
+        """
+        start = time.perf_counter()
+        if self._armed_key is None or self._armed_key[0] != self._version:
+            await self.arm()
+        prepared = list(self.prepared)
+        if not prepared:
+            return []
+        nonce_manager = self.calls.nonce_manager
+        for i, cancel in enumerate(prepared):
+            nonce = await nonce_manager.allocate()
+            if nonce != cancel.nonce:
+                prepared[i] = await self._sign(cancel.order_hashes, dict(cancel.txn, nonce=nonce))
+        responses = await self._broadcast(prepared)
+        self.last_latency = time.perf_counter() - start
+
+        retry = [i for i, r in enumerate(responses) if "error" in r and is_nonce_error_message(_error_message(r["error"]))]
+        if retry:
+            logger.warning(f"Kill switch hit {len(retry)} nonce conflicts, resyncing and resending")
+            await nonce_manager.resync()
+            for i in retry:
+                prepared[i] = await self._sign(prepared[i].order_hashes, dict(prepared[i].txn, nonce=await nonce_manager.allocate()))
+            for i, response in zip(retry, await self._broadcast([prepared[i] for i in retry])):
+                responses[i] = response
+
+        results = []
+        cancelled = []
+        for cancel, response in zip(prepared, responses):
+            if "error" in response and not is_already_known_message(_error_message(response["error"])):
+                nonce_manager.release(cancel.nonce)
+                results.append({"tx_hash": None, "nonce": cancel.nonce, "orders": cancel.order_hashes, "error": str(response["error"])})
+                continue
+            tx_hash = response.get("result") or cancel.tx_hash
+            nonce_manager.confirm(cancel.nonce, tx_hash)
+            self.calls.pending[cancel.nonce] = PendingTransaction(cancel.nonce, cancel.txn, tx_hash, self._armed_block)
+            cancelled.extend(cancel.order_hashes)
+            results.append({"tx_hash": tx_hash, "nonce": cancel.nonce, "orders": cancel.order_hashes, "error": None})
+        self.forget(cancelled)
+        self._armed_key = None
+        logger.warning(
+            f"Kill switch broadcast {len(cancelled)} cancels in {len(prepared)} transactions "
+            f"{self.last_latency * 1000:.1f} ms after the trigger"
+        )
+        return results
@@ -0,0 +1,284 @@
+import asyncio
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+import aiohttp
+from eth_account import Account
+from loguru import logger
+
+from async_contract_calls import AsyncContractCalls
+from config import Config
+from contract_calls import DEFAULT_FILL_GAS_BUDGET, FILL_ORDER_GAS, FILL_ORDERS_BASE_GAS
+
+# Sends a lane's workers run at once.
+LANE_CONCURRENCY = 4
+# Unmined transactions a lane keeps before it waits for a block; geth keeps 16 executable slots per account.
+MAX_PENDING_PER_LANE = 16
+# Seconds between mined-nonce checks while a lane is full.
+PENDING_POLL_INTERVAL = 0.25
+# Extra queued jobs a lane may carry over the least loaded one before its affinity keys move.
+AFFINITY_SLACK = 4
+
+
+def private_keys_from_env() -> List[str]:
+    """ Signing keys from PRIVATE_KEYS (comma separated), falling back to PRIVATE_KEY. """
+    keys = Config.get_str("PRIVATE_KEYS") or Config.get_str("PRIVATE_KEY") or ""
+    return [key.strip() for key in keys.split(",") if key.strip()]
+
+
+class Lane:
+    """ One signing account: its own AsyncContractCalls (and so its own nonce sequence), a job queue
+    and the workers draining it. """
+
+    def __init__(self, calls: AsyncContractCalls, concurrency: int = LANE_CONCURRENCY, max_pending: int = MAX_PENDING_PER_LANE):
+        self.calls = calls
+        self.concurrency = concurrency
+        self.max_pending = max_pending
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.load = 0
+        self.sent = 0
+        self.failed = 0
+        self.sending = 0
+        self._workers: List[asyncio.Task] = []
+
+    @property
+    def account(self) -> str:
+        return self.calls.account_address
+
+    def start(self):
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(self, job: Callable[[AsyncContractCalls], Awaitable[Any]], weight: int = 1) -> asyncio.Future:
+        """ Queue job(calls); weight is the number of orders it carries, counted in load until it finishes. """
+        future = asyncio.get_running_loop().create_future()
+        self.load += weight
+        self.queue.put_nowait((job, weight, future))
+        return future
+
+    async def _wait_for_room(self):
+        """ Hold new sends while max_pending transactions of this account are unmined or being sent. """
+        while len(self.calls.pending) + self.sending >= self.max_pending:
+            mined = await self.calls.web3.eth.get_transaction_count(self.account, "latest")
+            for nonce in [n for n in self.calls.pending if n < mined]:
+                self.calls.fee_engine.record_inclusion(self.calls.pending.pop(nonce))
+            if len(self.calls.pending) + self.sending >= self.max_pending:
+                await asyncio.sleep(PENDING_POLL_INTERVAL)
+        self.sending += 1
+
+    async def _work(self):
+        while True:
+            job, weight, future = await self.queue.get()
+            reserved = False
+            try:
+                await self._wait_for_room()
+                reserved = True
+                result = await job(self.calls)
+                self.sent += weight
+                if not future.done():
+                    future.set_result(result)
+            except asyncio.CancelledError:
+                if not future.done():
+                    future.cancel()
+                raise
+            except Exception as e:
+                self.failed += weight
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self.load -= weight
+                if reserved:
+                    self.sending -= 1
+
+    def __repr__(self) -> str:
+        return f"Lane(account={self.account}, load={self.load}, sent={self.sent}, failed={self.failed}, pending={len(self.calls.pending)})"
+
+
+class ExecutionLanes:
+    """ Routes fills and cancels across several signing accounts so their transactions do not share
+    one nonce sequence.
+
+    Fills go to the least loaded lane, except that fills with the same affinity key (the pool id by
+    default, or the maker of the filled order) stay on the lane they were first sent to while it is
+    within AFFINITY_SLACK jobs of the least loaded one. Cancels must come from the order's maker, so
+    they always go to the maker's lane. Results come back in input order, tagged with the account.
+    """
+
+    def __init__(self, lanes: Sequence[AsyncContractCalls], fill_affinity: Optional[str] = "pool", **lane_options):
+        if not lanes:
+            raise ValueError("At least one lane is required")
+        if fill_affinity not in ("pool", "maker", None):
+            raise ValueError("fill_affinity must be 'pool', 'maker' or None")
+        self.lanes = [Lane(calls, **lane_options) for calls in lanes]
+        self.fill_affinity = fill_affinity
+        self._affinity: Dict[str, Lane] = {}
+        self._by_account = {lane.account.lower(): lane for lane in self.lanes}
+
+    @classmethod
+    async def connect(
+        cls,
+        http_url: str,
+        contract_address: str,
+        contract_abi,
+        private_keys: Optional[Sequence[str]] = None,
+        session: Optional[aiohttp.ClientSession] = None,
+        poa: bool = True,
+        **kwargs,
+    ) -> "ExecutionLanes":
+        """ One lane per key (default: private_keys_from_env()), sharing the web3 client, session, RPC cache and fee engine. """
+        private_keys = list(private_keys or private_keys_from_env())
+        if not private_keys:
+            raise ValueError("No private keys configured; set PRIVATE_KEYS")
+        first = await AsyncContractCalls.connect(
+            http_url, contract_address, contract_abi, Account.from_key(private_keys[0]).address, private_keys[0], session, poa
+        )
+        lanes = [first]
+        for key in private_keys[1:]:
+            calls = AsyncContractCalls(first.web3, first.contract, Account.from_key(key).address, key)
+            calls.rpc_cache = first.rpc_cache
+            calls.fee_engine = first.fee_engine
+            lanes.append(calls)
+        return cls(lanes, **kwargs)
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def start(self):
+        for lane in self.lanes:
+            lane.start()
+
+    async def close(self):
+        for lane in self.lanes:
+            await lane.stop()
+        await self.lanes[0].calls.close()
+
+    def _least_loaded(self, planned: Optional[Dict[Lane, int]] = None) -> Lane:
+        planned = planned or {}
+        return min(self.lanes, key=lambda lane: lane.load + planned.get(lane, 0))
+
+    def pick(self, key: Optional[str], planned: Optional[Dict[Lane, int]] = None) -> Lane:
+        """ The lane for a job with affinity key (None for no affinity); planned adds load not yet submitted. """
+        planned = planned or {}
+        least = self._least_loaded(planned)
+        if key is None:
+            return least
+        lane = self._affinity.get(key)
+        if lane is None or lane.load + planned.get(lane, 0) > least.load + planned.get(least, 0) + AFFINITY_SLACK:
+            lane = self._affinity[key] = least
+        return lane
+
+    def _fill_key(self, order_data: dict, pool_data) -> Optional[str]:
+        if self.fill_affinity == "pool":
+            return pool_data.id
+        if self.fill_affinity == "maker":
+            return order_data["maker"].lower()
+        return None
+
+    def lane_for_maker(self, maker: str) -> Lane:
+        lane = self._by_account.get(maker.lower())
+        if lane is None:
+            raise ValueError(f"No lane signs for maker {maker}")
+        return lane
+
+    async def fill_order(self, order_data: dict, pool_data, gas: Optional[int] = None) -> Dict[str, Any]:
+        lane = self.pick(self._fill_key(order_data, pool_data))
+        try:
+            tx_hash = await lane.submit(lambda calls: calls.fill_order(order_data, pool_data, gas))
+            return {"account": lane.account, "tx_hash": tx_hash, "error": None}
+        except Exception as e:
+            return {"account": lane.account, "tx_hash": None, "error": str(e)}
+
+    async def fill_orders(
+        self,
+        orders: Sequence[dict],
+        pool_data,
+        fractions: Optional[Sequence] = None,
+        **fill_options,
+    ) -> List[Dict[str, Any]]:
+        """ Spread orders over the lanes and send each lane's share as fillOrders batches of
+        AsyncContractCalls.fill_orders. Every batch is its own lane job, so it takes one of the lane's
+        max_pending slots like any other transaction.
+
+        Returns:
+            list: The fill_orders result of every order in input order, plus the "account" that sent it.
+        """
+        pools = pool_data if isinstance(pool_data, (list, tuple)) else [pool_data] * len(orders)
+        per_tx = max(
+            1,
+            (fill_options.get("gas_budget", DEFAULT_FILL_GAS_BUDGET) - FILL_ORDERS_BASE_GAS)
+            // fill_options.get("gas_per_order", FILL_ORDER_GAS),
+        )
+        planned: Dict[Lane, int] = defaultdict(int)
+        groups: Dict[Lane, List[int]] = defaultdict(list)
+        for i, (order, pool) in enumerate(zip(orders, pools)):
+            lane = self.pick(self._fill_key(order, pool), planned)
+            planned[lane] += 1
+            groups[lane].append(i)
+
+        def job(indices):
+            return lambda calls: calls.fill_orders(
+                [orders[i] for i in indices],
+                [pools[i] for i in indices],
+                [fractions[i] for i in indices] if fractions is not None else None,
+                **fill_options,
+            )
+
+        batches = [
+            (lane, indices[start:start + per_tx])
+            for lane, indices in groups.items()
+            for start in range(0, len(indices), per_tx)
+        ]
+        futures = [lane.submit(job(indices), len(indices)) for lane, indices in batches]
+        results: List[Optional[Dict[str, Any]]] = [None] * len(orders)
+        for (lane, indices), future in zip(batches, futures):
+            try:
+                batch_results = await future
+            except Exception as e:
+                batch_results = [{"batch": None, "tx_hash": None, "error": str(e)} for _ in indices]
+            for i, result in zip(indices, batch_results):
+                results[i] = dict(result, index=i, account=lane.account)
+        logger.info(
+            f"Filled {len(orders)} orders in {len(batches)} batches over {len(groups)} lanes: {[len(g) for g in groups.values()]}"
+        )
+        return results
+
+    async def cancel_orders(self, orders: Sequence, pool_data) -> List[Dict[str, Any]]:
+        """ One cancelOrders transaction per maker lane, sent concurrently; one result per order in input order. """
+        pools = pool_data if isinstance(pool_data, (list, tuple)) else [pool_data] * len(orders)
+        groups: Dict[Lane, List[int]] = defaultdict(list)
+        results: List[Optional[Dict[str, Any]]] = [None] * len(orders)
+        for i, order in enumerate(orders):
+            lane = self._by_account.get(order.maker.lower())
+            if lane is None:
+                results[i] = {"index": i, "account": None, "tx_hash": None, "error": f"No lane signs for maker {order.maker}"}
+            else:
+                groups[lane].append(i)
+
+        def job(indices):
+            return lambda calls: calls.cancel_orders([orders[i] for i in indices], [pools[i] for i in indices])
+
+        futures = {lane: lane.submit(job(indices), len(indices)) for lane, indices in groups.items()}
+        for lane, indices in groups.items():
+            try:
+                tx_hash, error = await futures[lane], None
+            except Exception as e:
+                tx_hash, error = None, str(e)
+            for i in indices:
+                results[i] = {"index": i, "account": lane.account, "tx_hash": tx_hash, "error": error}
+        return results
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [
+            {"account": lane.account, "load": lane.load, "sent": lane.sent, "failed": lane.failed, "pending": len(lane.calls.pending)}
+            for lane in self.lanes
+        ]
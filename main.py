@@ -1,214 +1,22 @@
 import asyncio
-import datetime
 from pools import PoolData
 from orders import Order
-from graphql_calls import place_order
-from decimal import Decimal
-from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
-import uuid
-from utils import shares_to_size_kb, size_kb_to_shares, date_to_block_timestamp
-from contract_calls import ContractCalls
+from async_contract_calls import AsyncContractCalls
+from graphql_client import GraphQLClient
+from order_factory import ACCOUNT, CONTRACT_ADDRESS, PRIVATE_KEY
 from config import Config
 from loguru import logger
-from web3.middleware import geth_poa_middleware
-from web3 import Web3
-import aiohttp
-from eth_account.messages import encode_defunct
-from eth_account import Account
-import json
 
-ACCOUNT = Config.get_str("ACCOUNT", "0x985aA7045Fd77F5CCE7FE288264E620FB29fbb03")
-PRIVATE_KEY = Config.get_str("PRIVATE_KEY")
-CONTRACT_ADDRESS = Config.get_str("CONTRACT_ADDRESS", "0x71486c325a1dfd990a3a21d8debe82d1d4ed3c88")
 WEB3_HTTP_URL = Config.get_str("WEB3_HTTP_URL", "https://eth-sepolia.g.alchemy.com/v2/9yB_MqlkC6S3wwNuUsZBMJxA7h4Yuy2p")
-CHAIN_ID = 11155111
 
-zero_address = "0x0000000000000000000000000000000000000000"
-zero_pool = "0x0000000000000000000000000000000000000000"
-
-def is_supported_chain_id(chain_id):
-    return chain_id in {11155111, 1}
-
-def make_order_domain(chain_id):
-    return {
-        "name": "SilicaPools",
-        "version": "1",
-        "chainId": chain_id,
-        "verifyingContract": CONTRACT_ADDRESS
-    }
-
-order_types = {
-    "PoolParams": [
-        {"name": "floor", "type": "uint128"},
-        {"name": "cap", "type": "uint128"},
-        {"name": "index", "type": "address"},
-        {"name": "targetStartTimestamp", "type": "uint48"},
-        {"name": "targetEndTimestamp", "type": "uint48"},
-        {"name": "payoutToken", "type": "address"},
-    ],
-    "SilicaOrder": [
-        {"name": "maker", "type": "address"},
-        {"name": "taker", "type": "address"},
-        {"name": "expiry", "type": "uint48"},
-        {"name": "offeredUpfrontToken", "type": "address"},
-        {"name": "offeredUpfrontAmount", "type": "uint128"},
-        {"name": "offeredLongShares", "type": "uint128"},
-        {"name": "offeredLongSharesParams", "type": "PoolParams"},
-        {"name": "requestedUpfrontToken", "type": "address"},
-        {"name": "requestedUpfrontAmount", "type": "uint128"},
-        {"name": "requestedLongShares", "type": "uint128"},
-        {"name": "requestedLongSharesParams", "type": "PoolParams"},
-    ]
-}
-
-order_primary_type = "SilicaOrder"
-
-def make_order_message(pool: PoolData, order):
-    offered_long_shares = Decimal(order["offeredLongShares"])
-    requested_long_shares = Decimal(order["requestedLongShares"])
-    
-    if offered_long_shares != 0 and requested_long_shares != 0:
-        raise ValueError("Error[orderMessage]: Pool-for-pool trades are currently not supported.")
-    
-    pool_message = {
-        "floor": Decimal(pool.floor),
-        "cap": Decimal(pool.cap),
-        "index": pool.index,
-        "targetStartTimestamp": pool.target_start_timestamp.timestamp(),
-        "targetEndTimestamp": pool.target_end_timestamp.timestamp(),
-        "payoutToken": pool.payout_token
-    }
-    
-    order_message = {
-        "maker": order["maker"],
-        "taker": zero_address,
-        "expiry": int(order["expiry"]),
-        "offeredUpfrontToken": order.get("offeredUpfrontToken", zero_address),
-        "offeredUpfrontAmount": Decimal(order["offeredUpfrontAmount"]),
-        "offeredLongShares": offered_long_shares,
-        "offeredLongSharesParams": zero_pool if offered_long_shares == 0 else pool_message,
-        "requestedUpfrontToken": order.get("requestedUpfrontToken", zero_address),
-        "requestedUpfrontAmount": Decimal(order["requestedUpfrontAmount"]),
-        "requestedLongShares": requested_long_shares,
-        "requestedLongSharesParams": zero_pool if requested_long_shares == 0 else pool_message
-    }
-    
-    return order_message
-
-def sign_order_payload(pool, order):
-    if not is_supported_chain_id(order["chainId"]):
-        raise ValueError(f"Chain ID {order['chainId']} is not supported.")
-    
-    payload = {
-        "domain": make_order_domain(order["chainId"]),
-        "types": order_types,
-        "primaryType": order_primary_type,
-        "message": make_order_message(pool, order)
-    }
-    
-    return payload
-
-def hash_order(pool, order):
-    payload = sign_order_payload(pool, order)
-    payload_data = json.dumps(payload, default=str).encode('utf-8')
-    hash = Web3.solidity_keccak(
-        ['bytes'],
-        [payload_data]
-    ).hex()
-    return hash
-
-def generate_signature(order_hash, private_key):
-    logger.debug(order_hash)
-    message = encode_defunct(text=order_hash)
-    
-    logger.debug(f"message: {message}")
-    signed_message = Account.sign_message(message, private_key=private_key)
-    return signed_message.signature.hex()
-
-
-async def create_order(
-    pool_data: PoolData, 
-    price: Decimal, 
-    size: Decimal, 
-    direction: str, 
-    expiry: datetime
-) -> Order:
-    
-    # Generate a unique order ID and hash (you may want to replace this with a real hashing function)
-    order_id = str(uuid.uuid4())
-    order_hash = str(uuid.uuid4())  # Placeholder for actual hash generation
-    # Calculate the requested and offered amounts based on direction
-    requested_upfront_token=None
-    offered_upfront_token=None
-    if direction == "LONG":
-        requested_upfront_token=pool_data.payout_token,
-    elif direction == "SHORT":
-        offered_upfront_token=pool_data.payout_token,
-    else:
-        raise ValueError("Direction must be either 'LONG' or 'SHORT'")
-    
-    # Create the Order object
-    new_order = Order(
-        id=order_id,
-        order_hash=order_hash,
-        expiry=expiry,
-        pool_id=pool_data.id,
-        maker=ACCOUNT,  # Replace with actual maker address
-        direction=direction,
-        signature="0xSignatureHere",  # Replace with actual signature
-        requested_long_shares=None,
-        offered_long_shares=None,
-        offered_upfront_token=offered_upfront_token,
-        requested_upfront_token=requested_upfront_token,
-        requested_upfront_amount=None,
-        offered_upfront_amount=None,
-        fraction_filled=Decimal("0")
-    )
-    new_order.from_price_and_size(price, size, pool_data)
-    new_order.signature = generate_signature(hash_order(pool_data, generate_order_payload_for_hash(new_order)), PRIVATE_KEY)
-    
-    return new_order
-def generate_order_payload_for_hash(order: Order) -> Dict[str, Any]:
-    return {
-        "maker": order.maker,
-        "expiry": order.expiry.timestamp(),
-        "offeredUpfrontToken": order.offered_upfront_token or "0x0000000000000000000000000000000000000000",
-        "offeredUpfrontAmount": str(int(order.offered_upfront_amount)) if order.offered_upfront_amount else "0",
-        "offeredLongShares": str(int(order.offered_long_shares)) if order.offered_long_shares else "0",
-        "requestedUpfrontToken": order.requested_upfront_token or "0x0000000000000000000000000000000000000000",
-        "requestedUpfrontAmount": str(int(order.requested_upfront_amount)) if order.requested_upfront_amount else "0",
-        "requestedLongShares": str(int(order.requested_long_shares)) if order.requested_long_shares else "0",
-        "signature": order.signature,
-        "chainId": 11155111,  # Adjust as needed
-        "direction": order.direction,
-        "poolId": order.pool_id,
-    }
-def generate_order_payload(order: Order) -> Dict[str, Any]:
-    return {
-        "maker": order.maker,
-        "expiry": order.expiry.isoformat(),
-        "offeredUpfrontToken": order.offered_upfront_token or "0x0000000000000000000000000000000000000000",
-        "offeredUpfrontAmount": str(int(order.offered_upfront_amount)) if order.offered_upfront_amount else "0",
-        "offeredLongShares": str(int(order.offered_long_shares)) if order.offered_long_shares else "0",
-        "requestedUpfrontToken": order.requested_upfront_token or "0x0000000000000000000000000000000000000000",
-        "requestedUpfrontAmount": str(int(order.requested_upfront_amount)) if order.requested_upfront_amount else "0",
-        "requestedLongShares": str(int(order.requested_long_shares)) if order.requested_long_shares else "0",
-        "signature": order.signature,
-        "chainId": 11155111,  # Adjust as needed
-        "direction": order.direction,
-        "poolId": order.pool_id,
-    }
 async def main():
     
-    web3 = Web3(Web3.HTTPProvider(WEB3_HTTP_URL))
-    web3.middleware_onion.inject(geth_poa_middleware, layer=0)
     contract_abi = None
     with open(f"contracts/{CONTRACT_ADDRESS}.abi.json") as contract_file:
         contract_abi = contract_file.read()
-    contract = web3.eth.contract(address=Web3.to_checksum_address(CONTRACT_ADDRESS), abi=contract_abi)
     
-    contract_call = ContractCalls(web3, contract, ACCOUNT, PRIVATE_KEY)
+    contract_call = await AsyncContractCalls.connect(WEB3_HTTP_URL, CONTRACT_ADDRESS, contract_abi, ACCOUNT, PRIVATE_KEY)
+    graphql_client = GraphQLClient(contract_call.session)
     pool_data = PoolData.from_json(
         {
             "id": "b8c2d443-ef62-4c03-afbf-d0d4e77c8852",
@@ -233,7 +41,7 @@ async def main():
         },
     )
     
-    #order = await create_order(pool_data, Decimal('5000'), Decimal('1'), "LONG", datetime.now() + timedelta(days=1))
+    #order = await create_order(pool_data, Decimal('5000'), Decimal('1'), "LONG", datetime.now(timezone.utc) + timedelta(days=1))
     order = Order.from_json({
         "state": {
             "fractionFilled": "0"
@@ -300,7 +108,15 @@ async def main():
 
     # Test the function
     logger.info(order_params)
-    logger.info(ContractCalls(web3, contract, ACCOUNT, PRIVATE_KEY).fill_order(order_params, pool_data))
+
+    async def list_pools():
+        return [pool async for pool in graphql_client.pools()]
+
+    # The GraphQL query and the fill share the session and run concurrently.
+    pools, tx_hash = await asyncio.gather(list_pools(), contract_call.fill_order(order_params, pool_data))
+    logger.info(f"{len(pools)} pools")
+    logger.info(tx_hash)
+    await contract_call.close()
 
     
     
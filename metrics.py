@@ -0,0 +1,336 @@
+import asyncio
+import functools
+import json
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import aiohttp
+from aiohttp import web
+
+from config import Config
+
+# Instrumentation is off unless METRICS_ENABLED is set; enable()/disable() switch it at runtime.
+_enabled = Config.get_bool("METRICS_ENABLED", False)
+# Linear sub-buckets per power of two; recorded values keep a relative error below 1/2**SUB_BUCKET_BITS.
+SUB_BUCKET_BITS = 5
+# Quantiles exported for every stage.
+EXPORT_QUANTILES = (0.5, 0.9, 0.99, 0.999)
+# Prefix of every exported Prometheus metric name.
+METRIC_PREFIX = "alkimiya_"
+# Default port of the local /metrics endpoint.
+METRICS_PORT = 9464
+
+_SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def _bucket(value: int) -> int:
+    """ Log-linear bucket index: exact below 2 * _SUB_BUCKETS, then _SUB_BUCKETS buckets per power of two. """
+    shift = value.bit_length() - SUB_BUCKET_BITS - 1
+    if shift <= 0:
+        return value
+    return shift * _SUB_BUCKETS + (value >> shift)
+
+
+def _bucket_midpoint(index: int) -> int:
+    if index < _SUB_BUCKETS << 1:
+        return index
+    shift, mantissa = divmod(index, _SUB_BUCKETS)
+    shift -= 1
+    mantissa += _SUB_BUCKETS
+    return (mantissa << shift) + (1 << (shift - 1))
+
+
+class Histogram:
+    """ HDR-style histogram of non-negative integers (nanoseconds for stages).
+
+    Recording is O(1) into sparse log-linear buckets, so memory stays bounded by the value range
+    rather than the sample count while quantiles keep a ~3% relative error. Count, sum, min and
+    max are exact.
+    """
+
+    __slots__ = ("counts", "count", "total", "min", "max", "_lock")
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0
+        self.min: Optional[int] = None
+        self.max: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def record(self, value: int):
+        index = _bucket(value)
+        with self._lock:
+            self.counts[index] = self.counts.get(index, 0) + 1
+            self.count += 1
+            self.total += value
+            if self.min is None or value < self.min:
+                self.min = value
+            if self.max is None or value > self.max:
+                self.max = value
+
+    def quantile(self, q: float) -> Optional[int]:
+        """ Value at quantile q (0-1), or None when nothing was recorded. """
+        if not self.count:
+            return None
+        rank = max(1, int(q * self.count + 0.5))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(max(_bucket_midpoint(index), self.min), self.max)
+        return self.max
+
+    def mean(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "min": self.min,
+            "max": self.max,
+            "mean": self.mean(),
+            "quantiles": {str(q): self.quantile(q) for q in EXPORT_QUANTILES},
+        }
+
+    def __repr__(self) -> str:
+        return f"Histogram(count={self.count}, p50={self.quantile(0.5)}, p99={self.quantile(0.99)}, max={self.max})"
+
+
+class Registry:
+    """ Per-stage latency histograms (nanoseconds) and labelled counters. """
+
+    def __init__(self):
+        self.stages: Dict[str, Histogram] = {}
+        self.counters: Dict[Tuple[str, Labels], int] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, stage: str) -> Histogram:
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self.stages.setdefault(stage, Histogram())
+        return histogram
+
+    def observe(self, stage: str, nanoseconds: int):
+        self.histogram(stage).record(nanoseconds)
+
+    def increment(self, name: str, value: int = 1, labels: Labels = ()):
+        key = (name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def reset(self):
+        with self._lock:
+            self.stages = {}
+            self.counters = {}
+
+    def snapshot(self) -> Dict[str, Any]:
+        """ JSON-serialisable view of every stage and counter; latencies are in nanoseconds. """
+        return {
+            "stages": {stage: histogram.to_dict() for stage, histogram in sorted(self.stages.items())},
+            "counters": [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self.counters.items())
+            ],
+        }
+
+    def to_prometheus(self) -> str:
+        """ Prometheus text exposition: one summary for the stage latencies (seconds) plus the counters. """
+        name = f"{METRIC_PREFIX}stage_latency_seconds"
+        lines = [f"# HELP {name} Latency of instrumented stages.", f"# TYPE {name} summary"]
+        for stage, histogram in sorted(self.stages.items()):
+            for q in EXPORT_QUANTILES:
+                value = histogram.quantile(q)
+                lines.append(f'{name}{{stage="{stage}",quantile="{q}"}} {(value or 0) / 1e9:.9f}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {histogram.total / 1e9:.9f}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {histogram.count}')
+        typed = set()
+        for (counter, labels), value in sorted(self.counters.items()):
+            metric = f"{METRIC_PREFIX}{counter}"
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            rendered = ",".join(f'{key}="{label}"' for key, label in labels)
+            lines.append(f"{metric}{{{rendered}}} {value}" if rendered else f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def observe(stage: str, nanoseconds: int):
+    if _enabled:
+        REGISTRY.observe(stage, nanoseconds)
+
+
+def increment(name: str, value: int = 1, labels: Labels = ()):
+    if _enabled:
+        REGISTRY.increment(name, value, labels)
+
+
+class _Span:
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        REGISTRY.observe(self.stage, time.perf_counter_ns() - self.start)
+        if exc_type is not None:
+            REGISTRY.increment("stage_errors_total", 1, (("stage", self.stage),))
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def span(stage: str):
+    """ Context manager timing its body into the stage histogram with the monotonic clock.
+
+    Exceptions are recorded as well and counted in stage_errors_total. When instrumentation is
+    off a shared no-op is returned.
+    """
+    return _Span(stage) if _enabled else _NOOP_SPAN
+
+
+def timed(stage: str) -> Callable:
+    """ Decorator form of span() for plain and async functions. """
+
+    def decorate(function):
+        if asyncio.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                if not _enabled:
+                    return await function(*args, **kwargs)
+                with _Span(stage):
+                    return await function(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            with _Span(stage):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def trace_config(api: str) -> aiohttp.TraceConfig:
+    """ aiohttp tracing that counts requests, errors and bytes on a session under api ("rpc", "graphql")
+    and times every request into the http.<api> stage. """
+    labels = (("api", api),)
+    stage = f"http.{api}"
+
+    async def on_request_start(session, context, params):
+        context.start = time.perf_counter_ns() if _enabled else None
+
+    async def on_request_end(session, context, params):
+        if context.start is not None:
+            REGISTRY.observe(stage, time.perf_counter_ns() - context.start)
+            REGISTRY.increment("http_requests_total", 1, labels)
+
+    async def on_request_exception(session, context, params):
+        if context.start is not None:
+            REGISTRY.increment("http_request_errors_total", 1, labels)
+
+    async def on_request_chunk_sent(session, context, params):
+        if _enabled:
+            REGISTRY.increment("http_sent_bytes_total", len(params.chunk), labels)
+
+    async def on_response_chunk_received(session, context, params):
+        if _enabled:
+            REGISTRY.increment("http_received_bytes_total", len(params.chunk), labels)
+
+    config = aiohttp.TraceConfig(trace_config_ctx_factory=lambda trace_request_ctx: SimpleNamespace(start=None))
+    config.on_request_start.append(on_request_start)
+    config.on_request_end.append(on_request_end)
+    config.on_request_exception.append(on_request_exception)
+    config.on_request_chunk_sent.append(on_request_chunk_sent)
+    config.on_response_chunk_received.append(on_response_chunk_received)
+    return config
+
+
+def rpc_middleware(make_request, web3):
+    """ web3 middleware counting JSON-RPC calls by method and timing them into rpc.<method> stages. """
+
+    def middleware(method, params):
+        if not _enabled:
+            return make_request(method, params)
+        with _Span(f"rpc.{method}"):
+            response = make_request(method, params)
+        REGISTRY.increment("rpc_calls_total", 1, (("method", method),))
+        return response
+
+    return middleware
+
+
+async def async_rpc_middleware(make_request, web3):
+    """ rpc_middleware for AsyncWeb3. """
+
+    async def middleware(method, params):
+        if not _enabled:
+            return await make_request(method, params)
+        with _Span(f"rpc.{method}"):
+            response = await make_request(method, params)
+        REGISTRY.increment("rpc_calls_total", 1, (("method", method),))
+        return response
+
+    return middleware
+
+
+def dump_json(path: str):
+    """ Write REGISTRY.snapshot() to path. """
+    with open(path, "w") as f:
+        json.dump(REGISTRY.snapshot(), f, indent=2)
+
+
+async def serve(host: str = "127.0.0.1", port: int = METRICS_PORT) -> web.AppRunner:
+    """ Serve the Prometheus text format on http://host:port/metrics; await runner.cleanup() to stop. """
+
+    async def handle(request):
+        return web.Response(text=REGISTRY.to_prometheus(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
@@ -0,0 +1,155 @@
+import asyncio
+import threading
+from typing import Dict, Optional
+
+from loguru import logger
+
+# Node error fragments that mean our local nonce view disagrees with the chain.
+NONCE_ERROR_MARKERS = (
+    "nonce too low",
+    "nonce too high",
+    "replacement transaction underpriced",
+    "invalid nonce",
+)
+# Node error fragments that mean the node already holds this exact signed transaction.
+ALREADY_KNOWN_MARKERS = (
+    "already known",
+    "known transaction",
+)
+
+
+def is_nonce_error(error: Exception) -> bool:
+    """ Return True if a send error was caused by a stale or colliding nonce. """
+    return is_nonce_error_message(str(error))
+
+
+def is_nonce_error_message(message: str) -> bool:
+    """ is_nonce_error for an error message, e.g. of a JSON-RPC error response. """
+    message = message.lower()
+    return any(marker in message for marker in NONCE_ERROR_MARKERS)
+
+
+def is_already_known(error: Exception) -> bool:
+    """ Return True if a send error means the transaction was already broadcast, i.e. the send succeeded. """
+    return is_already_known_message(str(error))
+
+
+def is_already_known_message(message: str) -> bool:
+    """ is_already_known for an error message, e.g. of a JSON-RPC error response. """
+    message = message.lower()
+    return any(marker in message for marker in ALREADY_KNOWN_MARKERS)
+
+
+class NonceManager:
+    """ Thread-safe local nonce allocator for a single sending account.
+
+    Nonces are handed out from a local counter so several transactions can be signed and
+    broadcast without waiting for the node, and the counter is resynced from the node's
+    pending transaction count whenever a send reports a nonce conflict.
+    """
+
+    def __init__(self, web3, account_address: str):
+        self.web3 = web3
+        self.account_address = account_address
+        self._lock = threading.Lock()
+        self._next_nonce: Optional[int] = None
+        self._in_flight: Dict[int, str] = {}
+
+    def allocate(self) -> int:
+        """ Reserve the next nonce, syncing from the node on first use. """
+        with self._lock:
+            if self._next_nonce is None:
+                self._next_nonce = self._fetch_pending_count()
+            nonce = self._next_nonce
+            self._next_nonce += 1
+            return nonce
+
+    def peek(self) -> int:
+        """ The nonce the next allocate() will return, without reserving it. """
+        with self._lock:
+            if self._next_nonce is None:
+                self._next_nonce = self._fetch_pending_count()
+            return self._next_nonce
+
+    def confirm(self, nonce: int, tx_hash: str):
+        """ Record that a transaction using the nonce was accepted by the node. """
+        with self._lock:
+            self._in_flight[nonce] = tx_hash
+
+    def release(self, nonce: int):
+        """ Give back a nonce whose transaction never reached the node.
+
+        The most recently allocated nonce is simply reused; releasing an older one would
+        leave a gap, so the next allocation resyncs from the node instead.
+        """
+        with self._lock:
+            if self._next_nonce is not None and nonce == self._next_nonce - 1:
+                self._next_nonce = nonce
+            else:
+                self._next_nonce = None
+
+    def resync(self):
+        """ Reload the next nonce from the node and drop transactions it has already mined. """
+        with self._lock:
+            mined = self.web3.eth.get_transaction_count(self.account_address, "latest")
+            self._next_nonce = self._fetch_pending_count()
+            self._in_flight = {n: h for n, h in self._in_flight.items() if n >= mined}
+            logger.info(f"Nonce resync for {self.account_address}: next={self._next_nonce}, in flight={len(self._in_flight)}")
+
+    def in_flight(self) -> Dict[int, str]:
+        """ Snapshot of broadcast transactions by nonce that have not been pruned by a resync. """
+        with self._lock:
+            return dict(self._in_flight)
+
+    def _fetch_pending_count(self) -> int:
+        return self.web3.eth.get_transaction_count(self.account_address, "pending")
+
+
+class AsyncNonceManager:
+    """ asyncio counterpart of NonceManager for use with AsyncWeb3. """
+
+    def __init__(self, web3, account_address: str):
+        self.web3 = web3
+        self.account_address = account_address
+        self._lock = asyncio.Lock()
+        self._next_nonce: Optional[int] = None
+        self._in_flight: Dict[int, str] = {}
+
+    async def allocate(self) -> int:
+        """ Reserve the next nonce, syncing from the node on first use. """
+        async with self._lock:
+            if self._next_nonce is None:
+                self._next_nonce = await self.web3.eth.get_transaction_count(self.account_address, "pending")
+            nonce = self._next_nonce
+            self._next_nonce += 1
+            return nonce
+
+    async def peek(self) -> int:
+        """ The nonce the next allocate() will return, without reserving it. """
+        async with self._lock:
+            if self._next_nonce is None:
+                self._next_nonce = await self.web3.eth.get_transaction_count(self.account_address, "pending")
+            return self._next_nonce
+
+    def confirm(self, nonce: int, tx_hash: str):
+        """ Record that a transaction using the nonce was accepted by the node. """
+        self._in_flight[nonce] = tx_hash
+
+    def release(self, nonce: int):
+        """ Give back a nonce whose transaction never reached the node. """
+        if self._next_nonce is not None and nonce == self._next_nonce - 1:
+            self._next_nonce = nonce
+        else:
+            self._next_nonce = None
+
+    async def resync(self):
+        """ Reload the next nonce from the node and drop transactions it has already mined. """
+        async with self._lock:
+            mined = await self.web3.eth.get_transaction_count(self.account_address, "latest")
+            self._next_nonce = await self.web3.eth.get_transaction_count(self.account_address, "pending")
+            self._in_flight = {n: h for n, h in self._in_flight.items() if n >= mined}
+            logger.info(f"Nonce resync for {self.account_address}: next={self._next_nonce}, in flight={len(self._in_flight)}")
+
+    def in_flight(self) -> Dict[int, str]:
+        """ Snapshot of broadcast transactions by nonce that have not been pruned by a resync. """
+        return dict(self._in_flight)
@@ -0,0 +1,202 @@
+import heapq
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from orders import Order
+from pools import PoolData
+
+BID = "LONG"
+ASK = "SHORT"
+# Stale entries a heap may carry beyond its live ones before it is rebuilt.
+HEAP_SLACK = 64
+
+
+def _utc(value: datetime) -> datetime:
+    """ value as an aware datetime; naive values are local time, as datetime.timestamp() takes them. """
+    return value if value.tzinfo is not None else value.astimezone(timezone.utc)
+
+
+class PriceLevel:
+    """ Aggregated remaining size (kB) of the orders resting at one price (sat/kB). """
+
+    __slots__ = ("price", "size", "orders")
+
+    def __init__(self, price: Decimal):
+        self.price = price
+        self.size = Decimal(0)
+        self.orders: Dict[str, Decimal] = {}
+
+    def __repr__(self) -> str:
+        return f"PriceLevel(price={self.price}, size={self.size}, orders={len(self.orders)})"
+
+
+class OrderBook:
+    """ Price-level order book for one pool.
+
+    LONG orders are bids and SHORT orders are asks. Orders are indexed by order_hash, each side
+    keeps its distinct prices in a heap (best first, emptied levels deleted lazily) so levels are
+    added and removed in O(log n) and the best bid and offer are read in amortized O(1), and expiries
+    sit in a heap so stale orders are pruned without scanning the book. Both heaps are rebuilt once
+    their stale entries outnumber the live ones. Sizes are the unfilled part of each order, i.e.
+    size * (1 - fraction_filled).
+    """
+
+    def __init__(self, pool_data: PoolData):
+        self.pool_data = pool_data
+        self._orders: Dict[str, Tuple[Order, Decimal, Decimal]] = {}
+        self._levels: Dict[str, Dict[Decimal, PriceLevel]] = {BID: {}, ASK: {}}
+        # Heap keys are prices for asks and negated prices for bids, so heap[0] is the best price.
+        self._prices: Dict[str, List[Decimal]] = {BID: [], ASK: []}
+        self._heaped: Dict[str, Set[Decimal]] = {BID: set(), ASK: set()}
+        self._expiries: List[Tuple[datetime, str]] = []
+
+    def __len__(self) -> int:
+        return len(self._orders)
+
+    def __contains__(self, order_hash: str) -> bool:
+        return order_hash in self._orders
+
+    def get(self, order_hash: str) -> Optional[Order]:
+        entry = self._orders.get(order_hash)
+        return entry[0] if entry else None
+
+    def add(self, order: Order, now: Optional[datetime] = None) -> bool:
+        """ Insert or replace an order. Filled and expired orders are dropped; returns whether it rests. """
+        self.remove(order.order_hash)
+        now = _utc(now) if now else datetime.now(timezone.utc)
+        expiry = _utc(order.expiry)
+        if order.fraction_filled >= 1 or expiry <= now or order.direction not in self._levels:
+            return False
+
+        price, size = order.to_price_and_size(self.pool_data)
+        remaining = size * (1 - order.fraction_filled)
+        side = order.direction
+        level = self._levels[side].get(price)
+        if level is None:
+            level = self._levels[side][price] = PriceLevel(price)
+            key = price.copy_negate() if side == BID else price
+            if key not in self._heaped[side]:
+                self._heaped[side].add(key)
+                heapq.heappush(self._prices[side], key)
+        level.orders[order.order_hash] = remaining
+        level.size += remaining
+        self._orders[order.order_hash] = (order, price, remaining)
+        heapq.heappush(self._expiries, (expiry, order.order_hash))
+        if len(self._expiries) > 2 * len(self._orders) + HEAP_SLACK:
+            self._expiries = [(_utc(o.expiry), h) for h, (o, _, _) in self._orders.items()]
+            heapq.heapify(self._expiries)
+        return True
+
+    def remove(self, order_hash: str) -> Optional[Order]:
+        entry = self._orders.pop(order_hash, None)
+        if entry is None:
+            return None
+        order, price, remaining = entry
+        side = order.direction
+        level = self._levels[side][price]
+        del level.orders[order_hash]
+        level.size -= remaining
+        if not level.orders:
+            del self._levels[side][price]
+            if len(self._prices[side]) > 2 * len(self._levels[side]) + HEAP_SLACK:
+                keys = [-p for p in self._levels[side]] if side == BID else list(self._levels[side])
+                heapq.heapify(keys)
+                self._prices[side] = keys
+                self._heaped[side] = set(keys)
+        return order
+
+    def prune(self, now: Optional[datetime] = None) -> List[Order]:
+        """ Remove every order that expired at or before now. """
+        now = _utc(now) if now else datetime.now(timezone.utc)
+        pruned = []
+        while self._expiries and self._expiries[0][0] <= now:
+            expiry, order_hash = heapq.heappop(self._expiries)
+            entry = self._orders.get(order_hash)
+            # Skip heap entries left behind by orders that were removed or re-added.
+            if entry is not None and _utc(entry[0].expiry) == expiry:
+                pruned.append(self.remove(order_hash))
+        return pruned
+
+    def apply_snapshot(self, orders: Iterable[Order], now: Optional[datetime] = None) -> Dict[str, int]:
+        """ Bring the book in line with a fresh orders query result, touching only what changed. """
+        now = now or datetime.now(timezone.utc)
+        seen = set()
+        added = updated = removed = expired = 0
+        for order in orders:
+            seen.add(order.order_hash)
+            entry = self._orders.get(order.order_hash)
+            if entry is not None and entry[0].fraction_filled == order.fraction_filled:
+                continue
+            if order.fraction_filled >= 1:
+                if entry is not None:
+                    self.remove(order.order_hash)
+                    removed += 1
+                continue
+            if self.add(order, now):
+                if entry is None:
+                    added += 1
+                else:
+                    updated += 1
+            elif entry is not None:
+                # add() dropped the resting copy because the order has expired since
+                expired += 1
+        for order_hash in [h for h in self._orders if h not in seen]:
+            self.remove(order_hash)
+            removed += 1
+        expired += len(self.prune(now))
+        return {"added": added, "updated": updated, "removed": removed, "expired": expired}
+
+    def _best(self, side: str) -> Optional[PriceLevel]:
+        """ The best level of a side, popping the heap entries of emptied levels on top of it. """
+        keys = self._prices[side]
+        side_levels = self._levels[side]
+        while keys:
+            level = side_levels.get(keys[0].copy_negate() if side == BID else keys[0])
+            if level is not None:
+                return level
+            self._heaped[side].discard(heapq.heappop(keys))
+        return None
+
+    def best_bid(self) -> Optional[PriceLevel]:
+        return self._best(BID)
+
+    def best_ask(self) -> Optional[PriceLevel]:
+        return self._best(ASK)
+
+    def depth(self, side: str, levels: Optional[int] = None) -> List[PriceLevel]:
+        """ Price levels of one side from best to worst, optionally limited to the first levels. """
+        side_levels = self._levels[side]
+        if levels is None:
+            prices = sorted(side_levels, reverse=side == BID)
+        elif side == BID:
+            prices = heapq.nlargest(levels, side_levels)
+        else:
+            prices = heapq.nsmallest(levels, side_levels)
+        return [side_levels[price] for price in prices]
+
+
+class OrderBooks:
+    """ One OrderBook per pool_id, fed from orders query results. """
+
+    def __init__(self, pools: Iterable[PoolData] = ()):
+        self.books: Dict[str, OrderBook] = {pool.id: OrderBook(pool) for pool in pools}
+
+    def add_pool(self, pool_data: PoolData) -> OrderBook:
+        book = self.books.get(pool_data.id)
+        if book is None:
+            book = self.books[pool_data.id] = OrderBook(pool_data)
+        else:
+            book.pool_data = pool_data
+        return book
+
+    def __getitem__(self, pool_id: str) -> OrderBook:
+        return self.books[pool_id]
+
+    def apply_snapshot(self, orders: Iterable[Order], now: Optional[datetime] = None) -> Dict[str, Dict[str, int]]:
+        """ Route a full orders snapshot to the books of known pools; orders of unknown pools are ignored. """
+        by_pool: Dict[str, List[Order]] = {pool_id: [] for pool_id in self.books}
+        for order in orders:
+            if order.pool_id in by_pool:
+                by_pool[order.pool_id].append(order)
+        return {pool_id: self.books[pool_id].apply_snapshot(pool_orders, now) for pool_id, pool_orders in by_pool.items()}
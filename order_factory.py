@@ -0,0 +1,164 @@
+import uuid
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from loguru import logger
+
+from config import Config
+from eip712 import get_order_hasher, sign_digest
+from metrics import timed
+from orders import Order
+from pools import PoolData
+from signing import OrderSigner
+
+ACCOUNT = Config.get_str("ACCOUNT", "0x985aA7045Fd77F5CCE7FE288264E620FB29fbb03")
+PRIVATE_KEY = Config.get_str("PRIVATE_KEY")
+CONTRACT_ADDRESS = Config.get_str("CONTRACT_ADDRESS", "0x71486c325a1dfd990a3a21d8debe82d1d4ed3c88")
+CHAIN_ID = 11155111
+# Token of the side of an order that neither offers nor requests upfront tokens.
+ZERO_ADDRESS = "0x0000000000000000000000000000000000000000"
+
+# OrderSigner for PRIVATE_KEY used by create_orders calls without a signer; see default_signer().
+_default_signer: Optional[OrderSigner] = None
+
+def is_supported_chain_id(chain_id):
+    return chain_id in {11155111, 1}
+
+@timed("hash_order")
+def hash_order(pool, order, verifying_contract: str = CONTRACT_ADDRESS):
+    if not is_supported_chain_id(order["chainId"]):
+        raise ValueError(f"Chain ID {order['chainId']} is not supported.")
+    hasher = get_order_hasher(order["chainId"], verifying_contract)
+    return "0x" + hasher.hash_order(pool, order).hex()
+
+@timed("sign")
+def generate_signature(order_hash, private_key):
+    logger.debug(order_hash)
+    return sign_digest(bytes.fromhex(order_hash[2:]), private_key)
+
+
+def build_order(
+    pool_data: PoolData,
+    price: Decimal,
+    size: Decimal,
+    direction: str,
+    expiry: datetime,
+    maker: Optional[str] = None,
+    chain_id: int = CHAIN_ID,
+    verifying_contract: str = CONTRACT_ADDRESS,
+) -> Order:
+    """ Build an unsigned order for maker (ACCOUNT if omitted) with its EIP-712 digest on chain_id and
+    verifying_contract as order_hash. A naive expiry is taken as local time, as datetime.timestamp()
+    does; the order keeps it as an aware UTC datetime. """
+    order_id = str(uuid.uuid4())
+    expiry = expiry.astimezone(timezone.utc)
+    # Calculate the requested and offered amounts based on direction
+    requested_upfront_token=None
+    offered_upfront_token=None
+    if direction == "LONG":
+        offered_upfront_token = pool_data.payout_token
+    elif direction == "SHORT":
+        requested_upfront_token = pool_data.payout_token
+    else:
+        raise ValueError("Direction must be either 'LONG' or 'SHORT'")
+
+    # Create the Order object
+    new_order = Order(
+        id=order_id,
+        order_hash=None,
+        expiry=expiry,
+        pool_id=pool_data.id,
+        maker=maker or ACCOUNT,
+        direction=direction,
+        signature=None,
+        requested_long_shares=None,
+        offered_long_shares=None,
+        offered_upfront_token=offered_upfront_token,
+        requested_upfront_token=requested_upfront_token,
+        requested_upfront_amount=None,
+        offered_upfront_amount=None,
+        fraction_filled=Decimal("0")
+    )
+    new_order.from_price_and_size(price, size, pool_data)
+    new_order.order_hash = hash_order(pool_data, generate_order_payload_for_hash(new_order, chain_id), verifying_contract)
+    return new_order
+
+@timed("create_order")
+async def create_order(
+    pool_data: PoolData,
+    price: Decimal,
+    size: Decimal,
+    direction: str,
+    expiry: datetime
+) -> Order:
+    new_order = build_order(pool_data, price, size, direction, expiry)
+    new_order.signature = generate_signature(new_order.order_hash, PRIVATE_KEY)
+
+    return new_order
+
+def default_signer() -> OrderSigner:
+    """ The process pool signer for PRIVATE_KEY, started on first use and reused afterwards. """
+    global _default_signer
+    if _default_signer is None:
+        _default_signer = OrderSigner(PRIVATE_KEY)
+    return _default_signer
+
+@timed("create_orders")
+async def create_orders(
+    pool_data: PoolData,
+    levels: Sequence[Tuple[Decimal, Decimal, str, datetime]],
+    signer: Optional[OrderSigner] = None,
+    maker: Optional[str] = None,
+) -> List[Order]:
+    """ Create and sign a ladder of orders for one pool.
+
+    Args:
+        pool_data (PoolData): The pool every level is quoted on.
+        levels (list): (price, size, direction, expiry) tuples.
+        signer (OrderSigner): Process pool signer to use; default_signer() if omitted.
+        maker (str): Maker address of the orders, which signer's key must control; ACCOUNT if omitted.
+
+    Returns:
+        list: Signed orders in the same order as levels.
+    """
+    orders = [
+        build_order(pool_data, price, size, direction, expiry, maker) for price, size, direction, expiry in levels
+    ]
+    digests = [bytes.fromhex(order.order_hash[2:]) for order in orders]
+    signatures = await (signer or default_signer()).sign_digests_async(digests)
+    for order, signature in zip(orders, signatures):
+        order.signature = signature
+    return orders
+
+def generate_order_payload_for_hash(order: Order, chain_id: int = CHAIN_ID) -> Dict[str, Any]:
+    return {
+        "maker": order.maker,
+        "expiry": order.expiry.timestamp(),
+        "offeredUpfrontToken": order.offered_upfront_token or ZERO_ADDRESS,
+        "offeredUpfrontAmount": str(order.offered_upfront_amount or 0),
+        "offeredLongShares": str(order.offered_long_shares or 0),
+        "requestedUpfrontToken": order.requested_upfront_token or ZERO_ADDRESS,
+        "requestedUpfrontAmount": str(order.requested_upfront_amount or 0),
+        "requestedLongShares": str(order.requested_long_shares or 0),
+        "signature": order.signature,
+        "chainId": chain_id,
+        "direction": order.direction,
+        "poolId": order.pool_id,
+    }
+
+def generate_order_payload(order: Order, chain_id: int = CHAIN_ID) -> Dict[str, Any]:
+    return {
+        "maker": order.maker,
+        "expiry": order.expiry.isoformat(),
+        "offeredUpfrontToken": order.offered_upfront_token or ZERO_ADDRESS,
+        "offeredUpfrontAmount": str(order.offered_upfront_amount or 0),
+        "offeredLongShares": str(order.offered_long_shares or 0),
+        "requestedUpfrontToken": order.requested_upfront_token or ZERO_ADDRESS,
+        "requestedUpfrontAmount": str(order.requested_upfront_amount or 0),
+        "requestedLongShares": str(order.requested_long_shares or 0),
+        "signature": order.signature,
+        "chainId": chain_id,
+        "direction": order.direction,
+        "poolId": order.pool_id,
+    }
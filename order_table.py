@@ -0,0 +1,211 @@
+from array import array
+from datetime import datetime, timedelta, timezone
+from decimal import ROUND_DOWN, Decimal
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+from fixed_point import from_fixed, to_fixed
+from orders import Order
+from pools import PoolData
+from utils import to_price_and_size_batch
+
+# Sentinel stored in integer columns for missing (None) values.
+NULL = -1
+# fraction_filled is stored as an integer scaled by 10**18, like the contract's fractions.
+FRACTION_DECIMALS = 18
+DIRECTIONS = ("LONG", "SHORT")
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MILLISECOND = timedelta(milliseconds=1)
+
+IntColumn = Union[array, List[Optional[int]]]
+
+
+def _append_int(column: IntColumn, value: Optional[int]) -> IntColumn:
+    """ Append to an int64 column, widening it to a Python list if a value does not fit. """
+    if isinstance(column, list):
+        column.append(value)
+        return column
+    try:
+        column.append(NULL if value is None else value)
+    except OverflowError:
+        column = [None if v == NULL else v for v in column]
+        column.append(value)
+    return column
+
+
+def _read_int(column: IntColumn, i: int) -> Optional[int]:
+    value = column[i]
+    if isinstance(column, list):
+        return value
+    return None if value == NULL else value
+
+
+def _as_numpy(column: IntColumn) -> np.ndarray:
+    """ Zero-copy view of an int64 column; widened columns become object arrays with None as 0. """
+    if isinstance(column, list):
+        return np.array([v or 0 for v in column], dtype=object)
+    return np.frombuffer(column, dtype=np.int64) if len(column) else np.zeros(0, dtype=np.int64)
+
+
+def _to_int(value) -> Optional[int]:
+    return None if value is None else int(value)
+
+
+def _epoch_ms(value: datetime) -> int:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return (value - EPOCH) // MILLISECOND
+
+
+class OrderTable:
+    """ Columnar store for many orders.
+
+    Share and amount fields live in int64 arrays (widened to lists only if a value overflows),
+    expiries as epoch milliseconds, fraction_filled scaled by 10**FRACTION_DECIMALS and direction as a
+    byte. Rows are read back through OrderView objects, which expose the Order attributes without
+    copying the row.
+    """
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self.order_hashes: List[str] = []
+        self.pool_ids: List[str] = []
+        self.makers: List[str] = []
+        self.signatures: List[str] = []
+        self.offered_upfront_tokens: List[Optional[str]] = []
+        self.requested_upfront_tokens: List[Optional[str]] = []
+        self.pool_codes = array("i")
+        self._pool_code_by_id = {}
+        self.directions = array("b")
+        self.expiries = array("q")
+        self.fractions_filled = array("q")
+        self.requested_long_shares: IntColumn = array("q")
+        self.offered_long_shares: IntColumn = array("q")
+        self.requested_upfront_amount: IntColumn = array("q")
+        self.offered_upfront_amount: IntColumn = array("q")
+
+    @classmethod
+    def from_orders(cls, orders: Iterable[Order]) -> "OrderTable":
+        table = cls()
+        for order in orders:
+            table.append(order)
+        return table
+
+    def append(self, order: Order) -> int:
+        """ Add an order and return its row index. """
+        self.ids.append(order.id)
+        self.order_hashes.append(order.order_hash)
+        self.pool_ids.append(order.pool_id)
+        self.pool_codes.append(self.pool_code(order.pool_id))
+        self.makers.append(order.maker)
+        self.signatures.append(order.signature)
+        self.offered_upfront_tokens.append(order.offered_upfront_token)
+        self.requested_upfront_tokens.append(order.requested_upfront_token)
+        self.directions.append(DIRECTIONS.index(order.direction))
+        self.expiries.append(_epoch_ms(order.expiry))
+        fraction_filled = order.fraction_filled
+        self.fractions_filled.append(to_fixed(fraction_filled, FRACTION_DECIMALS, ROUND_DOWN) if fraction_filled else 0)
+        self.requested_long_shares = _append_int(self.requested_long_shares, _to_int(order.requested_long_shares))
+        self.offered_long_shares = _append_int(self.offered_long_shares, _to_int(order.offered_long_shares))
+        self.requested_upfront_amount = _append_int(self.requested_upfront_amount, _to_int(order.requested_upfront_amount))
+        self.offered_upfront_amount = _append_int(self.offered_upfront_amount, _to_int(order.offered_upfront_amount))
+        return len(self.ids) - 1
+
+    def pool_code(self, pool_id: str) -> int:
+        """ Small integer code of a pool_id, assigned on first use. """
+        return self._pool_code_by_id.setdefault(pool_id, len(self._pool_code_by_id))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __getitem__(self, i: int) -> "OrderView":
+        if not -len(self.ids) <= i < len(self.ids):
+            raise IndexError(i)
+        return OrderView(self, i % len(self.ids))
+
+    def __iter__(self) -> Iterator["OrderView"]:
+        for i in range(len(self.ids)):
+            yield OrderView(self, i)
+
+    def to_order(self, i: int) -> Order:
+        return self[i].to_order()
+
+    def price_and_size(self, pool_data: PoolData) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """ Vectorized to_price_and_size for every row of one pool.
+
+        Returns:
+            tuple: (row indices, price in sat/kB, size in kB) arrays.
+        """
+        code = self._pool_code_by_id.get(pool_data.id)
+        if code is None:
+            empty = np.zeros(0)
+            return np.zeros(0, dtype=np.int64), empty, empty
+        rows = np.flatnonzero(np.frombuffer(self.pool_codes, dtype=np.int32) == code)
+        is_long = np.frombuffer(self.directions, dtype=np.int8)[rows] == 0
+        shares = np.where(
+            is_long, _as_numpy(self.requested_long_shares)[rows], _as_numpy(self.offered_long_shares)[rows]
+        )
+        amounts = np.where(
+            is_long, _as_numpy(self.offered_upfront_amount)[rows], _as_numpy(self.requested_upfront_amount)[rows]
+        )
+        # Missing values are stored as NULL (-1); the matching side of a row is always populated.
+        shares = np.where(shares == NULL, 0, shares)
+        amounts = np.where(amounts == NULL, 0, amounts)
+        prices, sizes = to_price_and_size_batch(shares, amounts, pool_data.num_blocks)
+        return rows, prices, sizes
+
+
+class OrderView:
+    """ Read-only row of an OrderTable with the same attributes as Order. """
+
+    __slots__ = ("table", "row")
+
+    def __init__(self, table: OrderTable, row: int):
+        self.table = table
+        self.row = row
+
+    id = property(lambda self: self.table.ids[self.row])
+    order_hash = property(lambda self: self.table.order_hashes[self.row])
+    pool_id = property(lambda self: self.table.pool_ids[self.row])
+    maker = property(lambda self: self.table.makers[self.row])
+    signature = property(lambda self: self.table.signatures[self.row])
+    offered_upfront_token = property(lambda self: self.table.offered_upfront_tokens[self.row])
+    requested_upfront_token = property(lambda self: self.table.requested_upfront_tokens[self.row])
+    direction = property(lambda self: DIRECTIONS[self.table.directions[self.row]])
+
+    @property
+    def expiry(self) -> datetime:
+        return EPOCH + self.table.expiries[self.row] * MILLISECOND
+
+    @property
+    def fraction_filled(self) -> Decimal:
+        return from_fixed(self.table.fractions_filled[self.row], FRACTION_DECIMALS)
+
+    requested_long_shares = property(lambda self: _read_int(self.table.requested_long_shares, self.row))
+    offered_long_shares = property(lambda self: _read_int(self.table.offered_long_shares, self.row))
+    requested_upfront_amount = property(lambda self: _read_int(self.table.requested_upfront_amount, self.row))
+    offered_upfront_amount = property(lambda self: _read_int(self.table.offered_upfront_amount, self.row))
+
+    to_price_and_size = Order.to_price_and_size
+
+    def to_order(self) -> Order:
+        return Order(
+            self.id,
+            self.order_hash,
+            self.expiry,
+            self.pool_id,
+            self.maker,
+            self.direction,
+            self.signature,
+            self.requested_long_shares,
+            self.offered_long_shares,
+            self.offered_upfront_token,
+            self.requested_upfront_token,
+            self.requested_upfront_amount,
+            self.offered_upfront_amount,
+            self.fraction_filled,
+        )
+
+    def __repr__(self) -> str:
+        return f"OrderView(row={self.row}, order_hash={self.order_hash})"
@@ -5,12 +5,28 @@ from typing import Any, Dict, Optional, Tuple
 from loguru import logger
 
 from pools import PoolData
-from utils import shares_to_size_kb, size_kb_to_shares
-
-
+from utils import price_for, shares_to_size_kb_for_blocks, size_kb_to_shares_for_blocks, upfront_amount_for
 
 
 class Order:
+    __slots__ = (
+        "id",
+        "order_hash",
+        "expiry",
+        "pool_id",
+        "maker",
+        "direction",
+        "signature",
+        "requested_long_shares",
+        "offered_long_shares",
+        "offered_upfront_token",
+        "requested_upfront_token",
+        "requested_upfront_amount",
+        "offered_upfront_amount",
+        "fraction_filled",
+        "signature_valid",
+    )
+
     def __init__(
         self,
         id: str,
@@ -20,13 +36,14 @@ class Order:
         maker: str,
         direction: str,
         signature: str,
-        requested_long_shares: Optional[Decimal],
-        offered_long_shares: Optional[Decimal],
+        requested_long_shares: Optional[int],
+        offered_long_shares: Optional[int],
         offered_upfront_token: Optional[str],
         requested_upfront_token: Optional[str],
-        requested_upfront_amount: Optional[Decimal],
-        offered_upfront_amount: Optional[Decimal],
+        requested_upfront_amount: Optional[int],
+        offered_upfront_amount: Optional[int],
         fraction_filled: Decimal,
+        signature_valid: Optional[bool] = None,
     ):
         self.id = id
         self.order_hash = order_hash
@@ -42,6 +59,8 @@ class Order:
         self.requested_upfront_amount = requested_upfront_amount
         self.offered_upfront_amount = offered_upfront_amount
         self.fraction_filled = fraction_filled
+        # Set by verifier.OrderVerifier: whether the maker's signature checked out, None until verified.
+        self.signature_valid = signature_valid
 
     @classmethod
     def from_json(cls, data: Dict[str, Any]) -> "Order":
@@ -55,24 +74,24 @@ class Order:
             signature = data["signature"]
 
             requested_long_shares = (
-                Decimal(data["requestedLongShares"])
+                int(data["requestedLongShares"])
                 if data["requestedLongShares"]
                 else None
             )
             offered_long_shares = (
-                Decimal(data["offeredLongShares"])
+                int(data["offeredLongShares"])
                 if data["offeredLongShares"]
                 else None
             )
             offered_upfront_token = data["offeredUpfrontToken"]
             requested_upfront_token = data["requestedUpfrontToken"]
             requested_upfront_amount = (
-                Decimal(data["requestedUpfrontAmount"])
+                int(data["requestedUpfrontAmount"])
                 if data["requestedUpfrontAmount"]
                 else None
             )
             offered_upfront_amount = (
-                Decimal(data["offeredUpfrontAmount"])
+                int(data["offeredUpfrontAmount"])
                 if data["offeredUpfrontAmount"]
                 else None
             )
@@ -166,23 +185,22 @@ class Order:
         price will be defined as sat/kb
         size will be defined as kb
         """
-        price = None
-        size = None
+        shares = None
+        upfront_amount = None
 
         if self.direction == "LONG":
-            size = Decimal(str(self.requested_long_shares))
-            price = Decimal(str(self.offered_upfront_amount))
+            shares = self.requested_long_shares
+            upfront_amount = self.offered_upfront_amount
 
         elif self.direction == "SHORT":
-            size = Decimal(str(self.offered_long_shares))
-            price = Decimal(str(self.requested_upfront_amount))
+            shares = self.offered_long_shares
+            upfront_amount = self.requested_upfront_amount
 
-        start = pool_data.target_start_timestamp
-        end = pool_data.target_end_timestamp
+        num_blocks = pool_data.num_blocks
         # convert size from shares to kb
-        size_kb = shares_to_size_kb(size, start, end)
+        size_kb = shares_to_size_kb_for_blocks(shares, num_blocks)
         # convert price to sat / kb
-        price_satPkb = price / size_kb
+        price_satPkb = price_for(upfront_amount, shares, num_blocks)
 
         return price_satPkb, size_kb
     
@@ -205,11 +223,8 @@ class Order:
         }
     
     def from_price_and_size(self, price: Decimal, size: Decimal, pool_data: PoolData):
-        start = pool_data.target_start_timestamp
-        end = pool_data.target_end_timestamp
-
-        size_shares = size_kb_to_shares(size, start, end)
-        up_front_amount = price * size
+        size_shares = size_kb_to_shares_for_blocks(size, pool_data.num_blocks)
+        up_front_amount = upfront_amount_for(price, size)
 
         if self.direction == "LONG":
             self.requested_long_shares = size_shares
@@ -1,7 +1,28 @@
 from datetime import datetime
 from typing import Optional, Dict, Any
 
+from utils import num_blocks_between
+
 class PoolData:
+    __slots__ = (
+        "id",
+        "pool_hash",
+        "index",
+        "index_name",
+        "cap",
+        "floor",
+        "payout_token",
+        "target_end_timestamp",
+        "target_start_timestamp",
+        "total_upfront_payment",
+        "actual_end_timestamp",
+        "balance_change_per_share",
+        "collateral_minted",
+        "shares_minted",
+        "total_minted",
+        "_num_blocks",
+    )
+
     def __init__(
         self,
         id: str,
@@ -35,6 +56,14 @@ class PoolData:
         self.collateral_minted = collateral_minted
         self.shares_minted = shares_minted
         self.total_minted = total_minted
+        self._num_blocks = None
+
+    @property
+    def num_blocks(self) -> int:
+        """ Number of blocks between the target start and end timestamps, computed once per pool. """
+        if self._num_blocks is None:
+            self._num_blocks = num_blocks_between(self.target_start_timestamp, self.target_end_timestamp)
+        return self._num_blocks
 
     @classmethod
     def from_json(cls, data: Dict[str, Any]) -> "PoolData":
@@ -0,0 +1,217 @@
+import asyncio
+import itertools
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import aiohttp
+from eth_abi import decode
+from eth_utils import function_signature_to_4byte_selector, to_checksum_address
+from loguru import logger
+from web3 import Web3
+
+from async_contract_calls import create_rpc_session
+from batch_reader import BATCH_CONCURRENCY, MAX_BATCH_SIZE, RPC_HEADERS, _abi_type
+from calldata import CalldataEncoder
+from contract_calls import INVALID_SIGNATURE, OrderParamsConverter
+from fee_engine import GAS_ESTIMATE_MARGIN
+
+# Block tag the simulations run against.
+SIMULATION_BLOCK = "pending"
+
+# Revert payloads of require(..., "reason") and of compiler-inserted checks.
+ERROR_STRING = ("Error", ("string",), ("reason",))
+PANIC = ("Panic", ("uint256",), ("code",))
+
+
+class RevertReason:
+    """ A decoded revert: the error name from the ABI and its named arguments. """
+
+    __slots__ = ("name", "args", "data")
+
+    def __init__(self, name: str, args: Dict[str, Any], data: bytes = b""):
+        self.name = name
+        self.args = args
+        self.data = data
+
+    def __str__(self) -> str:
+        args = ", ".join(f"{key}={'0x' + value.hex() if isinstance(value, bytes) else value}" for key, value in self.args.items())
+        return f"{self.name}({args})"
+
+    def __repr__(self) -> str:
+        return f"RevertReason({self})"
+
+
+class ErrorDecoder:
+    """ Decodes revert data into RevertReason using the custom errors of the ABI. """
+
+    def __init__(self, abi: Sequence[Dict[str, Any]]):
+        self.errors: Dict[bytes, Tuple[str, Tuple[str, ...], Tuple[str, ...]]] = {}
+        for name, types, names in (ERROR_STRING, PANIC):
+            self.errors[function_signature_to_4byte_selector(f"{name}({','.join(types)})")] = (name, types, names)
+        for entry in abi:
+            if entry.get("type") == "error":
+                types = tuple(_abi_type(p) for p in entry["inputs"])
+                names = tuple(p["name"] for p in entry["inputs"])
+                selector = function_signature_to_4byte_selector(f"{entry['name']}({','.join(types)})")
+                self.errors[selector] = (entry["name"], types, names)
+
+    def decode(self, data: Union[bytes, str, None]) -> RevertReason:
+        if isinstance(data, str):
+            data = bytes.fromhex(data[2:] if data.startswith("0x") else data)
+        if not data:
+            return RevertReason("Revert", {}, b"")
+        entry = self.errors.get(data[:4])
+        if entry is None:
+            return RevertReason("UnknownError", {"selector": data[:4]}, data)
+        name, types, names = entry
+        try:
+            values = decode(list(types), data[4:])
+        except Exception:
+            return RevertReason(name, {}, data)
+        return RevertReason(name, dict(zip(names, values)), data)
+
+
+def revert_data(error: Dict[str, Any]) -> Optional[str]:
+    """ Revert data of a JSON-RPC error object; nodes put it in error.data as a string or a nested object. """
+    data = error.get("data")
+    while isinstance(data, dict):
+        data = data.get("data") or data.get("result")
+    return data if isinstance(data, str) and data.startswith("0x") else None
+
+
+class Simulation:
+    """ Pre-flight result of one call: the gas limit to send it with, or why it would revert. """
+
+    __slots__ = ("index", "gas", "error")
+
+    def __init__(self, index: int, gas: Optional[int] = None, error: Optional[RevertReason] = None):
+        self.index = index
+        self.gas = gas
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def __repr__(self) -> str:
+        return f"Simulation(index={self.index}, gas={self.gas}, error={self.error})"
+
+
+class Preflight:
+    """ Simulates contract calls from the sending account at the pending block before they are sent.
+
+    Every call is estimated with eth_estimateGas in JSON-RPC batches sent concurrently. Calls that
+    fail are re-run with eth_call when the node left the revert data out of the estimate error, and
+    the revert data is decoded with the ABI's custom errors, so stale orders (expired, filled,
+    cancelled, bad signature) are dropped before they cost gas and a nonce.
+    """
+
+    def __init__(
+        self,
+        http_url: str,
+        contract,
+        account_address: str,
+        session: Optional[aiohttp.ClientSession] = None,
+        block: str = SIMULATION_BLOCK,
+        gas_margin: float = GAS_ESTIMATE_MARGIN,
+    ):
+        self.http_url = http_url
+        self.contract = contract
+        self.account_address = to_checksum_address(account_address)
+        self._owns_session = session is None
+        self.session = session or create_rpc_session()
+        self.block = block
+        self.gas_margin = gas_margin
+        self.errors = ErrorDecoder(contract.abi)
+        self.calldata = CalldataEncoder(contract.abi)
+        self._ids = itertools.count()
+
+    async def close(self):
+        if self._owns_session:
+            await self.session.close()
+
+    async def _batch(self, method: str, calldata: List[str]) -> List[Dict[str, Any]]:
+        """ One JSON-RPC batch of method calls to the contract; the raw responses in input order. """
+        ids = [next(self._ids) for _ in calldata]
+        payload = [
+            {
+                "jsonrpc": "2.0",
+                "id": i,
+                "method": method,
+                "params": [{"from": self.account_address, "to": self.contract.address, "data": data}, self.block],
+            }
+            for i, data in zip(ids, calldata)
+        ]
+        async with self.session.post(self.http_url, json=payload, headers=RPC_HEADERS) as response:
+            response.raise_for_status()
+            responses = await response.json(content_type=None)
+        if not isinstance(responses, list):
+            raise ValueError(f"Batch request rejected: {responses.get('error', responses)}")
+        by_id = {response.get("id"): response for response in responses}
+        return [by_id.get(i, {"error": {"message": "missing response"}}) for i in ids]
+
+    async def _batched(self, method: str, calldata: List[str]) -> List[Dict[str, Any]]:
+        chunks = [calldata[i:i + MAX_BATCH_SIZE] for i in range(0, len(calldata), MAX_BATCH_SIZE)]
+        semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+        async def run(chunk):
+            async with semaphore:
+                return await self._batch(method, chunk)
+
+        results = await asyncio.gather(*(run(chunk) for chunk in chunks))
+        return [response for chunk in results for response in chunk]
+
+    async def simulate(self, calldata: List[str]) -> List[Simulation]:
+        """ Estimate every calldata against the contract; one Simulation per input, in order. """
+        if not calldata:
+            return []
+        simulations = [Simulation(i) for i in range(len(calldata))]
+        unexplained = []
+        for simulation, response in zip(simulations, await self._batched("eth_estimateGas", calldata)):
+            if "error" not in response:
+                simulation.gas = int(int(response["result"], 16) * self.gas_margin)
+                continue
+            data = revert_data(response["error"])
+            if data is None:
+                unexplained.append(simulation)
+            simulation.error = self.errors.decode(data) if data else RevertReason(
+                "Revert", {"message": response["error"].get("message")}
+            )
+
+        if unexplained:
+            responses = await self._batched("eth_call", [calldata[s.index] for s in unexplained])
+            for simulation, response in zip(unexplained, responses):
+                data = revert_data(response["error"]) if "error" in response else None
+                if data:
+                    simulation.error = self.errors.decode(data)
+        return simulations
+
+    def fill_calldata(self, order_data: dict, pool_data, fraction=None) -> str:
+        fraction = Web3.to_wei(fraction if fraction is not None else order_data.get("fraction", 1), "ether")
+        order_tuple = OrderParamsConverter.dict_to_tuple(order_data, pool_data)
+        signature = bytes.fromhex(order_data["signature"][2:])
+        return self.calldata.fill_order(order_tuple, signature, fraction)
+
+    async def simulate_fills(
+        self,
+        orders: Sequence[dict],
+        pool_data,
+        fractions: Optional[Sequence] = None,
+        verifier=None,
+    ) -> List[Simulation]:
+        """ simulate() a fillOrder call per order, with the same inputs as fill_orders. With a
+        verifier.OrderVerifier, orders whose maker signature does not verify fail with the contract's
+        InvalidSignature error without being simulated. """
+        pools = pool_data if isinstance(pool_data, (list, tuple)) else [pool_data] * len(orders)
+        valid = await verifier.verify_fills_async(orders, pools) if verifier is not None else [True] * len(orders)
+        simulations = [Simulation(i, error=None if ok else RevertReason(INVALID_SIGNATURE, {})) for i, ok in enumerate(valid)]
+        indices = [i for i, ok in enumerate(valid) if ok]
+        calldata = [
+            self.fill_calldata(orders[i], pools[i], fractions[i] if fractions is not None else None) for i in indices
+        ]
+        for i, simulation in zip(indices, await self.simulate(calldata)):
+            simulation.index = i
+            simulations[i] = simulation
+        dropped = [s for s in simulations if not s.ok]
+        if dropped:
+            logger.info(f"Pre-flight dropped {len(dropped)}/{len(simulations)} fills: {[str(s.error) for s in dropped]}")
+        return simulations
@@ -0,0 +1,186 @@
+import asyncio
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from loguru import logger
+
+import order_factory
+from graphql_calls import place_orders
+from orders import Order
+from pools import PoolData
+from signing import OrderSigner
+from utils import size_kb_to_shares_for_blocks, upfront_amount_for
+
+# Live orders expiring within this window are replaced even when they still match a target level.
+MIN_REMAINING_LIFETIME = timedelta(seconds=60)
+# Orders per createOrder document when the new levels are placed.
+PLACE_BATCH_SIZE = 10
+
+# (price sat/kB, size kB, direction, expiry), as taken by order_factory.create_orders.
+Level = Tuple[Decimal, Decimal, str, datetime]
+# (direction, long shares, upfront amount): what an order commits to, in base units.
+QuoteKey = Tuple[str, int, int]
+
+
+def level_key(pool_data: PoolData, level: Level) -> QuoteKey:
+    """ The exact amounts Order.from_price_and_size would give a level. """
+    price, size, direction, _ = level
+    return direction, size_kb_to_shares_for_blocks(size, pool_data.num_blocks), upfront_amount_for(price, size)
+
+
+def order_key(order: Order) -> QuoteKey:
+    if order.direction == "LONG":
+        return order.direction, order.requested_long_shares or 0, order.offered_upfront_amount or 0
+    return order.direction, order.offered_long_shares or 0, order.requested_upfront_amount or 0
+
+
+class QuoteDiff:
+    """ What a requote changes on one pool: live orders kept as they are, live orders to cancel, live
+    orders that are already dead (expired or fully filled) and target levels that need a new order. """
+
+    __slots__ = ("pool_id", "keep", "cancel", "create", "dropped", "cancel_tx_hash", "placed")
+
+    def __init__(
+        self, pool_id: str, keep: List[Order], cancel: List[Order], create: List[Level], dropped: Optional[List[Order]] = None
+    ):
+        self.pool_id = pool_id
+        self.keep = keep
+        self.cancel = cancel
+        self.create = create
+        self.dropped = dropped or []
+        self.cancel_tx_hash: Optional[str] = None
+        self.placed: List[Order] = []
+
+    @property
+    def unchanged(self) -> bool:
+        return not self.cancel and not self.create
+
+    def __repr__(self) -> str:
+        return (
+            f"QuoteDiff(pool_id={self.pool_id}, keep={len(self.keep)}, cancel={len(self.cancel)}, "
+            f"dropped={len(self.dropped)}, create={len(self.create)}, placed={len(self.placed)}, cancel_tx_hash={self.cancel_tx_hash})"
+        )
+
+
+def diff_quotes(
+    pool_data: PoolData,
+    live: Iterable[Order],
+    targets: Sequence[Level],
+    now: Optional[datetime] = None,
+    min_lifetime: timedelta = MIN_REMAINING_LIFETIME,
+) -> QuoteDiff:
+    """ Match live orders to target levels by direction and exact amounts.
+
+    A live order is kept when it is unfilled, lives at least min_lifetime longer and matches a target
+    level not already matched. Expired and fully filled orders are dropped, as there is nothing left
+    to cancel on chain; every other live order is cancelled and every unmatched level is created.
+    Expiry is not part of the match, so a level is only re-signed when its price or size changes or
+    its order is about to expire. A naive now is taken as local time, as order expiries are.
+    """
+    now = now.astimezone(timezone.utc) if now else datetime.now(timezone.utc)
+    cutoff = now + min_lifetime
+    reusable: Dict[QuoteKey, List[Order]] = defaultdict(list)
+    cancel, dropped = [], []
+    for order in live:
+        if order.fraction_filled >= 1 or order.expiry <= now:
+            dropped.append(order)
+        elif order.fraction_filled == 0 and order.expiry > cutoff:
+            reusable[order_key(order)].append(order)
+        else:
+            cancel.append(order)
+
+    keep, create = [], []
+    for level in targets:
+        candidates = reusable.get(level_key(pool_data, level))
+        if candidates:
+            keep.append(candidates.pop())
+        else:
+            create.append(level)
+    for orders in reusable.values():
+        cancel.extend(orders)
+    return QuoteDiff(pool_data.id, keep, cancel, create, dropped)
+
+
+class QuoteEngine:
+    """ Keeps our live orders per pool and requotes by diffing them against a target ladder.
+
+    Only changed levels cost anything: their orders are built for maker and signed in one
+    create_orders call and placed with place_orders, and all stale orders of the pool go into a single cancelOrders
+    transaction. Orders cancelled here are ignored by later load() calls until the API stops
+    returning them.
+    """
+
+    def __init__(
+        self,
+        contract_calls,
+        graphql_client,
+        signer: Optional[OrderSigner] = None,
+        maker: Optional[str] = None,
+        min_lifetime: timedelta = MIN_REMAINING_LIFETIME,
+        place_batch_size: int = PLACE_BATCH_SIZE,
+    ):
+        self.contract_calls = contract_calls
+        self.graphql_client = graphql_client
+        self.signer = signer
+        self.maker = maker or order_factory.ACCOUNT
+        self.min_lifetime = min_lifetime
+        self.place_batch_size = place_batch_size
+        self.live: Dict[str, Dict[str, Order]] = defaultdict(dict)
+        self._cancelled: Set[str] = set()
+
+    async def load(self, filter: Optional[Dict[str, Any]] = None, now: Optional[datetime] = None) -> int:
+        """ Replace the live orders with our unfilled, unexpired orders from the my_orders query. """
+        now = now.astimezone(timezone.utc) if now else datetime.now(timezone.utc)
+        live: Dict[str, Dict[str, Order]] = defaultdict(dict)
+        returned = set()
+        async for order in self.graphql_client.my_orders(filter):
+            returned.add(order.order_hash)
+            if order.maker.lower() != self.maker.lower() or order.order_hash in self._cancelled:
+                continue
+            if order.fraction_filled < 1 and order.expiry > now:
+                live[order.pool_id][order.order_hash] = order
+        self._cancelled &= returned
+        self.live = live
+        return sum(len(orders) for orders in live.values())
+
+    async def requote(self, pool_data: PoolData, targets: Sequence[Level], now: Optional[datetime] = None) -> QuoteDiff:
+        """ Move the pool's live orders to targets: the cancel and the new orders are sent concurrently. """
+        live = self.live[pool_data.id]
+        diff = diff_quotes(pool_data, live.values(), targets, now, self.min_lifetime)
+        for order in diff.dropped:
+            live.pop(order.order_hash, None)
+        if diff.unchanged:
+            return diff
+
+        results = await asyncio.gather(self._cancel(pool_data, diff), self._place(pool_data, diff), return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                logger.error(f"Requote of pool {pool_data.id} failed: {result!r}")
+        if diff.cancel_tx_hash is not None:
+            for order in diff.cancel:
+                live.pop(order.order_hash, None)
+                self._cancelled.add(order.order_hash)
+        for order in diff.placed:
+            live[order.order_hash] = order
+        logger.info(f"Requoted pool {pool_data.id}: {diff}")
+        return diff
+
+    async def _cancel(self, pool_data: PoolData, diff: QuoteDiff):
+        if diff.cancel:
+            diff.cancel_tx_hash = await self.contract_calls.cancel_orders(diff.cancel, pool_data)
+
+    async def _place(self, pool_data: PoolData, diff: QuoteDiff):
+        if not diff.create:
+            return
+        orders = await order_factory.create_orders(pool_data, diff.create, signer=self.signer, maker=self.maker)
+        results = await place_orders(
+            self.graphql_client.session,
+            [order_factory.generate_order_payload(order) for order in orders],
+            batch_size=self.place_batch_size,
+        )
+        for order, result in zip(orders, results):
+            if result is not None:
+                order.id = result.get("id", order.id)
+                diff.placed.append(order)
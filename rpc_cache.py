@@ -0,0 +1,143 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+# TTL sentinels: FOREVER entries never expire, PER_BLOCK entries live until the head block moves.
+FOREVER = "forever"
+PER_BLOCK = "per_block"
+# How long a fetched block number is trusted before eth_blockNumber is called again (seconds).
+BLOCK_NUMBER_TTL = 2.0
+
+_MISSING = object()
+
+
+class RpcCache:
+    """ TTL cache for RPC results that do not change between calls.
+
+    Entries are stored with one of three lifetimes: FOREVER (chain id, domain separator),
+    PER_BLOCK (gas price, base fee) or a number of seconds. Hit and miss counters are kept
+    so the savings can be reported.
+    """
+
+    def __init__(self, web3, block_number_ttl: float = BLOCK_NUMBER_TTL):
+        self.web3 = web3
+        self.block_number_ttl = block_number_ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries: Dict[Hashable, Tuple[Any, Optional[float]]] = {}
+        self._block_entries: Dict[Hashable, Any] = {}
+        self._block: Optional[int] = None
+        self._block_fetched_at = 0.0
+
+    def _lookup(self, key: Hashable, ttl, block: Optional[int]):
+        with self._lock:
+            if ttl == PER_BLOCK:
+                if block != self._block:
+                    self._block_entries.clear()
+                    self._block = block
+                value = self._block_entries.get(key, _MISSING)
+            else:
+                value, expires_at = self._entries.get(key, (_MISSING, None))
+                if value is not _MISSING and expires_at is not None and time.monotonic() >= expires_at:
+                    del self._entries[key]
+                    value = _MISSING
+            if value is _MISSING:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def _store(self, key: Hashable, value, ttl, block: Optional[int]):
+        with self._lock:
+            if ttl == PER_BLOCK:
+                if block == self._block:
+                    self._block_entries[key] = value
+            else:
+                expires_at = None if ttl == FOREVER else time.monotonic() + ttl
+                self._entries[key] = (value, expires_at)
+
+    def get(self, key: Hashable, fetch: Callable[[], Any], ttl=FOREVER):
+        """ Return the cached value for key, calling fetch() on a miss.
+
+        Args:
+            key: Cache key.
+            fetch (callable): Zero-argument function performing the RPC call.
+            ttl: FOREVER, PER_BLOCK or a number of seconds.
+        """
+        block = self.block_number() if ttl == PER_BLOCK else None
+        value = self._lookup(key, ttl, block)
+        if value is _MISSING:
+            value = fetch()
+            self._store(key, value, ttl, block)
+        return value
+
+    async def aget(self, key: Hashable, fetch: Callable[[], Any], ttl=FOREVER):
+        """ Async get(): fetch is a zero-argument function returning an awaitable. """
+        block = await self.ablock_number() if ttl == PER_BLOCK else None
+        value = self._lookup(key, ttl, block)
+        if value is _MISSING:
+            value = await fetch()
+            self._store(key, value, ttl, block)
+        return value
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        """ Drop one key, or every entry (including the block number) when key is None. """
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+                self._block_entries.clear()
+                self._block = None
+                self._block_fetched_at = 0.0
+            else:
+                self._entries.pop(key, None)
+                self._block_entries.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
+
+    def _fresh_block(self) -> Optional[int]:
+        if self._block is not None and time.monotonic() - self._block_fetched_at < self.block_number_ttl:
+            return self._block
+        return None
+
+    def _set_block(self, block: int) -> int:
+        with self._lock:
+            if block != self._block:
+                self._block_entries.clear()
+                self._block = block
+            self._block_fetched_at = time.monotonic()
+        return block
+
+    def block_number(self) -> int:
+        block = self._fresh_block()
+        return block if block is not None else self._set_block(self.web3.eth.block_number)
+
+    async def ablock_number(self) -> int:
+        block = self._fresh_block()
+        return block if block is not None else self._set_block(await self.web3.eth.block_number)
+
+    def chain_id(self) -> int:
+        return self.get("chain_id", lambda: self.web3.eth.chain_id)
+
+    def gas_price(self) -> int:
+        return self.get("gas_price", lambda: self.web3.eth.gas_price, ttl=PER_BLOCK)
+
+    def base_fee(self) -> int:
+        return self.get("base_fee", lambda: self.web3.eth.get_block("latest")["baseFeePerGas"], ttl=PER_BLOCK)
+
+    def domain_separator(self, contract) -> bytes:
+        return self.get(("domain_separator", contract.address), lambda: contract.functions.domainSeparatorV4().call())
+
+    def eip712_domain(self, contract) -> tuple:
+        return self.get(("eip712_domain", contract.address), lambda: tuple(contract.functions.eip712Domain().call()))
+
+    async def achain_id(self) -> int:
+        async def fetch():
+            return await self.web3.eth.chain_id
+        return await self.aget("chain_id", fetch)
+
+    async def agas_price(self) -> int:
+        async def fetch():
+            return await self.web3.eth.gas_price
+        return await self.aget("gas_price", fetch, ttl=PER_BLOCK)
@@ -0,0 +1,70 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Sequence
+
+from eth_keys import keys
+from eth_utils import to_bytes
+
+from eip712 import signature_to_hex
+
+# Digests handed to a worker per task; large enough to amortize pickling overhead.
+SIGNING_CHUNK_SIZE = 64
+
+_worker_key: Optional[keys.PrivateKey] = None
+
+
+def _init_worker(private_key: str):
+    """ Process pool initializer: parse the key once per worker. """
+    global _worker_key
+    _worker_key = keys.PrivateKey(to_bytes(hexstr=private_key))
+
+
+def _sign_chunk(digests: Sequence[bytes]) -> List[str]:
+    signatures = []
+    for digest in digests:
+        signatures.append(signature_to_hex(_worker_key.sign_msg_hash(digest)))
+    return signatures
+
+
+class OrderSigner:
+    """ Signs EIP-712 order digests on a process pool whose workers hold the key.
+
+    Signatures are returned in the same order as the digests. Use as a context manager or call
+    close() to shut the pool down.
+    """
+
+    def __init__(self, private_key: str, max_workers: Optional[int] = None, chunk_size: int = SIGNING_CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.max_workers, initializer=_init_worker, initargs=(private_key,)
+        )
+
+    def _chunks(self, digests: Sequence[bytes]) -> List[Sequence[bytes]]:
+        # Spread small batches over every worker instead of handing one worker the whole ladder.
+        size = max(1, min(self.chunk_size, -(-len(digests) // self.max_workers)))
+        return [digests[i:i + size] for i in range(0, len(digests), size)]
+
+    def sign_digests(self, digests: Sequence[bytes]) -> List[str]:
+        signatures = []
+        for chunk in self._executor.map(_sign_chunk, self._chunks(digests)):
+            signatures.extend(chunk)
+        return signatures
+
+    async def sign_digests_async(self, digests: Sequence[bytes]) -> List[str]:
+        """ sign_digests() without blocking the event loop. """
+        loop = asyncio.get_running_loop()
+        chunks = await asyncio.gather(
+            *(loop.run_in_executor(self._executor, _sign_chunk, chunk) for chunk in self._chunks(digests))
+        )
+        return [signature for chunk in chunks for signature in chunk]
+
+    def close(self):
+        self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
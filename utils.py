@@ -1,33 +1,103 @@
 from datetime import datetime
-from decimal import Decimal
+from decimal import ROUND_DOWN, ROUND_HALF_EVEN, Decimal
+from fractions import Fraction
+from typing import Sequence, Tuple
+
+import numpy as np
+
+from fixed_point import div_decimal, from_fixed, mul_div
 
 BTCTXFEE_DECIMALS = 3
+# size_kb * 10**SIZE_DECIMALS == shares * num_blocks (1000 bytes per kB, BTCTXFEE_DECIMALS per byte)
+SIZE_DECIMALS = BTCTXFEE_DECIMALS + 3
+# Bitcoin block duration is approximately 10 minutes (600 seconds)
+BLOCK_DURATION = 600
+# Largest integer float64 represents exactly; bigger batch inputs take the exact slow path.
+MAX_EXACT_FLOAT_INT = 2 ** 53
 
 def date_to_block_timestamp(date):
     return int(date.timestamp())
 
-def size_kb_to_shares(size_kb: Decimal, target_start_timestamp: datetime, target_end_timestamp: datetime) -> Decimal:
-
+def num_blocks_between(target_start_timestamp: datetime, target_end_timestamp: datetime) -> int:
+    # Calculate the number of blocks between the start and end timestamps
     start_timestamp = date_to_block_timestamp(target_start_timestamp)
     end_timestamp = date_to_block_timestamp(target_end_timestamp)
-    block_duration = 600 
-    num_blocks = round((end_timestamp - start_timestamp) / block_duration)
+    return round((end_timestamp - start_timestamp) / BLOCK_DURATION)
+
+def size_kb_to_shares(size_kb: Decimal, target_start_timestamp: datetime, target_end_timestamp: datetime) -> int:
+    return size_kb_to_shares_for_blocks(size_kb, num_blocks_between(target_start_timestamp, target_end_timestamp))
 
-    size_bytes = size_kb * 1000
-    bytes_per_block = size_bytes / num_blocks
-    silica_wei_per_block = round(bytes_per_block * 10 ** BTCTXFEE_DECIMALS)
-    return silica_wei_per_block
+def size_kb_to_shares_for_blocks(size_kb: Decimal, num_blocks: int, rounding: str = ROUND_HALF_EVEN) -> int:
+    # silica-wei per block = size_kb * 1000 bytes / num_blocks * 10**BTCTXFEE_DECIMALS, computed exactly
+    return mul_div(size_kb, 10 ** SIZE_DECIMALS, num_blocks, rounding)
 
 def shares_to_size_kb(shares: Decimal, target_start_timestamp: datetime, target_end_timestamp: datetime) -> Decimal:
-    # Calculate the number of blocks between the start and end timestamps
-    start_timestamp = date_to_block_timestamp(target_start_timestamp)
-    end_timestamp = date_to_block_timestamp(target_end_timestamp)
-    block_duration = 600  # Bitcoin block duration is approximately 10 minutes (600 seconds)
-    num_blocks = round((end_timestamp - start_timestamp) / block_duration)
+    return shares_to_size_kb_for_blocks(shares, num_blocks_between(target_start_timestamp, target_end_timestamp))
+
+def shares_to_size_kb_for_blocks(shares: int, num_blocks: int) -> Decimal:
+    # shares are whole silica-wei per block, so size_kb * 10**SIZE_DECIMALS is an exact integer
+    return from_fixed(int(shares) * num_blocks, SIZE_DECIMALS)
+
+def upfront_amount_for(price: Decimal, size_kb: Decimal, rounding: str = ROUND_DOWN) -> int:
+    """ Upfront payout-token amount (base units) for a price in sat/kB and a size in kB. """
+    return mul_div(price, size_kb, 1, rounding)
+
+def price_for(upfront_amount: int, shares: int, num_blocks: int, rounding: str = ROUND_HALF_EVEN) -> Decimal:
+    """ Price in sat/kB, at full significant precision, of an upfront amount paid for shares of a pool. """
+    return div_decimal(int(upfront_amount) * 10 ** SIZE_DECIMALS, int(shares) * num_blocks, rounding)
+
+def _quotients(numerators: Sequence[int], denominators: Sequence[int]) -> np.ndarray:
+    """ Correctly rounded float64 numerators / denominators for non-negative integer inputs.
+
+    Pairs that float64 holds exactly are divided in one NumPy pass, which IEEE 754 rounds
+    correctly; the rest go through Fraction, whose float() is correctly rounded as well.
+    """
+    numerators = np.asarray(numerators)
+    denominators = np.asarray(denominators)
+    if numerators.dtype != object and denominators.dtype != object:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            result = numerators / denominators
+        inexact = np.flatnonzero((numerators >= MAX_EXACT_FLOAT_INT) | (denominators >= MAX_EXACT_FLOAT_INT))
+    else:
+        result = np.empty(len(numerators))
+        inexact = range(len(numerators))
+    for i in inexact:
+        n, d = int(numerators[i]), int(denominators[i])
+        result[i] = float(Fraction(n, d)) if d else (np.nan if n == 0 else np.inf)
+    return result
+
+def _scaled(values: Sequence[int], factor: int) -> np.ndarray:
+    """ values * factor as int64, or as an object array of Python ints if that could overflow. """
+    values = np.asarray(values)
+    if values.dtype != object and values.size:
+        if max(abs(int(values.max())), abs(int(values.min()))) * factor < 2 ** 63:
+            return values.astype(np.int64) * factor
+    elif values.dtype != object:
+        return values.astype(np.int64)
+    return np.array([int(v) * factor for v in values.flat], dtype=object)
+
+def shares_to_size_kb_batch(shares: Sequence[int], num_blocks: int) -> np.ndarray:
+    """ Vectorized shares_to_size_kb for one pool: size (kB) = shares * num_blocks / 10**6.
+
+    Every element equals float(shares_to_size_kb(...)) for the same inputs.
+    """
+    block_shares = _scaled(shares, num_blocks)
+    return _quotients(block_shares, np.full(len(block_shares), 10 ** SIZE_DECIMALS, dtype=np.int64))
+
+def to_price_and_size_batch(shares: Sequence[int], amounts: Sequence[int], num_blocks: int) -> Tuple[np.ndarray, np.ndarray]:
+    """ Vectorized Order.to_price_and_size for the orders of one pool.
 
-    silica_wei_per_block = shares
-    bytes_per_block = silica_wei_per_block / (10 ** BTCTXFEE_DECIMALS)
-    size_bytes = bytes_per_block * num_blocks
-    size_kb = size_bytes / 1000
+    Args:
+        shares: Long shares per order (requested for LONG, offered for SHORT).
+        amounts: Upfront amounts per order (offered for LONG, requested for SHORT).
+        num_blocks (int): The pool's block count (PoolData.num_blocks).
 
-    return size_kb
+    Returns:
+        tuple: (price in sat/kB, size in kB) float64 arrays, each element equal to the float of the
+        scalar result.
+    """
+    scale = 10 ** SIZE_DECIMALS
+    block_shares = _scaled(shares, num_blocks)
+    sizes = _quotients(block_shares, np.full(len(block_shares), scale, dtype=np.int64))
+    prices = _quotients(_scaled(amounts, scale), block_shares)
+    return prices, sizes
@@ -0,0 +1,218 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from eth_keys import keys
+from eth_keys.exceptions import BadSignature, ValidationError
+from loguru import logger
+
+from contract_calls import expiry_timestamp
+from eip712 import get_order_hasher
+from order_factory import generate_order_payload_for_hash
+from orders import Order
+from pools import PoolData
+
+# Signatures handed to a worker per task; recovering one costs milliseconds without coincurve.
+VERIFY_CHUNK_SIZE = 64
+# OpenZeppelin's ECDSA.recover rejects signatures in the upper half of the curve order.
+SECP256K1_HALF_N = 0x7FFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF5D576E7357A4501DDFE92F46681B20A0
+
+
+def recover_signer(digest: bytes, signature: str) -> Optional[str]:
+    """ Lowercase address that signed digest, or None if the r || s || v signature is one the
+    contract would reject (wrong length, v not in {27, 28}, high s, no recoverable key). """
+    try:
+        raw = bytes.fromhex(signature[2:] if signature.startswith("0x") else signature)
+    except (ValueError, AttributeError):
+        return None
+    if len(raw) != 65:
+        return None
+    r, s, v = int.from_bytes(raw[:32], "big"), int.from_bytes(raw[32:64], "big"), raw[64] - 27
+    if v not in (0, 1) or s > SECP256K1_HALF_N:
+        return None
+    try:
+        public_key = keys.Signature(vrs=(v, r, s)).recover_public_key_from_msg_hash(digest)
+    except (BadSignature, ValidationError):
+        return None
+    return public_key.to_address()
+
+
+def fill_payload_for_hash(order_data: Dict) -> Dict:
+    """ The hash payload (see order_factory.generate_order_payload_for_hash) of a fill payload,
+    i.e. the snake_case order dicts the fill_orders methods take. """
+    return {
+        "maker": order_data["maker"],
+        "taker": order_data.get("taker"),
+        "expiry": expiry_timestamp(order_data["expiry"]),
+        "offeredUpfrontToken": order_data.get("offered_upfront_token"),
+        "offeredUpfrontAmount": order_data.get("offered_upfront_amount"),
+        "offeredLongShares": order_data.get("offered_long_shares"),
+        "requestedUpfrontToken": order_data.get("requested_upfront_token"),
+        "requestedUpfrontAmount": order_data.get("requested_upfront_amount"),
+        "requestedLongShares": order_data.get("requested_long_shares"),
+    }
+
+
+def _recover_chunk(items: Sequence[Tuple[bytes, str]]) -> List[Optional[str]]:
+    return [recover_signer(digest, signature) for digest, signature in items]
+
+
+class OrderVerifier:
+    """ Checks book orders' maker signatures on a process pool before they are filled.
+
+    Each order's EIP-712 digest, in the domain of the chain_id and verifying_contract passed in, is
+    recomputed from its fields and pool (so an orderHash from the API is never trusted) and the
+    signer recovered from its signature must be the maker. Results are cached by orderHash and
+    signature, so every order is verified once and later checks are dict lookups, and
+    Order.signature_valid is set on the Orders passed in. verify_fills() does the same
+    for fill payloads, caching by digest and signature; the fill_orders methods and
+    Preflight.simulate_fills take a verifier to drop bad fills before they are sent. Use as a
+    context manager or call close() to shut the pool down.
+    """
+
+    def __init__(
+        self,
+        chain_id: int,
+        verifying_contract: str,
+        max_workers: Optional[int] = None,
+        chunk_size: int = VERIFY_CHUNK_SIZE,
+    ):
+        self.chain_id = chain_id
+        self.hasher = get_order_hasher(chain_id, verifying_contract)
+        self.chunk_size = chunk_size
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        self._results: Dict[str, Tuple[str, bool]] = {}
+        self._fills: Dict[Tuple[bytes, str], bool] = {}
+
+    def digest(self, order: Order, pool_data: PoolData) -> bytes:
+        return self.hasher.hash_order(pool_data, generate_order_payload_for_hash(order, self.chain_id))
+
+    def fill_digest(self, order_data: Dict, pool_data: PoolData) -> bytes:
+        return self.hasher.hash_order(pool_data, fill_payload_for_hash(order_data))
+
+    def cached(self, order: Order) -> Optional[bool]:
+        """ The verdict on order's current signature, or None if it has not been verified. """
+        entry = self._results.get(order.order_hash)
+        if entry is None or entry[0] != order.signature:
+            return None
+        return entry[1]
+
+    def _chunks(self, items: Sequence) -> List[Sequence]:
+        size = max(1, min(self.chunk_size, -(-len(items) // self.max_workers)))
+        return [items[i:i + size] for i in range(0, len(items), size)]
+
+    def _unverified(self, orders: Sequence[Order], pools: Dict[str, PoolData]) -> List[Tuple[int, bytes]]:
+        """ (index, digest) of the orders with no cached verdict; orders of unknown pools are skipped. """
+        unverified = []
+        for i, order in enumerate(orders):
+            if self.cached(order) is not None:
+                continue
+            pool_data = pools.get(order.pool_id)
+            if pool_data is None:
+                logger.warning(f"Cannot verify order {order.order_hash}: unknown pool {order.pool_id}")
+                continue
+            try:
+                unverified.append((i, self.digest(order, pool_data)))
+            except ValueError as e:
+                logger.warning(f"Cannot hash order {order.order_hash}: {e}")
+                self._results[order.order_hash] = (order.signature, False)
+        return unverified
+
+    def _record(self, orders: Sequence[Order], unverified: List[Tuple[int, bytes]], signers: List[Optional[str]]) -> List[Optional[bool]]:
+        invalid = 0
+        for (i, _), signer in zip(unverified, signers):
+            order = orders[i]
+            valid = signer is not None and signer == order.maker.lower()
+            invalid += not valid
+            self._results[order.order_hash] = (order.signature, valid)
+        if invalid:
+            logger.warning(f"{invalid} of {len(unverified)} verified orders have invalid signatures")
+        verdicts = []
+        for order in orders:
+            valid = self.cached(order)
+            if isinstance(order, Order):
+                order.signature_valid = valid
+            verdicts.append(valid)
+        return verdicts
+
+    def verify(self, orders: Sequence[Order], pools: Dict[str, PoolData]) -> List[Optional[bool]]:
+        """ Verify every order not verified yet (pools by pool id); one verdict per order, None if its pool is unknown. """
+        unverified = self._unverified(orders, pools)
+        items = [(digest, orders[i].signature) for i, digest in unverified]
+        signers = [signer for chunk in self._executor.map(_recover_chunk, self._chunks(items)) for signer in chunk]
+        return self._record(orders, unverified, signers)
+
+    async def verify_async(self, orders: Sequence[Order], pools: Dict[str, PoolData]) -> List[Optional[bool]]:
+        """ verify() without blocking the event loop. """
+        unverified = self._unverified(orders, pools)
+        items = [(digest, orders[i].signature) for i, digest in unverified]
+        loop = asyncio.get_running_loop()
+        chunks = await asyncio.gather(
+            *(loop.run_in_executor(self._executor, _recover_chunk, chunk) for chunk in self._chunks(items))
+        )
+        return self._record(orders, unverified, [signer for chunk in chunks for signer in chunk])
+
+    async def valid(self, orders: Sequence[Order], pools: Dict[str, PoolData]) -> List[Order]:
+        """ The orders whose signatures verified. """
+        return [order for order, valid in zip(orders, await self.verify_async(orders, pools)) if valid]
+
+    def _unverified_fills(
+        self, orders: Sequence[Dict], pools: Sequence[PoolData]
+    ) -> Tuple[List[Optional[Tuple[bytes, str]]], Dict[Tuple[bytes, str], str]]:
+        """ The cache key of every fill payload (None if it cannot be hashed) and the makers of the keys with no verdict. """
+        keys, makers = [], {}
+        for order_data, pool_data in zip(orders, pools):
+            try:
+                key = (self.fill_digest(order_data, pool_data), order_data["signature"])
+            except (KeyError, ValueError) as e:
+                logger.warning(f"Cannot hash fill of {order_data.get('maker')}: {e}")
+                key = None
+            keys.append(key)
+            if key is not None and key not in self._fills:
+                makers[key] = order_data["maker"].lower()
+        return keys, makers
+
+    def _record_fills(
+        self, keys: List[Optional[Tuple[bytes, str]]], makers: Dict[Tuple[bytes, str], str], signers: List[Optional[str]]
+    ) -> List[bool]:
+        for (key, maker), signer in zip(makers.items(), signers):
+            self._fills[key] = signer is not None and signer == maker
+        verdicts = [key is not None and self._fills[key] for key in keys]
+        if not all(verdicts):
+            logger.warning(f"{verdicts.count(False)} of {len(verdicts)} fills have invalid signatures")
+        return verdicts
+
+    def verify_fills(self, orders: Sequence[Dict], pool_data) -> List[bool]:
+        """ verify() for fill payloads; pool_data is one pool or one per order. Unhashable payloads are invalid. """
+        pools = pool_data if isinstance(pool_data, (list, tuple)) else [pool_data] * len(orders)
+        keys, makers = self._unverified_fills(orders, pools)
+        items = [(digest, signature) for digest, signature in makers]
+        signers = [signer for chunk in self._executor.map(_recover_chunk, self._chunks(items)) for signer in chunk]
+        return self._record_fills(keys, makers, signers)
+
+    async def verify_fills_async(self, orders: Sequence[Dict], pool_data) -> List[bool]:
+        """ verify_fills() without blocking the event loop. """
+        pools = pool_data if isinstance(pool_data, (list, tuple)) else [pool_data] * len(orders)
+        keys, makers = self._unverified_fills(orders, pools)
+        items = [(digest, signature) for digest, signature in makers]
+        loop = asyncio.get_running_loop()
+        chunks = await asyncio.gather(
+            *(loop.run_in_executor(self._executor, _recover_chunk, chunk) for chunk in self._chunks(items))
+        )
+        return self._record_fills(keys, makers, [signer for chunk in chunks for signer in chunk])
+
+    def forget(self, order_hashes: Iterable[str]):
+        """ Drop cached verdicts, e.g. of orders that expired or were filled. """
+        for order_hash in order_hashes:
+            self._results.pop(order_hash, None)
+
+    def close(self):
+        self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,210 @@
+import asyncio
+import itertools
+import json
+import random
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import websockets
+from hexbytes import HexBytes
+from loguru import logger
+from web3 import Web3
+
+from event_indexer import EventDecoder
+
+# Default queue sizes: heads are conflated (only the latest matters), events apply backpressure.
+HEADS_QUEUE_SIZE = 16
+EVENTS_QUEUE_SIZE = 1024
+# Reconnect backoff (seconds), doubled per failed attempt with full jitter.
+RECONNECT_BASE_DELAY = 0.5
+RECONNECT_MAX_DELAY = 30.0
+# Seconds to wait for the reply to a request sent over the socket.
+REQUEST_TIMEOUT = 30.0
+# (blockNumber, logIndex) keys remembered to drop logs delivered both live and by a backfill.
+SEEN_LOGS = 4096
+# Largest eth_getLogs range requested by one backfill call.
+BACKFILL_CHUNK_SIZE = 2000
+# Blocks before the last one seen that a backfill re-reads, in case their logs trailed a later head.
+BACKFILL_OVERLAP = 2
+
+_INT_FIELDS = ("blockNumber", "logIndex", "transactionIndex")
+_BYTES_FIELDS = ("blockHash", "transactionHash", "data")
+
+
+def format_log(raw: Dict[str, Any]) -> Dict[str, Any]:
+    """ A raw JSON-RPC log with the field types web3 returns from get_logs. """
+    log = dict(raw)
+    for key in _INT_FIELDS:
+        if isinstance(log.get(key), str):
+            log[key] = int(log[key], 16)
+    for key in _BYTES_FIELDS:
+        if key in log:
+            log[key] = HexBytes(log[key])
+    log["topics"] = [HexBytes(topic) for topic in raw["topics"]]
+    return log
+
+
+class Subscription:
+    """ Bounded queue feeding one async consumer.
+
+    With conflate=True a full queue drops its oldest item, so a slow consumer only ever sees recent
+    items. Otherwise the feed waits for room, which stops it reading the socket and pushes the
+    backpressure to the node.
+    """
+
+    def __init__(self, maxsize: int, conflate: bool = False):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.conflate = conflate
+        self.dropped = 0
+
+    async def put(self, item):
+        if self.conflate and self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        await self.queue.put(item)
+
+    async def get(self):
+        return await self.queue.get()
+
+    def __aiter__(self) -> AsyncIterator:
+        return self
+
+    async def __anext__(self):
+        return await self.queue.get()
+
+
+class EventFeed:
+    """ eth_subscribe push feed of new heads and decoded SilicaPools logs over one websocket.
+
+    Requests share the socket with the subscriptions and are matched to replies by id. When the
+    connection drops it is re-opened with jittered backoff, both subscriptions are renewed and the
+    logs emitted while disconnected are backfilled with eth_getLogs from the last block seen, so
+    consumers never miss an event. Logs delivered twice (live and backfilled) are dropped.
+    Decoded events have the shape EventIndexer stores plus a "removed" flag set for reorged logs.
+    """
+
+    def __init__(self, ws_url: str, contract, heads_queue_size: int = HEADS_QUEUE_SIZE, events_queue_size: int = EVENTS_QUEUE_SIZE):
+        self.ws_url = ws_url
+        self.contract_address = Web3.to_checksum_address(contract.address)
+        self.decoder = EventDecoder(contract)
+        self.heads = Subscription(heads_queue_size, conflate=True)
+        self.events = Subscription(events_queue_size)
+        self.last_block: Optional[int] = None
+        self.reconnects = 0
+        self._ids = itertools.count(1)
+        self._requests: Dict[int, asyncio.Future] = {}
+        self._subscriptions: Dict[str, Subscription] = {}
+        # Notifications that arrived before their eth_subscribe reply was processed.
+        self._unrouted: Dict[str, List[Dict[str, Any]]] = {}
+        self._seen: "OrderedDict[tuple, None]" = OrderedDict()
+        self._ws = None
+
+    async def _request(self, method: str, params: List[Any]) -> Any:
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._requests[request_id] = future
+        try:
+            await self._ws.send(json.dumps({"jsonrpc": "2.0", "id": request_id, "method": method, "params": params}))
+            response = await asyncio.wait_for(future, REQUEST_TIMEOUT)
+        finally:
+            self._requests.pop(request_id, None)
+        if "error" in response:
+            raise ValueError(f"{method} failed: {response['error']}")
+        return response["result"]
+
+    def _log_filter(self) -> Dict[str, Any]:
+        return {"address": self.contract_address, "topics": [self.decoder.topics]}
+
+    async def _deliver_log(self, raw: Dict[str, Any]):
+        log = format_log(raw)
+        key = (log["blockNumber"], log["logIndex"], bool(log.get("removed")))
+        if key in self._seen:
+            return
+        self._seen[key] = None
+        if len(self._seen) > SEEN_LOGS:
+            self._seen.popitem(last=False)
+        for event in self.decoder.decode([log]):
+            await self.events.put(dict(event, removed=bool(log.get("removed"))))
+        if self.last_block is None or log["blockNumber"] > self.last_block:
+            self.last_block = log["blockNumber"]
+
+    async def _deliver_head(self, head: Dict[str, Any]):
+        block = int(head["number"], 16)
+        if self.last_block is None or block > self.last_block:
+            self.last_block = block
+        await self.heads.put(head)
+
+    async def _route(self, subscription: Subscription, result: Dict[str, Any]):
+        if subscription is self.heads:
+            await self._deliver_head(result)
+        else:
+            await self._deliver_log(result)
+
+    async def _subscribe(self, subscription: Subscription, params: List[Any]):
+        subscription_id = await self._request("eth_subscribe", params)
+        self._subscriptions[subscription_id] = subscription
+        for result in self._unrouted.pop(subscription_id, []):
+            await self._route(subscription, result)
+
+    async def _read(self):
+        async for message in self._ws:
+            payload = json.loads(message)
+            if payload.get("method") == "eth_subscription":
+                params = payload["params"]
+                subscription = self._subscriptions.get(params["subscription"])
+                if subscription is None:
+                    self._unrouted.setdefault(params["subscription"], []).append(params["result"])
+                else:
+                    await self._route(subscription, params["result"])
+            else:
+                future = self._requests.get(payload.get("id"))
+                if future is not None and not future.done():
+                    future.set_result(payload)
+
+    async def _backfill(self, from_block: int):
+        """ eth_getLogs from from_block to the head; logs already delivered are dropped as duplicates. """
+        head = int(await self._request("eth_blockNumber", []), 16)
+        for start in range(from_block, head + 1, BACKFILL_CHUNK_SIZE):
+            end = min(head, start + BACKFILL_CHUNK_SIZE - 1)
+            logs = await self._request("eth_getLogs", [dict(self._log_filter(), fromBlock=hex(start), toBlock=hex(end))])
+            for raw in logs:
+                await self._deliver_log(raw)
+        if head > from_block:
+            logger.info(f"Backfilled logs for blocks {from_block}-{head}")
+
+    async def _session(self):
+        async with websockets.connect(self.ws_url, max_size=None) as ws:
+            self._ws = ws
+            reader = asyncio.create_task(self._read())
+            try:
+                self._subscriptions = {}
+                self._unrouted = {}
+                # Taken before subscribing: a head delivered by the new subscription moves last_block past
+                # the blocks whose logs were missed while disconnected.
+                resume_from = self.last_block
+                await self._subscribe(self.heads, ["newHeads"])
+                await self._subscribe(self.events, ["logs", self._log_filter()])
+                if resume_from is not None:
+                    await self._backfill(max(0, resume_from - BACKFILL_OVERLAP))
+                await reader
+            finally:
+                reader.cancel()
+                for future in self._requests.values():
+                    if not future.done():
+                        future.set_exception(ConnectionError("websocket closed"))
+                self._ws = None
+
+    async def run(self):
+        """ Keep the subscriptions alive until cancelled, reconnecting with backoff. """
+        attempt = 0
+        while True:
+            try:
+                await self._session()
+                attempt = 0
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                attempt += 1
+                logger.warning(f"Websocket feed error ({e!r}), reconnect attempt {attempt}")
+            self.reconnects += 1
+            await asyncio.sleep(random.uniform(0, min(RECONNECT_MAX_DELAY, RECONNECT_BASE_DELAY * 2 ** attempt)))